@@ -0,0 +1,187 @@
+"""Motor colunar (NumPy) para agregações de vendas.
+
+Carrega vendas e venda_itens em arrays (data como dia inteiro, valores em
+centavos int64, ids de produto, quantidades) e calcula os mesmos resultados
+dos relatórios vendas_periodo, comparativo, vendas_categorias e
+clientes_fieis com group-by vetorizado (np.unique + np.bincount), sem
+percorrer linhas em Python.
+
+Os valores são arredondados para centavos por venda/item na carga, então as
+somas podem diferir em frações de centavo das somas em ponto flutuante do SQL.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+
+from banco_dados import get_db_connection
+
+EPOCH = date(1970, 1, 1)
+
+DTYPE_VENDAS = np.dtype([('rowid', 'i8'), ('dia', 'i4'), ('total', 'i8')])
+DTYPE_ITENS = np.dtype([('venda_rowid', 'i8'), ('produto_id', 'i4'),
+                        ('quantidade', 'f8'), ('valor', 'i8')])
+
+
+@dataclass
+class ColunasVendas:
+    venda_dia: np.ndarray        # int32, dias desde 1970-01-01
+    venda_total: np.ndarray      # int64, centavos
+    venda_cliente: np.ndarray    # int32, índice em `clientes` (-1 = sem nome)
+    clientes: np.ndarray         # nomes distintos (object)
+    item_venda: np.ndarray       # int32, posição da venda nos arrays acima
+    item_produto: np.ndarray     # int32, produto_id
+    item_quantidade: np.ndarray  # float64
+    item_valor: np.ndarray       # int64, centavos (quantidade * preço unitário)
+    produto_categoria: np.ndarray  # int32 indexado por produto_id (-1 = inexistente)
+    categorias: np.ndarray       # nomes distintos (object)
+
+    @property
+    def total_vendas(self):
+        return len(self.venda_dia)
+
+    @property
+    def total_itens(self):
+        return len(self.item_venda)
+
+
+# ---------------------------------------------------------------
+# Carga
+# ---------------------------------------------------------------
+
+def _codificar(valores):
+    """Codifica valores categóricos; None vira -1."""
+    mapa = {}
+    codigos = np.fromiter(
+        (-1 if v is None else mapa.setdefault(v, len(mapa)) for v in valores),
+        dtype=np.int32, count=len(valores)
+    )
+    return codigos, np.array(list(mapa), dtype=object)
+
+
+def consultar_tuplas(conn, sql, params=()):
+    """Cursor que devolve tuplas simples (np.fromiter não aceita sqlite3.Row)."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(sql, params)
+
+
+def carregar_colunas(conn=None):
+    """Lê vendas, venda_itens e produtos do SQLite para ColunasVendas."""
+    if conn is None:
+        with get_db_connection() as conn:
+            return carregar_colunas(conn)
+
+    # A conversão de data e o arredondamento para centavos são feitos pelo SQLite
+    vendas = np.fromiter(consultar_tuplas(conn, '''
+        SELECT rowid,
+               IFNULL(CAST(JULIANDAY(DATE(data)) - 2440587.5 AS INTEGER), 0),
+               CAST(ROUND(total * 100) AS INTEGER)
+        FROM vendas ORDER BY rowid
+    '''), dtype=DTYPE_VENDAS)
+    clientes = [row[0] for row in consultar_tuplas(conn, "SELECT cliente_nome FROM vendas ORDER BY rowid")]
+    venda_cliente, nomes_clientes = _codificar(clientes)
+
+    itens = np.fromiter(consultar_tuplas(conn, '''
+        SELECT v.rowid, vi.produto_id, vi.quantidade,
+               CAST(ROUND(vi.quantidade * vi.preco_unitario * 100) AS INTEGER)
+        FROM venda_itens vi JOIN vendas v ON v.id = vi.venda_id
+    '''), dtype=DTYPE_ITENS)
+
+    produtos = consultar_tuplas(conn, "SELECT id, categoria FROM produtos").fetchall()
+    ids = np.array([p[0] for p in produtos], dtype=np.int64)
+    codigos_categoria, categorias = _codificar([p[1] for p in produtos])
+    produto_categoria = np.full(int(ids.max()) + 1 if len(ids) else 1, -1, dtype=np.int32)
+    produto_categoria[ids] = codigos_categoria
+
+    return ColunasVendas(
+        venda_dia=vendas['dia'],
+        venda_total=vendas['total'],
+        venda_cliente=venda_cliente,
+        clientes=nomes_clientes,
+        item_venda=np.searchsorted(vendas['rowid'], itens['venda_rowid']).astype(np.int32),
+        item_produto=itens['produto_id'],
+        item_quantidade=itens['quantidade'],
+        item_valor=itens['valor'],
+        produto_categoria=produto_categoria,
+        categorias=categorias,
+    )
+
+
+# ---------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------
+
+def dia_para_int(data_iso):
+    return (date.fromisoformat(data_iso) - EPOCH).days
+
+
+def int_para_dia(dias):
+    return (np.datetime64('1970-01-01') + np.asarray(dias).astype('timedelta64[D]')).astype(str)
+
+
+def centavos_para_reais(centavos):
+    return np.asarray(centavos) / 100.0
+
+
+def agrupar(chaves, pesos=()):
+    """Group-by vetorizado: retorna (chaves únicas, contagens, [somas por peso])."""
+    unicas, inverso = np.unique(chaves, return_inverse=True)
+    contagens = np.bincount(inverso, minlength=len(unicas))
+    somas = [np.bincount(inverso, weights=p, minlength=len(unicas)) for p in pesos]
+    return unicas, contagens, somas
+
+
+# ---------------------------------------------------------------
+# Relatórios
+# ---------------------------------------------------------------
+
+def vendas_periodo(colunas, start_date, end_date):
+    filtro = ((colunas.venda_dia >= dia_para_int(start_date))
+              & (colunas.venda_dia <= dia_para_int(end_date)))
+    dias, contagens, (somas,) = agrupar(colunas.venda_dia[filtro], [colunas.venda_total[filtro]])
+    valores = centavos_para_reais(somas)
+    return [
+        {'data': d, 'total_vendas': int(n), 'valor_total': float(v), 'ticket_medio': float(v / n)}
+        for d, n, v in zip(int_para_dia(dias).tolist(), contagens, valores)
+    ]
+
+
+def comparativo(colunas, periodo='month', limite=12):
+    datas = np.datetime64('1970-01-01') + colunas.venda_dia.astype('timedelta64[D]')
+    unidade = 'M' if periodo == 'month' else 'Y'
+    chaves = datas.astype(f'datetime64[{unidade}]').astype(np.int64)
+    periodos, contagens, (somas,) = agrupar(chaves, [colunas.venda_total])
+    ordem = np.argsort(periodos)[::-1][:limite]
+    rotulos = periodos[ordem].astype(f'datetime64[{unidade}]').astype(str).tolist()
+    return [
+        {'periodo': p, 'total_vendas': int(n), 'valor_total': float(v)}
+        for p, n, v in zip(rotulos, contagens[ordem], centavos_para_reais(somas[ordem]))
+    ]
+
+
+def vendas_categorias(colunas):
+    produtos = np.clip(colunas.item_produto, 0, len(colunas.produto_categoria) - 1)
+    categoria_item = np.where(colunas.item_produto == produtos,
+                              colunas.produto_categoria[produtos], -1)
+    validos = categoria_item >= 0  # equivale ao JOIN com produtos
+    categorias, _, (quantidades, valores) = agrupar(
+        categoria_item[validos],
+        [colunas.item_quantidade[validos], colunas.item_valor[validos]]
+    )
+    ordem = np.argsort(-valores, kind='stable')
+    return [
+        {'categoria': colunas.categorias[c], 'quantidade_vendida': float(q), 'valor_total': float(v)}
+        for c, q, v in zip(categorias[ordem], quantidades[ordem], centavos_para_reais(valores[ordem]))
+    ]
+
+
+def clientes_fieis(colunas, limit=10):
+    com_nome = colunas.venda_cliente >= 0
+    clientes, contagens, (somas,) = agrupar(colunas.venda_cliente[com_nome],
+                                            [colunas.venda_total[com_nome]])
+    ordem = np.argsort(-contagens, kind='stable')[:limit]
+    return [
+        {'cliente_nome': colunas.clientes[c], 'total_compras': int(n), 'valor_total_gasto': float(v)}
+        for c, n, v in zip(clientes[ordem], contagens[ordem], centavos_para_reais(somas[ordem]))
+    ]
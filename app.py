@@ -1,22 +1,26 @@
+import gzip
+import hashlib
 import json
 import logging
 import os
 import shutil
-import sqlite3
-import zipfile
+import tempfile
 from collections import defaultdict
-from datetime import datetime, timedelta
-from functools import wraps
+from datetime import date, datetime, timedelta
+from functools import partial, wraps
 
+import click
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import (
     Flask, jsonify, render_template, request, redirect, url_for,
-    send_from_directory, session, abort, send_file  
+    send_from_directory, session, abort, send_file, make_response,
+    Response, stream_with_context
 )
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 
 from app_logging import registrar_log
+from backup import BackupInvalido, GerenciadorBackups
 from banco_dados import (
     fetch_vendas_prazo,
     marcar_venda_pago,
@@ -47,10 +51,31 @@ from banco_dados import (
     excluir_produto,
     get_categorias,
     get_produto_by_id,
-    listar_logs
+    listar_logs,
+    get_data_version,
+    bump_data_version,
+    reconstruir_cubo_vendas,
+    deduplicar_fotos_produtos,
+    coletar_fotos_orfas
 )
+from cache_pdf import CachePDF
+from cache_relatorios import CacheRelatorios
 from decorators import login_required, role_required
-from gerador_pdf import gerar_relatorio_pdf
+from exportacao_relatorios import FORMATOS_EXPORTACAO, exportar
+from fila_relatorios import FilaRelatorios, TipoJobDesconhecido
+from registro_relatorios import Parametro, ParametroInvalido, get_relatorio, verificar_planos
+from series_graficos import GRAFICOS, validar_parametros as validar_parametros_grafico
+from snapshot_vendas import SnapshotVendas
+from armazenamento_fotos import esvaziar_quarentena
+from arquivos_estaticos import MODOS_ENVIO, ImpressoesDigitais, resposta_estatica
+from imagens_produtos import descartar_foto, foto_produto, gerar_derivados_pasta
+from validacao_imagens import FotoInvalida, validar_foto
+from gerador_pdf import (
+    RenderizadorProcessos, TempoEsgotadoPDF, enviar_pdf_temporario, enviar_temporario,
+    gerar_pdf_completo, gerar_relatorio_pdf, relatorio_padrao, remover_arquivo,
+    validar_parametros as validar_parametros_pdf
+)
+from recibos_pdf import carregar_vendas, gerar_recibos, renderizar_extrato
 
 from flask_wtf.csrf import CSRFProtect
 
@@ -77,15 +102,60 @@ app = Flask(__name__)
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-123'
     UPLOAD_FOLDER = os.path.join(app.root_path, 'static', 'uploads', 'produtos')
+    # Versões reduzidas das fotos (regeneráveis; servidas por /static)
+    UPLOAD_DERIVATIVES_FOLDER = os.path.join(app.root_path, 'static', 'uploads', 'derivados')
+    # Limpeza diária das fotos sem produto: só arquivos sem alteração há N horas;
+    # com pasta de quarentena (fora de static/) elas são movidas para lá e
+    # apagadas após N dias, sem ela são apagadas de imediato
+    UPLOAD_GC_GRACE_HOURS = int(os.environ.get('UPLOAD_GC_GRACE_HOURS', 24))
+    UPLOAD_QUARANTINE_FOLDER = os.environ.get('UPLOAD_QUARANTINE_FOLDER',
+                                              os.path.join(app.root_path, 'uploads_quarentena'))
+    UPLOAD_QUARANTINE_DAYS = int(os.environ.get('UPLOAD_QUARANTINE_DAYS', 30))
+    # Entrega de /static pelo proxy da frente: '' (Flask), 'x-sendfile' ou 'x-accel' (nginx)
+    STATIC_SENDFILE = os.environ.get('STATIC_SENDFILE', '')
+    # Location interno do nginx que aponta para a pasta static/ (modo x-accel)
+    STATIC_ACCEL_PREFIX = os.environ.get('STATIC_ACCEL_PREFIX', '/_static/')
     DATABASE = 'acougue.db'
     ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
     MAX_FILE_SIZE_MB = 2
+    # Limites das fotos enviadas, conferidos pelo cabeçalho antes de gravá-las
+    MAX_IMAGE_SIDE = int(os.environ.get('MAX_IMAGE_SIDE', 6000))
+    MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 24_000_000))
     MAX_CONTENT_LENGTH = 3 * 1024 * 1024
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 300))
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 128))
+    REPORT_JOBS_FOLDER = os.path.join(app.root_path, 'relatorios_gerados')
+    REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+    REPORT_JOB_TTL = int(os.environ.get('REPORT_JOB_TTL', 3600))
+    SNAPSHOT_FOLDER = os.environ.get('SNAPSHOT_FOLDER') or os.path.join(app.root_path, 'snapshots')
+    PDF_CACHE_FOLDER = os.environ.get('PDF_CACHE_FOLDER') or os.path.join(app.root_path, 'pdf_cache')
+    # Horário (HH:MM) para pré-renderizar o PDF completo no fechamento; vazio desativa
+    PDF_PRE_RENDER = os.environ.get('PDF_PRE_RENDER', '')
+    # Processos para montar os PDFs fora do processo web (0 = na própria thread)
+    PDF_RENDER_PROCESSES = int(os.environ.get('PDF_RENDER_PROCESSES', 0))
+    PDF_RENDER_TIMEOUT = int(os.environ.get('PDF_RENDER_TIMEOUT', 60))
+    BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER') or os.path.join(app.root_path, 'backups')
+    # Um backup completo a cada N dias (ou após N incrementais); os demais só guardam o que mudou
+    BACKUP_FULL_INTERVAL_DAYS = int(os.environ.get('BACKUP_FULL_INTERVAL_DAYS', 7))
+    BACKUP_MAX_INCREMENTAIS = int(os.environ.get('BACKUP_MAX_INCREMENTAIS', 30))
+    # Cópia do banco em passos de N páginas com pausa entre eles (0 = de uma vez)
+    BACKUP_PAGES = int(os.environ.get('BACKUP_PAGES', 256))
+    BACKUP_STEP_SLEEP_MS = int(os.environ.get('BACKUP_STEP_SLEEP_MS', 20))
+    # Compressão do banco no zip: deflate ou lzma (menor, porém mais lenta)
+    BACKUP_COMPRESSION = os.environ.get('BACKUP_COMPRESSION', 'deflate')
+    BACKUP_THREADS = int(os.environ.get('BACKUP_THREADS', 4))
+    # Retenção avô-pai-filho: último backup de cada um dos N dias, semanas e meses
+    BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', 7))
+    BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', 4))
+    BACKUP_KEEP_MONTHLY = int(os.environ.get('BACKUP_KEEP_MONTHLY', 12))
+    BACKUP_VERIFY = os.environ.get('BACKUP_VERIFY', '1') == '1'
 app.config.from_object(Config)
 
 init_db() 
+verificar_planos()
 
 app.jinja_env.filters['format_datetime'] = format_datetime
+app.jinja_env.globals['foto_produto'] = foto_produto
 
 # Garantir caminho absoluto para upload
 app.config['UPLOAD_FOLDER'] = os.path.abspath(app.config['UPLOAD_FOLDER'])
@@ -93,75 +163,137 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 csrf = CSRFProtect(app)
 
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+# /static com impressão digital (?v=) e cache longo
+if app.config['STATIC_SENDFILE'] not in MODOS_ENVIO:
+    raise ValueError(f"STATIC_SENDFILE inválido: {app.config['STATIC_SENDFILE']}")
+static_fingerprints = ImpressoesDigitais(app.static_folder)
+
+
+@app.url_defaults
+def versao_estaticos(endpoint, values):
+    if endpoint == 'static' and 'v' not in values:
+        versao = static_fingerprints.versao(values.get('filename', ''))
+        if versao:
+            values['v'] = versao
 
-# Função de backup
-def backup_db():
-    try:
-        backup_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'backups')
-        os.makedirs(backup_dir, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        date_today = datetime.now().strftime('%Y%m%d')
-
-        # Backup temporário do banco
-        temp_db_name = f"temp_backup_{timestamp}.db"
-        temp_db_path = os.path.join(backup_dir, temp_db_name)
-
-        src = sqlite3.connect(app.config['DATABASE'])
-        dst = sqlite3.connect(temp_db_path)
-        with dst:
-            src.backup(dst)
-        src.close()
-        dst.close()
-
-        # Zip com nome padronizado
-        backup_name = f"acougue_system_backup_{timestamp}.zip"
-        backup_path = os.path.join(backup_dir, backup_name)
-
-        with zipfile.ZipFile(backup_path, 'w') as zipf:
-            zipf.write(temp_db_path, os.path.basename(temp_db_path))
-            uploads_path = app.config['UPLOAD_FOLDER']
-            for root, dirs, files in os.walk(uploads_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, start=uploads_path)
-                    zipf.write(file_path, os.path.join('produtos', arcname))
-
-        os.remove(temp_db_path)
-
-        # Limpar backups do dia atual, mantendo só os 3 mais recentes
-        backups_today = sorted(
-            [f for f in os.listdir(backup_dir)
-             if f.startswith(f"acougue_system_backup_{date_today}") and f.endswith('.zip')],
-            key=lambda x: os.path.getmtime(os.path.join(backup_dir, x)),
-            reverse=True
-        )
 
-        while len(backups_today) > 3:
-            old_backup = backups_today.pop()
-            os.remove(os.path.join(backup_dir, old_backup))
-            logging.info(f"Backup antigo removido: {old_backup}")
+def servir_estatico(filename):
+    return resposta_estatica(static_fingerprints, filename,
+                             modo_envio=app.config['STATIC_SENDFILE'],
+                             prefixo_accel=app.config['STATIC_ACCEL_PREFIX'])
 
-        return backup_name  # Nome do backup mais recente
+app.view_functions['static'] = servir_estatico
+
+# Cache dos relatórios unificados (invalidado pela versão dos dados)
+report_cache = CacheRelatorios(
+    max_entradas=app.config['REPORT_CACHE_MAX_ENTRIES'],
+    ttl=app.config['REPORT_CACHE_TTL']
+)
+
+# Fila de relatórios demorados executados fora da requisição
+report_jobs = FilaRelatorios(
+    app.config['REPORT_JOBS_FOLDER'],
+    workers=app.config['REPORT_JOB_WORKERS'],
+    ttl_resultado=app.config['REPORT_JOB_TTL']
+)
+
+# PDF completo renderizado uma vez por versão dos dados e dia
+pdf_cache = CachePDF(app.config['PDF_CACHE_FOLDER'])
+pdf_renderer = (
+    RenderizadorProcessos(app.config['PDF_RENDER_PROCESSES'], app.config['PDF_RENDER_TIMEOUT'])
+    if app.config['PDF_RENDER_PROCESSES'] else None
+)
 
+# Histórico de vendas em colunas mapeadas em memória (atualizado toda noite)
+sales_snapshot = SnapshotVendas(app.config['SNAPSHOT_FOLDER'])
+
+# Backups incrementais do banco e das fotos
+backups = GerenciadorBackups(
+    app.config['BACKUP_FOLDER'], app.config['UPLOAD_FOLDER'],
+    intervalo_completo_dias=app.config['BACKUP_FULL_INTERVAL_DAYS'],
+    max_incrementais=app.config['BACKUP_MAX_INCREMENTAIS'],
+    diarios=app.config['BACKUP_KEEP_DAILY'],
+    semanais=app.config['BACKUP_KEEP_WEEKLY'],
+    mensais=app.config['BACKUP_KEEP_MONTHLY'],
+    verificar_ao_criar=app.config['BACKUP_VERIFY'],
+    paginas_por_passo=app.config['BACKUP_PAGES'],
+    pausa_passo=app.config['BACKUP_STEP_SLEEP_MS'] / 1000,
+    compressao_banco=app.config['BACKUP_COMPRESSION'],
+    threads=app.config['BACKUP_THREADS']
+)
+
+def validar_foto_formulario(foto):
+    """Confere extensão, tamanho, assinatura e dimensões da foto de um
+    formulário de produto; levanta FotoInvalida antes de qualquer gravação."""
+    return validar_foto(foto, app.config['ALLOWED_EXTENSIONS'],
+                        max_bytes=app.config['MAX_FILE_SIZE_MB'] * 1024 * 1024,
+                        max_lado=app.config['MAX_IMAGE_SIDE'],
+                        max_pixels=app.config['MAX_IMAGE_PIXELS'])
+
+# Função de backup
+def backup_db(completo=None):
+    try:
+        return backups.criar(completo=completo)  # Nome do backup mais recente
     except Exception as e:
         logging.error(f"Erro ao gerar backup: {str(e)}", exc_info=True)
         return None
 
+def limpar_uploads():
+    """Recolhe as fotos órfãs e esvazia a quarentena antiga; registra nos logs
+    quantos bytes foram liberados."""
+    try:
+        with app.app_context():
+            quarentena = app.config['UPLOAD_QUARANTINE_FOLDER']
+            resumo = coletar_fotos_orfas(app.config['UPLOAD_GC_GRACE_HOURS'] * 3600,
+                                         quarentena or None)
+            if quarentena:
+                resumo['quarentena_apagados'], resumo['quarentena_bytes'] = esvaziar_quarentena(
+                    quarentena, app.config['UPLOAD_QUARANTINE_DAYS'])
+        registrar_log(None, 'limpeza_uploads', 'INFO', resumo)
+        logging.info(f"Limpeza de uploads: {len(resumo['orfaos'])} fotos órfãs, "
+                     f"{resumo['bytes_liberados']} bytes liberados")
+        return resumo
+    except Exception as e:
+        logging.error(f"Erro na limpeza de uploads: {str(e)}", exc_info=True)
+        return None
+
 # Rota protegida: download do último backup
 @app.route('/backup')
 @login_required
 @role_required('gerente')
 def download_backup():
-    backup_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'backups')
-    backup_name = backup_db()  # Gera novo backup
+    """Entrega o backup concluído mais recente; sem nenhum (ou com ?novo=1)
+    enfileira um backup e devolve o job para acompanhar o andamento."""
+    backup_name = backups.ultimo()
+    if not backup_name or request.args.get('novo'):
+        job_id = report_jobs.submeter('backup', {}, session.get('user_id'))
+        return jsonify({'success': True, **job_para_json(report_jobs.status(job_id))}), 202
+
+    return enviar_backup(backup_name)
+
+
+def enviar_backup(nome):
+    """Envia o backup `nome` da pasta de backups: o completo direto do arquivo;
+    o incremental consolidado (banco + todas as fotos) em um zip temporário,
+    apagado após o envio."""
+    if not os.path.exists(backups.caminho(nome)):
+        abort(404, description="Backup não encontrado (removido pela retenção?)")
+    try:
+        completo = backups.manifesto(nome)['tipo'] == 'completo'
+    except BackupInvalido as e:
+        abort(500, description=str(e))
+    if completo:
+        return send_from_directory(backups.pasta, nome, as_attachment=True)
 
-    if backup_name:
-        return send_from_directory(backup_dir, backup_name, as_attachment=True)
-    else:
-        abort(500, description="Erro ao gerar backup do sistema")
+    fd, caminho = tempfile.mkstemp(prefix='backup_download_', suffix='.zip')
+    try:
+        with os.fdopen(fd, 'wb') as saida:
+            backups.consolidar(nome, saida)
+    except Exception:
+        remover_arquivo(caminho)
+        raise
+    return enviar_temporario(caminho, mimetype='application/zip', as_attachment=True,
+                             download_name=nome)
 
 
 @app.route('/')
@@ -244,23 +376,11 @@ def novo_produto():
             foto = request.files.get('foto')
             
             if foto and foto.filename != '':
-                # Verificar extensão
-                if not allowed_file(foto.filename):
-                    error_message = "Apenas arquivos JPG, JPEG e PNG são permitidos!"
-                    return render_template('produtos/novo.html',
-                                        error=error_message,
-                                        fornecedores=get_fornecedores(),
-                                        form_data=form_data)
-                
-                # Verificar tamanho
-                foto.stream.seek(0, os.SEEK_END)
-                file_size = foto.stream.tell()
-                foto.stream.seek(0)  # Resetar posição do arquivo
-                
-                if file_size > app.config['MAX_FILE_SIZE_MB'] * 1024 * 1024:
-                    error_message = f"Arquivo muito grande! Tamanho máximo: {app.config['MAX_FILE_SIZE_MB']}MB"
+                try:
+                    validar_foto_formulario(foto)
+                except FotoInvalida as e:
                     return render_template('produtos/novo.html',
-                                        error=error_message,
+                                        error=str(e),
                                         fornecedores=get_fornecedores(),
                                         form_data=form_data)
         
@@ -293,25 +413,13 @@ def editar_produto(id):
             foto = request.files.get('foto')
             
             if foto and foto.filename != '':
-                # Verificar extensão
-                if not allowed_file(foto.filename):
-                    error_message = "Apenas arquivos JPG, JPEG e PNG são permitidos!"
-                    return render_template('produtos/novo.html',
-                                        error=error_message,
+                try:
+                    validar_foto_formulario(foto)
+                except FotoInvalida as e:
+                    return render_template('produtos/editar.html',
+                                        produto=produto,
                                         fornecedores=get_fornecedores(),
-                                        form_data=form_data)
-                
-                # Verificar tamanho
-                foto.stream.seek(0, os.SEEK_END)
-                file_size = foto.stream.tell()
-                foto.stream.seek(0)  
-                
-                if file_size > app.config['MAX_FILE_SIZE_MB'] * 1024 * 1024:
-                    error_message = f"Arquivo muito grande! Tamanho máximo: {app.config['MAX_FILE_SIZE_MB']}MB"
-                    return render_template('produtos/novo.html',
-                                        error=error_message,
-                                        fornecedores=get_fornecedores(),
-                                        form_data=form_data)
+                                        error=str(e))
 
             atualizar_produto(id, form_data, foto)
             return redirect(url_for('listar_produtos'))
@@ -496,6 +604,7 @@ def pagar_pagamento_prazo(venda_id):
             )
             if cursor.rowcount == 0:
                 return redirect(url_for('listar_fiado', error='Venda não encontrada ou já paga'))
+            bump_data_version(conn)
             conn.commit()
         return redirect(url_for('listar_fiado', success=True))
     except Exception as e:
@@ -513,161 +622,253 @@ def relatorios():
 
 
 # Helper functions para relatórios
-def parse_date(date_str, default):
+def consultar_relatorio(relatorio, valores):
+    """Executa o relatório (ou reaproveita o cache) e retorna (dados, total)."""
+    def calcular():
+        # Snapshot só se os dias gravados nele não mudaram; senão, o SQL
+        dados = sales_snapshot.relatorio(relatorio.chave, valores)
+        if dados is not None:
+            return dados, len(dados)
+        with get_db_connection() as conn:
+            dados = relatorio.executar(conn, valores)
+            total = relatorio.contar(conn, valores) if relatorio.paginado else len(dados)
+        return dados, total
+    return report_cache.obter_ou_calcular(relatorio.chave, valores,
+                                          get_data_version(), calcular)
+
+def relatorio_da_requisicao(report_type):
+    """Busca o relatório no registro e valida os parâmetros da query string."""
+    relatorio = get_relatorio(report_type)
+    if not relatorio:
+        abort(404, description="Relatório não encontrado")
     try:
-        return datetime.strptime(date_str, '%Y-%m-%d').date().isoformat()
-    except:
-        return default
+        return relatorio, relatorio.validar(request.args)
+    except ParametroInvalido as e:
+        abort(400, description=str(e))
 
 @app.route('/relatorios/<report_type>')
-@login_required # Assuming you have this decorator
-@role_required('gerente') # Assuming you have this decorator
+@login_required
+@role_required('gerente')
 def relatorios_unificados(report_type):
-    report_titles = {
-        'vendas_totais': 'Vendas Totais',
-        'vendas_periodo': 'Vendas por Período',
-        'vendas_categorias': 'Vendas por Categoria',
-        'top_produtos': 'Top Produtos Vendidos',
-        'estoque_nivel': 'Nível de Estoque Crítico',
-        'estoque_validade': 'Produtos Próximos do Vencimento',
-        'clientes_fieis': 'Clientes Mais Fieis',
-        'fornecedores_produtos': 'Produtos por Fornecedor',
-        'movimentacao_caixa': 'Movimentação de Caixa',
-        'comparativo': 'Comparativo de Vendas'
-    }
-
-    # Configurations for all reports (now consolidated to be rendered as HTML)
-    reports = {
-        'vendas_totais': {
-            'query': '''
-                SELECT
-                    v.id,
-                    v.data,
-                    v.cliente_nome as cliente,
-                    GROUP_CONCAT(p.nome, ', ') as produtos,
-                    v.total,
-                    v.metodo_pagamento,
-                    COUNT(vi.id) as total_itens
-                FROM vendas v
-                LEFT JOIN venda_itens vi ON v.id = vi.venda_id
-                LEFT JOIN produtos p ON vi.produto_id = p.id
-                GROUP BY v.id
-                ORDER BY v.data DESC
-            '''
-        },
-        'vendas_periodo': {
-            'query': '''
-                SELECT DATE(v.data) as data, COUNT(*) as total_vendas,
-                SUM(v.total) as valor_total, AVG(v.total) as ticket_medio
-                FROM vendas v
-                WHERE DATE(v.data) BETWEEN ? AND ?
-                GROUP BY DATE(v.data) ORDER BY data
-            ''',
-            'params': (
-                request.args.get('start_date', datetime.now().replace(day=1).date().isoformat()),
-                request.args.get('end_date', datetime.now().date().isoformat())
-            )
-        },
-        'vendas_categorias': {
-            'query': '''
-                SELECT p.categoria, SUM(vi.quantidade) as quantidade_vendida,
-                SUM(vi.quantidade * vi.preco_unitario) as valor_total
-                FROM venda_itens vi JOIN produtos p ON vi.produto_id = p.id
-                GROUP BY p.categoria ORDER BY valor_total DESC
-            '''
-        },
-        'top_produtos': {
-            'query': '''
-                SELECT p.nome, SUM(vi.quantidade) as quantidade_vendida,
-                SUM(vi.quantidade * vi.preco_unitario) as valor_total
-                FROM venda_itens vi JOIN produtos p ON vi.produto_id = p.id
-                GROUP BY p.id ORDER BY valor_total DESC LIMIT ?
-            ''',
-            'params': (int(request.args.get('limit', 10)),)
-        },
-        'estoque_nivel': {
-            'query': '''
-                SELECT nome, quantidade, estoque_minimo, (quantidade - estoque_minimo) as diferenca
-                FROM produtos WHERE quantidade < estoque_minimo ORDER BY diferenca ASC
-            '''
-        },
-        'estoque_validade': {
-            'query': '''
-                SELECT nome, data_validade,
-                JULIANDAY(data_validade) - JULIANDAY('now') as dias_restantes
-                FROM produtos WHERE data_validade IS NOT NULL
-                AND dias_restantes BETWEEN 0 AND ? ORDER BY data_validade
-            ''',
-            'params': (int(request.args.get('dias', 30)),)
-        },
-        'clientes_fieis': {
-            'query': '''
-                SELECT cliente_nome, COUNT(*) as total_compras, SUM(total) as valor_total_gasto
-                FROM vendas WHERE cliente_nome IS NOT NULL
-                GROUP BY cliente_nome ORDER BY total_compras DESC LIMIT ?
-            ''',
-            'params': (int(request.args.get('limit', 10)),)
-        },
-        'fornecedores_produtos': {
-            'query': '''
-                SELECT f.nome as fornecedor, COUNT(p.id) as total_produtos, SUM(p.quantidade) as total_estoque
-                FROM fornecedores f LEFT JOIN produtos p ON f.id = p.fornecedor_id
-                GROUP BY f.id ORDER BY total_produtos DESC
-            '''
-        },
-        'movimentacao_caixa': {
-            'query': '''
-                SELECT DATE(data) as data,
-                SUM(CASE WHEN metodo_pagamento = 'fiado' THEN 0 ELSE total END) as entradas,
-                SUM(CASE WHEN metodo_pagamento = 'fiado' THEN total ELSE 0 END) as saidas
-                FROM vendas GROUP BY DATE(data) ORDER BY data DESC
-            '''
-        },
-        'comparativo': {
-            'query': '''
-                SELECT strftime('{group_format}', data) as periodo,
-                COUNT(*) as total_vendas, SUM(total) as valor_total
-                FROM vendas GROUP BY periodo ORDER BY periodo DESC LIMIT 12
-            ''',
-            'params': (),
-            'pre_process': lambda: {'group_format': '%Y-%m' if request.args.get('periodo', 'month') == 'month' else '%Y'}
-        }
-    }
-
-    config = reports.get(report_type)
-    if not config:
-        abort(404, description="Relatório não encontrado")
-
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        query = config['query']
-
-        if 'pre_process' in config:
-            pre_processed = config['pre_process']()
-            query = query.format(**pre_processed)
-
-        params = config.get('params', ())
-        cursor.execute(query, params)
+    relatorio, valores = relatorio_da_requisicao(report_type)
+
+    formato = request.args.get('formato')
+    if formato:
+        if formato not in FORMATOS_EXPORTACAO:
+            abort(400, description="Formato de exportação inválido")
+        # Exportação lida direto do cursor, sem passar pelo cache
+        nome = f"{relatorio.chave}_{datetime.now():%Y%m%d_%H%M}.{formato}"
+        return Response(
+            stream_with_context(exportar(relatorio, valores, formato)),
+            mimetype=FORMATOS_EXPORTACAO[formato],
+            headers={'Content-Disposition': f'attachment; filename="{nome}"'}
+        )
 
-        dados = [dict(zip([column[0] for column in cursor.description], row))
-                 for row in cursor.fetchall()]
+    dados, total = consultar_relatorio(relatorio, valores)
 
-    if 'post_process' in config:
-        dados = config['post_process'](dados)
+    total_pages = None
+    if relatorio.paginado:
+        # Paginado no servidor; as páginas seguintes são buscadas via JSON
+        total_pages = (total + valores['per_page'] - 1) // valores['per_page']
 
-    # All reports now render HTML
     return render_template('relatorio_unificado.html',
                            dados=dados,
                            report_type=report_type,
-                           titulo_relatorio=report_titles.get(report_type, 'Relatório'))
+                           titulo_relatorio=relatorio.titulo,
+                           filtros=valores,
+                           total=total,
+                           total_pages=total_pages)
+
 
+@app.route('/relatorios/<report_type>/dados')
+@login_required
+@role_required('gerente')
+def relatorios_dados(report_type):
+    relatorio, valores = relatorio_da_requisicao(report_type)
+    dados, total = consultar_relatorio(relatorio, valores)
+    resposta = {'dados': dados, 'total': total}
+    if relatorio.paginado:
+        total_pages = (total + valores['per_page'] - 1) // valores['per_page']
+        resposta.update({
+            'page': valores['page'],
+            'per_page': valores['per_page'],
+            'total_pages': total_pages,
+            'has_next': valores['page'] < total_pages
+        })
+    return jsonify(resposta)
+
+
+def resposta_json_comprimida(payload):
+    """JSON com ETag (responde 304 em If-None-Match) e gzip quando aceito."""
+    corpo = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    resposta = make_response(corpo)
+    resposta.mimetype = 'application/json'
+    # ETag fraca: a mesma representação vale com ou sem gzip
+    resposta.set_etag(hashlib.sha1(corpo).hexdigest(), weak=True)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    resposta.vary.add('Accept-Encoding')
+    resposta.make_conditional(request)
+    if (resposta.status_code == 200 and len(corpo) > 512
+            and 'gzip' in request.accept_encodings):
+        resposta.set_data(gzip.compress(corpo, compresslevel=6))
+        resposta.headers['Content-Encoding'] = 'gzip'
+    return resposta
+
+
+@app.route('/relatorios/<report_type>/grafico')
+@login_required
+@role_required('gerente')
+def relatorios_grafico(report_type):
+    if report_type not in GRAFICOS:
+        abort(404, description="Relatório sem gráfico")
+    relatorio, valores = relatorio_da_requisicao(report_type)
+    try:
+        opcoes = validar_parametros_grafico(request.args)
+    except ParametroInvalido as e:
+        abort(400, description=str(e))
+    dados, _ = consultar_relatorio(relatorio, valores)
+    return resposta_json_comprimida(
+        GRAFICOS[report_type](dados, opcoes['largura'], opcoes['metodo'])
+    )
+
+
+@app.route('/relatorios/cache/estatisticas')
+@login_required
+@role_required('gerente')
+def relatorios_cache_estatisticas():
+    return jsonify({**report_cache.estatisticas(), 'pdf': pdf_cache.estatisticas()})
 
 
 @app.route('/relatorios/gerar_pdf', endpoint='gerar_pdf')
 @login_required
 @role_required('gerente')
 def relatorio_pdf():
-    return gerar_relatorio_pdf()
+    try:
+        parametros = validar_parametros_pdf(request.args)
+    except ParametroInvalido as e:
+        abort(400, description=str(e))
+    try:
+        # Só o relatório completo padrão fica em cache; seleções são geradas sob demanda
+        if not relatorio_padrao(parametros):
+            return gerar_relatorio_pdf(**parametros, renderizador=pdf_renderer)
+        chave, caminho = pre_renderizar_pdf()
+    except TempoEsgotadoPDF as e:
+        abort(503, description=str(e))
+    resposta = send_file(caminho, mimetype='application/pdf',
+                         download_name='relatorio_completo.pdf',
+                         etag=chave, conditional=True)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+
+def pre_renderizar_pdf():
+    return pdf_cache.obter(get_data_version(), date.today().isoformat(),
+                           partial(gerar_pdf_completo, renderizador=pdf_renderer))
+
+
+# Jobs em segundo plano
+def job_pdf_completo(parametros, progresso, caminho):
+    parametros = validar_parametros_pdf(parametros)
+    if relatorio_padrao(parametros):
+        # Mesmo PDF em cache do download direto: vários pedidos no fechamento
+        # do caixa esperam uma única renderização
+        progresso(10, 'Obtendo o relatório completo')
+        _, origem = pre_renderizar_pdf()
+        try:
+            os.link(origem, caminho)
+        except OSError:
+            # Pastas em sistemas de arquivos diferentes
+            shutil.copyfile(origem, caminho)
+    else:
+        progresso(10, 'Consultando dados e montando o PDF')
+        gerar_pdf_completo(caminho, **parametros, renderizador=pdf_renderer)
+    progresso(90, 'Arquivo gravado')
+    return f"relatorio_completo_{datetime.now():%Y%m%d_%H%M}.pdf", 'application/pdf'
+
+def job_relatorio(parametros, progresso, caminho):
+    relatorio = get_relatorio(parametros['report_type'])
+    valores = relatorio.validar(parametros)
+    progresso(10, 'Executando consulta')
+    dados, total = consultar_relatorio(relatorio, valores)
+    progresso(80, 'Gravando arquivo')
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump({'relatorio': relatorio.chave, 'parametros': valores,
+                   'total': total, 'dados': dados}, f, ensure_ascii=False, default=str)
+    return f"{relatorio.chave}_{datetime.now():%Y%m%d_%H%M}.json", 'application/json'
+
+def job_backup(parametros, progresso, caminho):
+    # Só gera o backup; o download é servido da pasta de backups (enviar_backup),
+    # sem uma segunda cópia do zip em relatorios_gerados/
+    nome = backups.criar(completo=parametros.get('completo') or None, progresso=progresso)
+    return nome, 'application/zip'
+
+report_jobs.registrar_tipo('pdf_completo', job_pdf_completo)
+report_jobs.registrar_tipo('relatorio', job_relatorio)
+report_jobs.registrar_tipo('backup', job_backup)
+
+
+def job_para_json(job):
+    resposta = {k: job[k] for k in ('id', 'tipo', 'status', 'progresso', 'mensagem',
+                                     'criado_em', 'concluido_em', 'expira_em')}
+    resposta['status_url'] = url_for('relatorio_job_status', job_id=job['id'])
+    if job['status'] == 'concluido':
+        resposta['download_url'] = url_for('relatorio_job_download', job_id=job['id'])
+    elif job['tipo'] == 'backup' and job['status'] == 'executando':
+        # Páginas copiadas ficam em memória: gravar no banco reiniciaria a cópia
+        resposta['andamento'] = backups.andamento()
+    return resposta
+
+
+@app.route('/relatorios/jobs', methods=['POST'])
+@login_required
+@role_required('gerente')
+def relatorio_job_submeter():
+    parametros = request.get_json(silent=True) or request.form.to_dict()
+    tipo = parametros.pop('tipo', None)
+    if tipo == 'relatorio':
+        # Valida antes de enfileirar para devolver o erro imediatamente
+        relatorio = get_relatorio(parametros.get('report_type'))
+        if not relatorio:
+            abort(404, description="Relatório não encontrado")
+        try:
+            relatorio.validar(parametros)
+        except ParametroInvalido as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    elif tipo == 'pdf_completo':
+        try:
+            validar_parametros_pdf(parametros)
+        except ParametroInvalido as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        job_id = report_jobs.submeter(tipo, parametros, session.get('user_id'))
+    except TipoJobDesconhecido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **job_para_json(report_jobs.status(job_id))}), 202
+
+
+@app.route('/relatorios/jobs/<job_id>')
+@login_required
+@role_required('gerente')
+def relatorio_job_status(job_id):
+    job = report_jobs.status(job_id)
+    if not job:
+        abort(404)
+    return jsonify(job_para_json(job))
+
+
+@app.route('/relatorios/jobs/<job_id>/download')
+@login_required
+@role_required('gerente')
+def relatorio_job_download(job_id):
+    job = report_jobs.status(job_id)
+    if job and job['tipo'] == 'backup' and job['status'] == 'concluido':
+        return enviar_backup(job['nome_download'])
+    caminho = report_jobs.caminho_resultado(job) if job else None
+    if not caminho:
+        abort(404, description="Resultado não disponível ou expirado")
+    return send_file(caminho, mimetype=job['mimetype'],
+                     as_attachment=job['mimetype'] != 'application/pdf',
+                     download_name=job['nome_download'])
 
 
 # -----------------------
@@ -909,6 +1110,41 @@ def adicionar_observacao_venda_prazo(venda_id):
     return redirect(url_for('listar_vendas_prazo', success_obs=True))
 
 
+@app.route('/vendas/recibos')
+@login_required
+@role_required('gerente')
+def recibos_vendas():
+    """Recibos em lote: ?ids=V1,V2 (ou ids repetido) ou ?data=AAAA-MM-DD (vendas do dia)."""
+    ids = [i.strip() for valor in request.args.getlist('ids') for i in valor.split(',') if i.strip()]
+    try:
+        dia = Parametro('data', 'date').resolver(request.args.get('data'))
+    except ParametroInvalido as e:
+        abort(400, description=str(e))
+    if not ids and not dia:
+        abort(400, description="Informe os ids das vendas ou a data")
+    vendas = carregar_vendas(venda_ids=ids, dia=dia)
+    if not vendas:
+        abort(404, description="Nenhuma venda encontrada")
+    try:
+        return enviar_pdf_temporario(
+            lambda caminho: gerar_recibos(caminho, vendas, renderizador=pdf_renderer),
+            f"recibos_{dia or 'vendas'}.pdf")
+    except TempoEsgotadoPDF as e:
+        abort(503, description=str(e))
+
+@app.route('/vendas/extrato')
+@login_required
+@role_required('gerente')
+def extrato_cliente():
+    cliente = request.args.get('cliente', '').strip()
+    if not cliente:
+        abort(400, description="Informe o cliente")
+    vendas = carregar_vendas(cliente=cliente)
+    return enviar_pdf_temporario(
+        lambda caminho: renderizar_extrato(caminho, cliente, vendas),
+        f"extrato_{secure_filename(cliente) or 'cliente'}.pdf")
+
+
 # Utilitários
 @app.route('/logs')
 @login_required
@@ -998,9 +1234,91 @@ def verificar_validades():
     except Exception as e:
         logging.error(f"Erro na verificação de validades: {str(e)}", exc_info=True)
 
+@app.cli.command('restaurar-backup')
+@click.argument('nome')
+@click.argument('destino')
+def restaurar_backup_command(nome, destino):
+    """Reconstrói em DESTINO o banco e as fotos do backup NOME (completo + incrementais)."""
+    backups.restaurar(nome, destino)
+    click.echo(f"Backup {nome} restaurado em {destino}")
+
+
+@app.cli.command('backup')
+@click.option('--completo', is_flag=True, help='Força um backup completo')
+def backup_command(completo):
+    """Gera um backup (incremental, ou completo quando necessário)."""
+    click.echo(f"Backup gerado: {backups.criar(completo=completo or None)}")
+
+
+@app.cli.command('verificar-backup')
+@click.argument('nome', required=False)
+def verificar_backup_command(nome):
+    """Confere o backup NOME (padrão: o mais recente) e registra o resultado."""
+    nome = nome or max(backups.indice(), default=None)
+    if not nome:
+        raise click.ClickException("Nenhum backup encontrado")
+    resultado = backups.verificar(nome)
+    for erro in resultado['erros']:
+        click.echo(f"  {erro}")
+    click.echo(f"Backup {nome}: {'ok' if resultado['ok'] else 'reprovado'}")
+    if not resultado['ok']:
+        raise SystemExit(1)
+
+
+@app.cli.command('gerar-miniaturas')
+@click.option('--forcar', is_flag=True, help='Regera também as versões já existentes')
+def gerar_miniaturas_command(forcar):
+    """Gera as versões reduzidas (pequena, média e WebP) das fotos de produtos."""
+    fotos, gerados, falhas = gerar_derivados_pasta(
+        app.config['UPLOAD_FOLDER'], app.config['UPLOAD_DERIVATIVES_FOLDER'], forcar=forcar)
+    click.echo(f"{fotos} fotos processadas, {gerados} arquivos gerados")
+    for nome in falhas:
+        click.echo(f"  Falha: {nome}")
+
+
+@app.cli.command('deduplicar-fotos')
+def deduplicar_fotos_command():
+    """Migra as fotos para nomes pelo conteúdo, unindo as duplicadas."""
+    resumo = deduplicar_fotos_produtos()
+    for nome in resumo['renomeados']:
+        descartar_foto(nome)
+    _, gerados, _ = gerar_derivados_pasta(app.config['UPLOAD_FOLDER'],
+                                          app.config['UPLOAD_DERIVATIVES_FOLDER'])
+    click.echo(f"{resumo['arquivos']} fotos, {len(resumo['renomeados'])} renomeadas, "
+               f"{resumo['duplicados']} duplicadas removidas ({resumo['bytes_liberados']} bytes), "
+               f"{gerados} versões reduzidas geradas")
+    for foto in resumo['sem_arquivo']:
+        click.echo(f"  Produto com foto ausente: {foto}")
+
+
+@app.cli.command('limpar-uploads')
+def limpar_uploads_command():
+    """Recolhe as fotos que nenhum produto usa (respeitando a carência)."""
+    resumo = limpar_uploads()
+    if resumo is None:
+        raise click.ClickException("Falha na limpeza; veja o log")
+    destino = app.config['UPLOAD_QUARANTINE_FOLDER'] or 'apagadas'
+    click.echo(f"{len(resumo['orfaos'])} fotos órfãs ({destino}), {resumo['temporarios']} temporários "
+               f"e {resumo['derivados']} versões reduzidas: {resumo['bytes_liberados']} bytes liberados; "
+               f"{resumo['em_carencia']} ainda na carência")
+
+
+@app.cli.command('reconstruir-cubo')
+def reconstruir_cubo_command():
+    """Recalcula a tabela vendas_cubo a partir do histórico de vendas."""
+    celulas = reconstruir_cubo_vendas()
+    click.echo(f"Cubo de vendas reconstruído: {celulas} células")
+
+
 # Agendar verificação diária
 scheduler = BackgroundScheduler(daemon=True)
 scheduler.add_job(verificar_validades, 'interval', hours=24)
+scheduler.add_job(report_jobs.limpar_expirados, 'interval', hours=1)
+scheduler.add_job(sales_snapshot.atualizar, 'cron', hour=0, minute=30)
+scheduler.add_job(limpar_uploads, 'cron', hour=3, minute=15)
+if app.config['PDF_PRE_RENDER']:
+    hora, minuto = app.config['PDF_PRE_RENDER'].split(':')
+    scheduler.add_job(pre_renderizar_pdf, 'cron', hour=int(hora), minute=int(minuto))
 
 if __name__ == '__main__':
     try:
@@ -1009,12 +1327,15 @@ if __name__ == '__main__':
         
         # Iniciar o scheduler
         scheduler.start()
+        report_jobs.recuperar_pendentes()
         
         backup_db()
         verificar_validades()
         app.run(debug=True)
     except (KeyboardInterrupt, SystemExit):
         scheduler.shutdown()
+        if pdf_renderer:
+            pdf_renderer.encerrar()
         
 @app.errorhandler(404)
 def page_not_found(e):
@@ -0,0 +1,280 @@
+"""Fotos de produtos guardadas pelo conteúdo (SHA-256) com contagem de referências.
+
+O arquivo de uma foto se chama `<sha256>.<extensão>`: imagens idênticas
+enviadas para produtos diferentes (ou reenviadas) ocupam um único arquivo.
+A tabela arquivos_upload guarda quantos produtos usam cada arquivo; o contador
+é alterado na mesma transação que grava o produto e o arquivo só é apagado
+depois que a última referência é liberada. Fotos que sobram mesmo assim
+(falha ao apagar, upload de um cadastro rejeitado) são recolhidas
+periodicamente por `coletar_orfaos`.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+NOME_CONTEUDO = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+PREFIXO_TEMPORARIO = '.upload_'
+# Arquivos na quarentena: AAAAMMDD_HHMMSS_<nome original>
+FORMATO_QUARENTENA = '%Y%m%d_%H%M%S'
+# Mesma imagem enviada como .jpeg e .jpg vira um único arquivo
+EXTENSOES_EQUIVALENTES = {'jpeg': 'jpg'}
+
+
+def extensao(nome):
+    ext = nome.rsplit('.', 1)[1].lower() if '.' in nome else ''
+    # A extensão vem do nome enviado pelo usuário: só letras e dígitos entram no caminho
+    if not re.fullmatch(r'[a-z0-9]{1,10}', ext):
+        return 'bin'
+    return EXTENSOES_EQUIVALENTES.get(ext, ext)
+
+
+def nome_por_conteudo(sha256, nome_original):
+    return f"{sha256}.{extensao(nome_original)}"
+
+
+def guardar_foto(foto, pasta):
+    """Grava o upload (FileStorage) em um arquivo temporário da pasta e retorna
+    (nome, sha256, tamanho, temporario). O arquivo só recebe o nome pelo
+    conteúdo em `registrar_upload`, junto com a referência."""
+    os.makedirs(pasta, exist_ok=True)
+    h = hashlib.sha256()
+    tamanho = 0
+    fd, temporario = tempfile.mkstemp(prefix=PREFIXO_TEMPORARIO, dir=pasta)
+    try:
+        with os.fdopen(fd, 'wb') as saida:
+            for bloco in iter(lambda: foto.stream.read(1024 * 1024), b''):
+                h.update(bloco)
+                saida.write(bloco)
+                tamanho += len(bloco)
+    except BaseException:
+        os.remove(temporario)
+        raise
+    sha256 = h.hexdigest()
+    return nome_por_conteudo(sha256, foto.filename), sha256, tamanho, temporario
+
+
+def registrar_upload(conn, pasta, upload):
+    """Soma a referência e põe o upload no lugar, na transação de `conn`;
+    retorna True se o arquivo não existia.
+
+    A escrita da referência trava o banco até o commit, e `remover_sem_uso`
+    confere a tabela e apaga o arquivo com a mesma trava: uma exclusão
+    concorrente ou apaga antes de o arquivo voltar ao lugar, ou encontra a
+    referência nova e o mantém.
+    """
+    nome, sha256, tamanho, temporario = upload
+    registrar_referencia(conn, nome, sha256, tamanho)
+    destino = os.path.join(pasta, nome)
+    novo = not os.path.exists(destino)
+    # Regrava mesmo se já existir: o conteúdo é o mesmo
+    os.replace(temporario, destino)
+    return novo
+
+
+def descartar_upload(upload):
+    """Apaga o temporário de um upload que não chegou a ser registrado."""
+    try:
+        os.remove(upload[3])
+    except FileNotFoundError:
+        pass
+
+
+def registrar_referencia(conn, nome, sha256, tamanho):
+    """Soma uma referência ao arquivo (dentro da transação de `conn`)."""
+    conn.execute(
+        """
+        INSERT INTO arquivos_upload (arquivo, sha256, tamanho, referencias) VALUES (?, ?, ?, 1)
+        ON CONFLICT(arquivo) DO UPDATE SET referencias = referencias + 1
+        """,
+        (nome, sha256, tamanho)
+    )
+
+
+def liberar_referencia(conn, nome):
+    """Retira uma referência; retorna True se o arquivo ficou sem uso.
+
+    Deve ser chamada depois de o produto deixar de apontar para `nome` na mesma
+    transação. Fotos anteriores à migração (sem linha em arquivos_upload) ficam
+    sem uso quando nenhum outro produto tem o mesmo nome.
+    """
+    row = conn.execute("SELECT referencias FROM arquivos_upload WHERE arquivo = ?", (nome,)).fetchone()
+    if row is None:
+        em_uso = conn.execute(
+            "SELECT 1 FROM produtos WHERE foto = ? OR foto LIKE ? LIMIT 1", (nome, f"%/{nome}")
+        ).fetchone()
+        return em_uso is None
+    if row[0] > 1:
+        conn.execute("UPDATE arquivos_upload SET referencias = referencias - 1 WHERE arquivo = ?", (nome,))
+        return False
+    conn.execute("DELETE FROM arquivos_upload WHERE arquivo = ?", (nome,))
+    return True
+
+
+def remover_sem_uso(conn, pasta, nome, descartar=None):
+    """Apaga o arquivo liberado (e chama `descartar(nome)`), a menos que um
+    novo upload idêntico já o tenha registrado de novo após o commit da
+    liberação. Conferência e remoção ocorrem com o banco travado para escrita
+    (ver `registrar_upload`)."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute("SELECT 1 FROM arquivos_upload WHERE arquivo = ?", (nome,)).fetchone():
+            return False
+        try:
+            os.remove(os.path.join(pasta, nome))
+        except FileNotFoundError:
+            pass
+        if descartar:
+            descartar(nome)
+        return True
+    finally:
+        # Nada foi escrito: só libera a trava
+        conn.rollback()
+
+
+def sha256_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def deduplicar_pasta(conn, pasta):
+    """Migração: renomeia as fotos da pasta pelo conteúdo, aponta produtos.foto
+    para os novos nomes e recria a contagem de referências.
+
+    Os novos nomes são criados (hard link ou cópia) antes de o banco mudar e os
+    antigos só são apagados após o commit; uma interrupção deixa no máximo
+    arquivos sobrando, nunca produtos sem foto. Retorna um resumo da migração.
+    """
+    renomear = {}
+    for nome in sorted(os.listdir(pasta)):
+        caminho = os.path.join(pasta, nome)
+        if not os.path.isfile(caminho) or nome.startswith('.'):
+            continue
+        novo = nome if NOME_CONTEUDO.match(nome) else nome_por_conteudo(sha256_arquivo(caminho), nome)
+        renomear[nome] = novo
+        destino = os.path.join(pasta, novo)
+        if not os.path.exists(destino):
+            try:
+                os.link(caminho, destino)
+            except OSError:
+                shutil.copy2(caminho, destino)
+
+    produtos = conn.execute("SELECT id, foto FROM produtos WHERE foto IS NOT NULL AND foto != ''").fetchall()
+    referencias = Counter()
+    sem_arquivo = []
+    for produto_id, foto in produtos:
+        atual = os.path.basename(foto)
+        if atual not in renomear:
+            sem_arquivo.append(foto)
+            continue
+        referencias[renomear[atual]] += 1
+        if foto != renomear[atual]:
+            conn.execute("UPDATE produtos SET foto = ? WHERE id = ?", (renomear[atual], produto_id))
+    conn.execute("DELETE FROM arquivos_upload")
+    conn.executemany(
+        "INSERT INTO arquivos_upload (arquivo, sha256, tamanho, referencias) VALUES (?, ?, ?, ?)",
+        [(nome, nome.split('.', 1)[0], os.path.getsize(os.path.join(pasta, nome)), total)
+         for nome, total in sorted(referencias.items())]
+    )
+    conn.commit()
+
+    antigos = sorted(nome for nome, novo in renomear.items() if nome != novo)
+    liberados = 0
+    for nome in antigos:
+        caminho = os.path.join(pasta, nome)
+        # Com hard link o espaço só é liberado se o nome antigo era uma cópia duplicada
+        if not os.path.samefile(caminho, os.path.join(pasta, renomear[nome])):
+            liberados += os.path.getsize(caminho)
+        os.remove(caminho)
+    for foto in sem_arquivo:
+        logger.warning("Produto com foto ausente na pasta de uploads: %s", foto)
+    return {
+        'arquivos': len(set(renomear.values())),
+        'renomeados': antigos,
+        'duplicados': len(renomear) - len(set(renomear.values())),
+        'bytes_liberados': liberados,
+        'produtos': sum(referencias.values()),
+        'sem_arquivo': sem_arquivo,
+    }
+
+
+
+def _em_uso(conn, nome):
+    return conn.execute(
+        "SELECT 1 FROM produtos WHERE foto = ? OR foto LIKE ? LIMIT 1", (nome, f"%/{nome}")
+    ).fetchone() is not None
+
+
+def coletar_orfaos(conn, pasta, carencia, pasta_quarentena=None, agora=None):
+    """Retira da pasta as fotos que nenhum produto usa (produtos.foto) e que não
+    mudam há `carencia` segundos, além de temporários de uploads interrompidos.
+
+    Com `pasta_quarentena` as fotos órfãs são movidas para lá, com a data no
+    nome, em vez de apagadas. A carência protege o upload cujo produto ainda
+    não foi gravado; o uso é conferido de novo logo antes de cada remoção.
+    Linhas de arquivos_upload sem produto são apagadas junto. Retorna
+    {orfaos, temporarios, em_carencia, bytes_liberados}.
+    """
+    agora = time.time() if agora is None else agora
+    usados = {os.path.basename(foto) for (foto,) in conn.execute(
+        "SELECT foto FROM produtos WHERE foto IS NOT NULL AND foto != ''")}
+    if pasta_quarentena:
+        os.makedirs(pasta_quarentena, exist_ok=True)
+    resumo = {'orfaos': [], 'temporarios': 0, 'em_carencia': 0, 'bytes_liberados': 0}
+
+    for nome in sorted(os.listdir(pasta)):
+        caminho = os.path.join(pasta, nome)
+        temporario = nome.startswith(PREFIXO_TEMPORARIO)
+        if nome in usados or (nome.startswith('.') and not temporario) or not os.path.isfile(caminho):
+            continue
+        tamanho = os.path.getsize(caminho)
+        if agora - os.path.getmtime(caminho) < carencia:
+            resumo['em_carencia'] += 1
+            continue
+        if temporario:
+            os.remove(caminho)
+            resumo['temporarios'] += 1
+            resumo['bytes_liberados'] += tamanho
+            continue
+        if _em_uso(conn, nome):
+            continue
+        conn.execute("DELETE FROM arquivos_upload WHERE arquivo = ?", (nome,))
+        conn.commit()
+        if pasta_quarentena:
+            destino = f"{datetime.fromtimestamp(agora).strftime(FORMATO_QUARENTENA)}_{nome}"
+            shutil.move(caminho, os.path.join(pasta_quarentena, destino))
+        else:
+            os.remove(caminho)
+        resumo['orfaos'].append(nome)
+        resumo['bytes_liberados'] += tamanho
+    return resumo
+
+
+def esvaziar_quarentena(pasta_quarentena, dias, agora=None):
+    """Apaga da quarentena o que foi movido para lá há mais de `dias`; retorna
+    (arquivos, bytes)."""
+    if not os.path.isdir(pasta_quarentena):
+        return 0, 0
+    limite = (time.time() if agora is None else agora) - dias * 86400
+    arquivos = liberados = 0
+    for nome in sorted(os.listdir(pasta_quarentena)):
+        caminho = os.path.join(pasta_quarentena, nome)
+        try:
+            movido_em = datetime.strptime(nome[:15], FORMATO_QUARENTENA).timestamp()
+        except ValueError:
+            continue
+        if movido_em < limite and os.path.isfile(caminho):
+            liberados += os.path.getsize(caminho)
+            os.remove(caminho)
+            arquivos += 1
+    return arquivos, liberados
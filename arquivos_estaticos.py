@@ -0,0 +1,86 @@
+"""URLs com impressão digital e cabeçalhos de cache para /static (CSS, JS e fotos).
+
+`url_for('static', ...)` ganha `?v=<hash do conteúdo>`; a resposta para uma URL
+com a versão atual pode ficar um ano no cache do navegador (immutable), pois um
+conteúdo novo gera outra URL. Sem versão (ou com uma antiga) o navegador
+revalida com ETag forte (SHA-256 do arquivo) e Last-Modified.
+
+Opcionalmente os bytes são entregues pelo proxy da frente: X-Sendfile
+(Apache/lighttpd) ou X-Accel-Redirect (nginx, com um location `internal`).
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'public, no-cache'
+TAMANHO_VERSAO = 12
+
+MODOS_ENVIO = ('', 'x-sendfile', 'x-accel')
+
+
+class ImpressoesDigitais:
+    """SHA-256 dos arquivos de uma pasta, recalculado só quando tamanho ou
+    mtime mudam (uma chamada a os.stat por URL gerada)."""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def caminho(self, filename):
+        caminho = safe_join(self.pasta, filename)
+        return caminho if caminho and os.path.isfile(caminho) else None
+
+    def obter(self, filename):
+        """Hash do arquivo ou None se ele não existir."""
+        caminho = self.caminho(filename)
+        if not caminho:
+            return None
+        info = os.stat(caminho)
+        assinatura = (info.st_mtime_ns, info.st_size)
+        with self._lock:
+            guardado = self._cache.get(caminho)
+        if guardado and guardado[0] == assinatura:
+            return guardado[1]
+        h = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(bloco)
+        with self._lock:
+            self._cache[caminho] = (assinatura, h.hexdigest())
+        return h.hexdigest()
+
+    def versao(self, filename):
+        digest = self.obter(filename)
+        return digest[:TAMANHO_VERSAO] if digest else None
+
+
+def resposta_estatica(impressoes, filename, modo_envio='', prefixo_accel='/_static/'):
+    """Resposta para GET /static/<filename> com ETag forte, Last-Modified e
+    Cache-Control conforme a versão pedida em ?v=."""
+    caminho = impressoes.caminho(filename)
+    if not caminho:
+        abort(404)
+    digest = impressoes.obter(filename)
+    versionado = request.args.get('v') == digest[:TAMANHO_VERSAO]
+
+    if modo_envio:
+        # O proxy lê o arquivo; aqui só vão os cabeçalhos. (USE_X_SENDFILE do
+        # Flask valeria para todo send_file, inclusive PDFs temporários.)
+        resposta = Response(mimetype=mimetypes.guess_type(caminho)[0] or 'application/octet-stream')
+        if modo_envio == 'x-accel':
+            resposta.headers['X-Accel-Redirect'] = prefixo_accel.rstrip('/') + '/' + filename.lstrip('/')
+        else:
+            resposta.headers['X-Sendfile'] = caminho
+        resposta.set_etag(digest)
+        resposta.last_modified = os.path.getmtime(caminho)
+        resposta.make_conditional(request)
+    else:
+        resposta = send_file(caminho, etag=digest, conditional=True)
+    resposta.headers['Cache-Control'] = CACHE_IMUTAVEL if versionado else CACHE_REVALIDAR
+    return resposta
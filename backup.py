@@ -0,0 +1,582 @@
+"""Backups incrementais do banco e das fotos de produtos.
+
+Cada backup é um zip com uma cópia do banco, as fotos novas ou alteradas desde
+o backup anterior e um manifest.json com o SHA-256 de todas as fotos existentes
+no momento, indicando em qual zip (e membro) cada uma está guardada. Fotos sem
+alteração são guardadas uma única vez e apenas referenciadas pelos backups
+seguintes. Um backup completo guarda todas as fotos e inicia uma nova cadeia;
+ele é feito periodicamente para limitar o tamanho da cadeia.
+
+Restaurar um ponto = banco do zip escolhido + cada foto do zip indicado no seu
+manifesto.
+
+O banco pode ser copiado em passos de N páginas com uma pausa entre eles, para
+que as escritas do sistema não fiquem bloqueadas durante a cópia inteira. No zip
+o banco é comprimido (deflate ou LZMA) e as imagens, já comprimidas, são apenas
+guardadas. Duração, tamanho e razão de compressão vão para a tabela logs.
+
+Os metadados de cada zip (tipo, data, tamanho, zips referenciados e resultado da
+verificação) ficam em indice.json na pasta dos backups; a retenção avô-pai-filho
+(diários, semanais e mensais) é decidida só por ele.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from app_logging import registrar_log
+from banco_dados import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+PREFIXO = 'acougue_system_backup_'
+MANIFESTO = 'manifest.json'
+MEMBRO_BANCO = 'acougue.db'
+PASTA_FOTOS = 'produtos'
+INDICE = 'indice.json'
+
+COMPRESSOES = {'deflate': zipfile.ZIP_DEFLATED, 'lzma': zipfile.ZIP_LZMA}
+# Formatos de imagem já comprimidos: guardados sem nova compressão
+EXTENSOES_SEM_COMPRESSAO = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+class BackupInvalido(Exception):
+    """Backup inexistente, sem manifesto ou com foto referenciada ausente/corrompida."""
+
+
+class _CopiaReiniciada(Exception):
+    """Interrompe a cópia paginada que já recomeçou vezes demais."""
+
+
+def sha256_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _sha256_membro(arquivo, info):
+    h = hashlib.sha256()
+    with arquivo.open(info) as entrada:
+        for bloco in iter(lambda: entrada.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def compressao_membro(membro, compressao_banco=zipfile.ZIP_DEFLATED):
+    """Método de compressão do membro no zip conforme o tipo de arquivo."""
+    if membro == MEMBRO_BANCO:
+        return compressao_banco
+    if membro.lower().endswith(EXTENSOES_SEM_COMPRESSAO):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def data_do_nome(nome):
+    """Data/hora do backup pelo nome (com ou sem microssegundos), ou None."""
+    carimbo = nome[len(PREFIXO):-len('.zip')]
+    for formato in ('%Y%m%d_%H%M%S_%f', '%Y%m%d_%H%M%S'):
+        try:
+            return datetime.strptime(carimbo, formato)
+        except ValueError:
+            continue
+    return None
+
+
+def selecionar_gfs(datas, diarios, semanais, mensais):
+    """Nomes mantidos pela política avô-pai-filho: o mais recente de cada um dos
+    últimos `diarios` dias, `semanais` semanas (ISO) e `mensais` meses que têm
+    backup. `datas` é {nome: datetime}."""
+    recentes = sorted(datas, key=datas.get, reverse=True)
+    mantidos = set()
+    for quantidade, periodo in ((diarios, lambda d: d.date()),
+                                (semanais, lambda d: d.isocalendar()[:2]),
+                                (mensais, lambda d: (d.year, d.month))):
+        vistos = set()
+        for nome in recentes:
+            if len(vistos) >= quantidade:
+                break
+            chave = periodo(datas[nome])
+            if chave not in vistos:
+                vistos.add(chave)
+                mantidos.add(nome)
+    return mantidos
+
+
+def _reprovado(entrada):
+    return bool(entrada) and (entrada.get('verificacao') or {}).get('ok') is False
+
+
+class GerenciadorBackups:
+
+    def __init__(self, pasta, pasta_uploads, intervalo_completo_dias=7,
+                 max_incrementais=30, manter_por_dia=3, diarios=7, semanais=4, mensais=12,
+                 verificar_ao_criar=True, paginas_por_passo=0, pausa_passo=0.0,
+                 max_reinicios=3, compressao_banco='deflate', threads=4):
+        self.pasta = pasta
+        self.pasta_uploads = pasta_uploads
+        self.intervalo_completo = timedelta(days=intervalo_completo_dias)
+        self.max_incrementais = max_incrementais
+        self.manter_por_dia = manter_por_dia
+        self.diarios = diarios
+        self.semanais = semanais
+        self.mensais = mensais
+        self.verificar_ao_criar = verificar_ao_criar
+        # 0 = cópia do banco de uma vez só
+        self.paginas_por_passo = paginas_por_passo
+        self.pausa_passo = pausa_passo
+        self.max_reinicios = max_reinicios
+        if compressao_banco not in COMPRESSOES:
+            raise ValueError(f"Compressão desconhecida: {compressao_banco}")
+        self.compressao_banco = COMPRESSOES[compressao_banco]
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._escrita = threading.Lock()
+        self._andamento = {}
+
+    # ---------------------------------------------------------------
+    # Consulta
+    # ---------------------------------------------------------------
+
+    def caminho(self, nome):
+        return os.path.join(self.pasta, nome)
+
+    def listar(self):
+        """Nomes dos zips na pasta, do mais antigo ao mais recente (timestamp no nome)."""
+        if not os.path.isdir(self.pasta):
+            return []
+        return sorted(n for n in os.listdir(self.pasta)
+                      if n.startswith(PREFIXO) and n.endswith('.zip'))
+
+    def ultimo(self):
+        """Nome do backup concluído mais recente que não foi reprovado na
+        verificação (os em andamento são .tmp e não entram no índice), ou None."""
+        indice = self.indice()
+        for nome in sorted(indice, reverse=True):
+            if not _reprovado(indice[nome]):
+                return nome
+        return None
+
+    def andamento(self):
+        """Etapa do backup em execução ({} se nenhum): páginas copiadas, total e reinícios."""
+        with self._lock:
+            return dict(self._andamento)
+
+    def manifesto(self, nome):
+        try:
+            with zipfile.ZipFile(self.caminho(nome)) as arquivo:
+                return json.loads(arquivo.read(MANIFESTO))
+        except (OSError, KeyError, zipfile.BadZipFile, ValueError) as e:
+            raise BackupInvalido(f"Backup {nome} ilegível ou sem manifesto: {e}") from e
+
+    # ---------------------------------------------------------------
+    # Índice
+    # ---------------------------------------------------------------
+
+    def indice(self):
+        """{nome: metadados} dos backups; reconstruído a partir dos zips se ausente."""
+        try:
+            with open(self.caminho(INDICE), encoding='utf-8') as f:
+                return json.load(f)['backups']
+        except (OSError, ValueError, KeyError):
+            return self.reconstruir_indice()
+
+    def reconstruir_indice(self):
+        """Refaz o índice lendo o manifesto de cada zip da pasta."""
+        backups = {nome: self._entrada(nome) for nome in self.listar()}
+        self._gravar_indice(backups)
+        logger.info("Índice de backups reconstruído: %d zips", len(backups))
+        return backups
+
+    def _entrada(self, nome, manifesto=None, **extras):
+        if manifesto is None:
+            try:
+                manifesto = self.manifesto(nome)
+            except BackupInvalido:
+                manifesto = {'tipo': None, 'fotos': {}}
+        data = data_do_nome(nome)
+        return {
+            'tipo': manifesto['tipo'],
+            'criado_em': data.isoformat() if data else None,
+            'tamanho': os.path.getsize(self.caminho(nome)),
+            'referencias': sorted({e['arquivo'] for e in manifesto['fotos'].values()} - {nome}),
+            'verificacao': None,
+            **extras,
+        }
+
+    def _gravar_indice(self, backups):
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = self.caminho(f".{INDICE}.tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'versao': 1, 'backups': backups}, f, ensure_ascii=False, indent=1)
+        os.replace(temporario, self.caminho(INDICE))
+
+    def _ultimo_manifesto(self):
+        # Zips antigos (sem manifesto) são ignorados: o próximo backup será completo
+        for nome in sorted(self.indice(), reverse=True):
+            try:
+                return nome, self.manifesto(nome)
+            except BackupInvalido:
+                continue
+        return None, None
+
+    def _precisa_completo(self, anterior):
+        if anterior is None:
+            return True
+        criado_base = datetime.fromisoformat(anterior['criado_base'])
+        return (datetime.now() - criado_base >= self.intervalo_completo
+                or anterior['sequencia'] >= self.max_incrementais)
+
+    # ---------------------------------------------------------------
+    # Criação
+    # ---------------------------------------------------------------
+
+    def _fotos(self, anterior, executor):
+        """[caminho relativo, caminho, tamanho, mtime_ns, sha256] das fotos atuais.
+
+        O hash é reaproveitado do manifesto anterior quando tamanho e mtime não
+        mudaram; os demais são calculados em paralelo no `executor`.
+        """
+        conhecidos = anterior['fotos'] if anterior else {}
+        fotos, sem_hash = [], []
+        for raiz, _, arquivos in os.walk(self.pasta_uploads):
+            for arquivo in sorted(arquivos):
+                caminho = os.path.join(raiz, arquivo)
+                relativo = os.path.relpath(caminho, self.pasta_uploads).replace(os.sep, '/')
+                info = os.stat(caminho)
+                entrada = conhecidos.get(relativo)
+                if entrada and entrada['tamanho'] == info.st_size and entrada['mtime_ns'] == info.st_mtime_ns:
+                    sha = entrada['sha256']
+                else:
+                    sha = None
+                    sem_hash.append(len(fotos))
+                fotos.append([relativo, caminho, info.st_size, info.st_mtime_ns, sha])
+        for i, sha in zip(sem_hash, executor.map(sha256_arquivo, [fotos[i][1] for i in sem_hash])):
+            fotos[i][4] = sha
+        return fotos
+
+    def criar(self, completo=None, progresso=None):
+        """Gera um backup (completo ou incremental) e retorna o nome do zip.
+
+        `completo=None` decide pela idade do último completo e pelo tamanho da cadeia.
+        `progresso(percentual, mensagem)` é chamado ao fim de cada etapa; o andamento
+        da cópia do banco fica em `andamento()`, pois uma escrita no banco durante a
+        cópia a faria recomeçar. Backups simultâneos são serializados.
+        """
+        with self._escrita:
+            return self._criar(completo, progresso or (lambda percentual, mensagem=None: None))
+
+    def _criar(self, completo, progresso):
+        os.makedirs(self.pasta, exist_ok=True)
+        inicio = time.monotonic()
+        agora = datetime.now()
+        nome = f"{PREFIXO}{agora:%Y%m%d_%H%M%S_%f}.zip"
+        nome_anterior, anterior = self._ultimo_manifesto()
+        if completo is None:
+            # Uma cadeia cujo último zip foi reprovado na verificação não é continuada
+            completo = (self._precisa_completo(anterior)
+                        or _reprovado(self.indice().get(nome_anterior)))
+        if completo:
+            anterior_cadeia = None
+        else:
+            anterior_cadeia = anterior
+
+        # Hash -> (zip, membro) de tudo o que a cadeia já guarda
+        guardados = {}
+        if anterior_cadeia:
+            for entrada in anterior_cadeia['fotos'].values():
+                guardados.setdefault(entrada['sha256'], (entrada['arquivo'], entrada['membro']))
+
+        temporario = self.caminho(f".{nome}.tmp")
+        fotos = {}
+        novas = 0
+        progresso(5, 'Copiando o banco')
+        banco = self._copiar_banco()
+        try:
+            with zipfile.ZipFile(temporario, 'w') as destino, \
+                    ThreadPoolExecutor(max_workers=self.threads) as executor:
+                progresso(50, 'Comprimindo o banco e conferindo as fotos')
+                # O zip aceita um membro por vez: o banco, único membro grande a
+                # comprimir, é escrito em uma thread enquanto as outras calculam os
+                # hashes das fotos
+                escrita_banco = executor.submit(destino.write, banco, MEMBRO_BANCO,
+                                                compressao_membro(MEMBRO_BANCO, self.compressao_banco))
+                atuais = self._fotos(anterior, executor)
+                escrita_banco.result()
+                progresso(70, 'Guardando as fotos')
+                for relativo, caminho, tamanho, mtime_ns, sha in atuais:
+                    if sha not in guardados:
+                        membro = f"{PASTA_FOTOS}/{relativo}"
+                        destino.write(caminho, membro, compressao_membro(membro))
+                        guardados[sha] = (nome, membro)
+                        novas += 1
+                    arquivo, membro = guardados[sha]
+                    fotos[relativo] = {'sha256': sha, 'tamanho': tamanho, 'mtime_ns': mtime_ns,
+                                       'arquivo': arquivo, 'membro': membro}
+
+                manifesto = {
+                    'versao': 1,
+                    'tipo': 'completo' if completo else 'incremental',
+                    'criado_em': agora.isoformat(),
+                    'base': nome if completo else anterior_cadeia['base'],
+                    'criado_base': agora.isoformat() if completo else anterior_cadeia['criado_base'],
+                    'anterior': None if completo else nome_anterior,
+                    'sequencia': 0 if completo else anterior_cadeia['sequencia'] + 1,
+                    'fotos': fotos,
+                }
+                destino.writestr(MANIFESTO, json.dumps(manifesto, ensure_ascii=False, indent=1),
+                                 zipfile.ZIP_DEFLATED)
+                tamanho_original = sum(info.file_size for info in destino.infolist())
+            os.replace(temporario, self.caminho(nome))
+        finally:
+            os.remove(banco)
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+        tamanho = os.path.getsize(self.caminho(nome))
+        detalhes = {
+            'backup': nome,
+            'tipo': manifesto['tipo'],
+            'duracao_s': round(time.monotonic() - inicio, 3),
+            'tamanho': tamanho,
+            'tamanho_original': tamanho_original,
+            'razao': round(tamanho / tamanho_original, 3) if tamanho_original else None,
+            'fotos': len(fotos),
+            'fotos_guardadas': novas,
+        }
+        registrar_log(None, 'backup', 'INFO', detalhes)
+        logger.info("Backup %s gerado: %s, %d fotos (%d guardadas neste zip), %d bytes (razão %s) em %.1fs",
+                    nome, manifesto['tipo'], len(fotos), novas, tamanho, detalhes['razao'],
+                    detalhes['duracao_s'])
+        indice = self.indice()
+        indice[nome] = self._entrada(nome, manifesto, razao=detalhes['razao'],
+                                     duracao_s=detalhes['duracao_s'])
+        self._gravar_indice(indice)
+        if self.verificar_ao_criar:
+            progresso(85, 'Verificando o backup')
+            self._verificar(nome)
+        progresso(95, 'Removendo backups antigos')
+        self._limpar()
+        return nome
+
+    def _copiar_banco(self):
+        """Cópia consistente do banco em um arquivo temporário (removido por quem chama)."""
+        fd, temporario = tempfile.mkstemp(prefix='backup_', suffix='.db', dir=self.pasta)
+        os.close(fd)
+        try:
+            dst = sqlite3.connect(temporario)
+            try:
+                with get_db_connection() as src, dst:
+                    self._copiar_paginado(src, dst)
+            finally:
+                dst.close()
+        except Exception:
+            os.remove(temporario)
+            raise
+        finally:
+            with self._lock:
+                self._andamento = {}
+        return temporario
+
+    def _copiar_paginado(self, src, dst):
+        """Copia `paginas_por_passo` páginas por vez, liberando o banco na pausa.
+
+        Uma escrita de outra conexão faz o SQLite recomeçar a cópia; depois de
+        `max_reinicios` recomeços ela é feita de uma vez para garantir o término.
+        """
+        if not self.paginas_por_passo:
+            src.backup(dst)
+            return
+        estado = {'etapa': 'banco', 'copiadas': 0, 'total': None, 'reinicios': 0}
+
+        def passo(status, restantes, total):
+            copiadas = total - restantes
+            # Sem avanço em relação ao passo anterior: a cópia recomeçou
+            if estado['total'] is not None and copiadas <= estado['copiadas']:
+                estado['reinicios'] += 1
+                if estado['reinicios'] > self.max_reinicios:
+                    raise _CopiaReiniciada()
+            estado.update(copiadas=copiadas, total=total)
+            with self._lock:
+                self._andamento = dict(estado)
+            if restantes and self.pausa_passo:
+                time.sleep(self.pausa_passo)
+
+        try:
+            src.backup(dst, pages=self.paginas_por_passo, progress=passo)
+        except _CopiaReiniciada:
+            logger.warning("Banco alterado durante a cópia paginada %d vezes; copiando de uma vez",
+                           estado['reinicios'])
+            src.backup(dst)
+
+    # ---------------------------------------------------------------
+    # Retenção
+    # ---------------------------------------------------------------
+
+    def referencias(self, nome, indice=None):
+        """Zips necessários para restaurar `nome` (ele mesmo + onde estão suas fotos)."""
+        entrada = (indice if indice is not None else self.indice()).get(nome)
+        if entrada is None:
+            return {nome} | {e['arquivo'] for e in self.manifesto(nome)['fotos'].values()}
+        return {nome} | set(entrada['referencias'])
+
+    def limpar(self):
+        """Aplica a retenção: os `manter_por_dia` backups mais recentes de hoje e
+        a política avô-pai-filho (backups reprovados na verificação não ocupam
+        vaga), sem remover zips que ainda guardam fotos de algum backup mantido."""
+        with self._escrita:
+            return self._limpar()
+
+    def _limpar(self):
+        indice = self.indice()
+        datas = {nome: data_do_nome(nome) for nome in indice}
+        validos = {nome: data for nome, data in datas.items()
+                   if data and not _reprovado(indice[nome])}
+        hoje = sorted(nome for nome, data in datas.items() if data and data.date() == date.today())
+        mantidos = selecionar_gfs(validos, self.diarios, self.semanais, self.mensais)
+        mantidos |= set(hoje[-self.manter_por_dia:] if self.manter_por_dia else ())
+        # Nomes fora do padrão não são removidos automaticamente
+        mantidos |= {nome for nome, data in datas.items() if data is None}
+
+        necessarios = set()
+        for nome in mantidos:
+            necessarios |= self.referencias(nome, indice)
+        removidos = sorted(set(indice) - necessarios)
+        for nome in removidos:
+            try:
+                os.remove(self.caminho(nome))
+            except FileNotFoundError:
+                pass
+            del indice[nome]
+            logger.info("Backup antigo removido: %s", nome)
+        if removidos:
+            self._gravar_indice(indice)
+        return removidos
+
+    # ---------------------------------------------------------------
+    # Verificação
+    # ---------------------------------------------------------------
+
+    def verificar(self, nome):
+        """Confere o backup `nome` e registra o resultado no índice e nos logs.
+
+        O banco arquivado passa por PRAGMA quick_check; cada foto do manifesto
+        precisa existir (com o tamanho esperado) no zip indicado, e as guardadas
+        neste zip têm o SHA-256 conferido.
+        """
+        with self._escrita:
+            return self._verificar(nome)
+
+    def _verificar(self, nome):
+        erros = []
+        abertos = {}
+        try:
+            arquivo = self._abrir(abertos, nome)
+            manifesto = json.loads(arquivo.read(MANIFESTO))
+            erros.extend(self._verificar_banco(arquivo))
+            for relativo, entrada in sorted(manifesto['fotos'].items()):
+                try:
+                    info = self._abrir(abertos, entrada['arquivo']).getinfo(entrada['membro'])
+                except (BackupInvalido, KeyError):
+                    erros.append(f"Foto {relativo}: {entrada['membro']} ausente em {entrada['arquivo']}")
+                    continue
+                if info.file_size != entrada['tamanho']:
+                    erros.append(f"Foto {relativo}: tamanho divergente")
+                elif entrada['arquivo'] == nome and _sha256_membro(arquivo, info) != entrada['sha256']:
+                    erros.append(f"Foto {relativo}: hash divergente")
+        except (BackupInvalido, KeyError, ValueError, zipfile.BadZipFile) as e:
+            erros.append(str(e))
+        finally:
+            for aberto in abertos.values():
+                aberto.close()
+
+        resultado = {'ok': not erros, 'em': datetime.now().isoformat(timespec='seconds'),
+                     'erros': erros[:20]}
+        indice = self.indice()
+        if nome in indice:
+            indice[nome]['verificacao'] = resultado
+            self._gravar_indice(indice)
+        registrar_log(None, 'backup_verificado', 'INFO' if resultado['ok'] else 'ERROR',
+                      {'backup': nome, **resultado})
+        if erros:
+            logger.error("Backup %s reprovado na verificação: %s", nome, '; '.join(erros[:5]))
+        return resultado
+
+    def _verificar_banco(self, arquivo):
+        fd, temporario = tempfile.mkstemp(prefix='verificacao_', suffix='.db', dir=self.pasta)
+        try:
+            with os.fdopen(fd, 'wb') as saida, arquivo.open(MEMBRO_BANCO) as entrada:
+                shutil.copyfileobj(entrada, saida)
+            conn = sqlite3.connect(f"file:{temporario}?mode=ro", uri=True)
+            try:
+                linhas = [row[0] for row in conn.execute("PRAGMA quick_check")]
+            finally:
+                conn.close()
+        except KeyError:
+            return ["Banco ausente no zip"]
+        except sqlite3.DatabaseError as e:
+            return [f"Banco ilegível: {e}"]
+        finally:
+            os.remove(temporario)
+        return [] if linhas == ['ok'] else [f"Banco: {linha}" for linha in linhas]
+
+    # ---------------------------------------------------------------
+    # Restauração
+    # ---------------------------------------------------------------
+
+    def _membros(self, nome):
+        """Gera (nome no ponto restaurado, zip de origem, membro, sha256 ou None)."""
+        manifesto = self.manifesto(nome)
+        yield MEMBRO_BANCO, nome, MEMBRO_BANCO, None
+        for relativo, entrada in sorted(manifesto['fotos'].items()):
+            yield f"{PASTA_FOTOS}/{relativo}", entrada['arquivo'], entrada['membro'], entrada['sha256']
+
+    def _abrir(self, abertos, nome):
+        if nome not in abertos:
+            try:
+                abertos[nome] = zipfile.ZipFile(self.caminho(nome))
+            except (OSError, zipfile.BadZipFile) as e:
+                raise BackupInvalido(f"Zip {nome} necessário para a restauração está ausente: {e}") from e
+        return abertos[nome]
+
+    def restaurar(self, nome, destino):
+        """Reconstrói em `destino` o banco (acougue.db) e a pasta produtos/ do ponto `nome`."""
+        abertos = {}
+        try:
+            for alvo, origem, membro, sha in self._membros(nome):
+                caminho = os.path.join(destino, *alvo.split('/'))
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                with self._abrir(abertos, origem).open(membro) as entrada, open(caminho, 'wb') as saida:
+                    shutil.copyfileobj(entrada, saida)
+                if sha and sha256_arquivo(caminho) != sha:
+                    raise BackupInvalido(f"Hash divergente em {alvo} (origem {origem})")
+        finally:
+            for arquivo in abertos.values():
+                arquivo.close()
+        return destino
+
+    def consolidar(self, nome, saida):
+        """Grava em `saida` (arquivo binário) um zip autossuficiente do ponto `nome`."""
+        abertos = {}
+        try:
+            with zipfile.ZipFile(saida, 'w') as destino:
+                for alvo, origem, membro, _ in self._membros(nome):
+                    info = self._abrir(abertos, origem).getinfo(membro)
+                    # Mantém a compressão escolhida para cada membro na criação
+                    copia_info = zipfile.ZipInfo(alvo, info.date_time)
+                    copia_info.compress_type = info.compress_type
+                    copia_info.file_size = info.file_size
+                    with abertos[origem].open(info) as entrada, destino.open(copia_info, 'w') as copia:
+                        shutil.copyfileobj(entrada, copia)
+        finally:
+            for arquivo in abertos.values():
+                arquivo.close()
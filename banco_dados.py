@@ -1,19 +1,30 @@
 import sqlite3
 import os
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 from flask import current_app
 from datetime import datetime
 import logging
 
+from armazenamento_fotos import (
+    coletar_orfaos, deduplicar_pasta, descartar_upload, guardar_foto, liberar_referencia,
+    registrar_upload, remover_sem_uso
+)
+from imagens_produtos import descartar_foto, nome_foto, processar_foto, remover_derivados_orfaos
+
 DB_PATH = os.environ.get('DB_PATH', 'acougue.db')
 
 @contextmanager
-def get_db_connection():
+def get_db_connection(somente_leitura=False):
     db_path = os.environ.get('DB_PATH', 'acougue.db')
-    # Usar URI para permitir compartilhamento em memória
-    conn = sqlite3.connect(f'file:{db_path}', uri=True)
+    if somente_leitura:
+        # Conexões de leitura podem ser abertas em threads de trabalho e
+        # fechadas por quem as criou, depois que as threads terminarem
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+    else:
+        # Usar URI para permitir compartilhamento em memória
+        conn = sqlite3.connect(f'file:{db_path}', uri=True)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     try:
@@ -22,6 +33,24 @@ def get_db_connection():
         conn.close()
 
 
+# (nome, evento, tabela, SELECT dos dias afetados) dos triggers que marcam os
+# dias já gravados no snapshot de vendas cujas vendas ou itens mudaram
+_DIA_DA_VENDA = "SELECT DATE(data) AS dia FROM vendas WHERE id = {}"
+TRIGGERS_SNAPSHOT_VENDAS = (
+    ('trg_snapshot_vendas_insert', 'INSERT', 'vendas', "SELECT DATE(NEW.data) AS dia"),
+    ('trg_snapshot_vendas_update', 'UPDATE OF data, total', 'vendas',
+     "SELECT DATE(OLD.data) AS dia UNION SELECT DATE(NEW.data)"),
+    ('trg_snapshot_vendas_delete', 'DELETE', 'vendas', "SELECT DATE(OLD.data) AS dia"),
+    ('trg_snapshot_itens_insert', 'INSERT', 'venda_itens',
+     _DIA_DA_VENDA.format('NEW.venda_id')),
+    ('trg_snapshot_itens_update', 'UPDATE OF venda_id, produto_id, quantidade, preco_unitario',
+     'venda_itens',
+     f"{_DIA_DA_VENDA.format('OLD.venda_id')} UNION {_DIA_DA_VENDA.format('NEW.venda_id')}"),
+    ('trg_snapshot_itens_delete', 'DELETE', 'venda_itens',
+     _DIA_DA_VENDA.format('OLD.venda_id')),
+)
+
+
 def init_db():
     """Inicialização completa do banco de dados, criando tabelas e triggers"""
     with get_db_connection() as conn:
@@ -119,8 +148,214 @@ def init_db():
                 user_agent TEXT
             )
         ''')
+        # Contador de versão dos dados (invalidação de caches de relatórios)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                versao INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO data_version (id, versao) VALUES (1, 0)")
+        # Jobs de relatórios executados em segundo plano (fila_relatorios.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS report_jobs (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                parametros TEXT,
+                status TEXT NOT NULL DEFAULT 'pendente',
+                progresso INTEGER NOT NULL DEFAULT 0,
+                mensagem TEXT,
+                arquivo TEXT,
+                nome_download TEXT,
+                mimetype TEXT,
+                usuario_id INTEGER,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                iniciado_em TIMESTAMP,
+                concluido_em TIMESTAMP,
+                expira_em TIMESTAMP
+            )
+        ''')
+        # Cubo de agregados de vendas por granularidade/período/método/categoria.
+        # categoria = '*' guarda os totais da venda (nível da venda).
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS vendas_cubo (
+                granularidade TEXT NOT NULL,
+                inicio TEXT NOT NULL,
+                metodo_pagamento TEXT NOT NULL,
+                categoria TEXT NOT NULL,
+                quantidade_vendas INTEGER NOT NULL DEFAULT 0,
+                quantidade_itens REAL NOT NULL DEFAULT 0,
+                valor_total REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularidade, inicio, metodo_pagamento, categoria)
+            )
+        ''')
+        # Fotos de produtos guardadas pelo conteúdo e quantos produtos usam cada uma
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS arquivos_upload (
+                arquivo TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                tamanho INTEGER NOT NULL,
+                referencias INTEGER NOT NULL DEFAULT 0,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Até que dia vai o snapshot colunar de vendas (snapshot_vendas.py) e os
+        # dias dele alterados depois da gravação, mantidos pelos triggers abaixo
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS snapshot_vendas (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                ate TEXT NOT NULL,
+                atualizado_em TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS snapshot_vendas_dias_alterados (
+                dia TEXT PRIMARY KEY
+            )
+        ''')
+        for nome, evento, tabela, dias in TRIGGERS_SNAPSHOT_VENDAS:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {nome}
+                AFTER {evento} ON {tabela}
+                FOR EACH ROW
+                BEGIN
+                    INSERT OR IGNORE INTO snapshot_vendas_dias_alterados (dia)
+                    SELECT dia FROM ({dias})
+                    WHERE dia <= (SELECT ate FROM snapshot_vendas WHERE id = 1);
+                END;
+            ''')
+        # Índices usados pela paginação/filtro de datas dos relatórios
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas(data)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_venda_itens_venda ON venda_itens(venda_id)")
         conn.commit()
 
+        # Bancos anteriores ao cubo: monta a partir do histórico na primeira vez
+        cubo_vazio = not cursor.execute("SELECT 1 FROM vendas_cubo LIMIT 1").fetchone()
+        if cubo_vazio and cursor.execute("SELECT 1 FROM vendas LIMIT 1").fetchone():
+            reconstruir_cubo_vendas()
+
+
+def get_data_version():
+    """Retorna a versão atual dos dados usados nos relatórios."""
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT versao FROM data_version WHERE id = 1").fetchone()
+        return row['versao'] if row else 0
+
+
+def bump_data_version(conn):
+    """Incrementa a versão dos dados dentro da transação da conexão informada."""
+    conn.execute("UPDATE data_version SET versao = versao + 1 WHERE id = 1")
+
+
+# -----------------------
+# Cubo de vendas
+# -----------------------
+GRANULARIDADES_CUBO = ('hour', 'day', 'week', 'month')
+# Colunas de vendas que mudam a posição ou os valores da venda no cubo
+CAMPOS_CUBO = {'id', 'data', 'metodo_pagamento', 'total'}
+
+_INICIO_PERIODO_CUBO = """
+    CASE g.granularidade
+        WHEN 'hour' THEN strftime('%Y-%m-%d %H:00:00', v.data)
+        WHEN 'day' THEN DATE(v.data)
+        WHEN 'week' THEN DATE(v.data, 'weekday 0', '-6 days')
+        ELSE strftime('%Y-%m-01', v.data)
+    END
+"""
+
+_SQL_CUBO = """
+    WITH g(granularidade) AS (VALUES {granularidades})
+    INSERT INTO vendas_cubo
+        (granularidade, inicio, metodo_pagamento, categoria,
+         quantidade_vendas, quantidade_itens, valor_total)
+    SELECT {colunas}
+    WHERE {filtro} AND v.data IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (granularidade, inicio, metodo_pagamento, categoria) DO UPDATE SET
+        quantidade_vendas = quantidade_vendas + excluded.quantidade_vendas,
+        quantidade_itens = quantidade_itens + excluded.quantidade_itens,
+        valor_total = valor_total + excluded.valor_total
+"""
+
+_COLUNAS_CUBO_VENDA = f"""
+        g.granularidade, {_INICIO_PERIODO_CUBO}, IFNULL(v.metodo_pagamento, ''), '*',
+        ? * COUNT(*),
+        ? * SUM(IFNULL((SELECT SUM(quantidade) FROM venda_itens WHERE venda_id = v.id), 0)),
+        ? * SUM(v.total)
+    FROM vendas v CROSS JOIN g
+"""
+
+_COLUNAS_CUBO_CATEGORIA = f"""
+        g.granularidade, {_INICIO_PERIODO_CUBO}, IFNULL(v.metodo_pagamento, ''),
+        IFNULL(NULLIF(p.categoria, ''), 'Sem categoria'),
+        ? * COUNT(DISTINCT v.id),
+        ? * SUM(vi.quantidade),
+        ? * SUM(vi.quantidade * vi.preco_unitario)
+    FROM vendas v CROSS JOIN g
+    JOIN venda_itens vi ON vi.venda_id = v.id
+    LEFT JOIN produtos p ON p.id = vi.produto_id
+"""
+
+
+def _agregar_no_cubo(conn, filtro, parametros, sinal):
+    granularidades = ', '.join(f"('{g}')" for g in GRANULARIDADES_CUBO)
+    for colunas in (_COLUNAS_CUBO_VENDA, _COLUNAS_CUBO_CATEGORIA):
+        conn.execute(
+            _SQL_CUBO.format(granularidades=granularidades, colunas=colunas, filtro=filtro),
+            (sinal, sinal, sinal, *parametros)
+        )
+
+
+def aplicar_venda_no_cubo(conn, venda_id, sinal=1):
+    """Soma (sinal=1) ou retira (sinal=-1) a venda do cubo, na transação de `conn`.
+
+    Deve ser chamada com a venda e seus itens no estado a ser somado/retirado:
+    antes de alterar ou excluir, com -1; depois de inserir ou alterar, com 1.
+    """
+    _agregar_no_cubo(conn, "v.id = ?", (venda_id,), sinal)
+    if sinal < 0:
+        # Remove apenas as células da venda que ficaram zeradas
+        conn.execute(f"""
+            WITH g(granularidade) AS (VALUES {', '.join(f"('{g}')" for g in GRANULARIDADES_CUBO)})
+            DELETE FROM vendas_cubo
+            WHERE quantidade_vendas <= 0 AND (granularidade, inicio) IN (
+                SELECT g.granularidade, {_INICIO_PERIODO_CUBO}
+                FROM vendas v CROSS JOIN g WHERE v.id = ?
+            )
+        """, (venda_id,))
+
+
+@contextmanager
+def _vendas_refeitas_no_cubo(conn, sql, parametros=()):
+    """Retira do cubo as vendas selecionadas por `sql` (ids) e, ao final do
+    bloco, soma de volta as que ainda existirem, na transação de `conn`.
+
+    Para alterações fora de vendas/venda_itens que mudam o cubo: categoria do
+    produto e exclusões em cascata (produto -> itens, usuário -> vendas).
+    """
+    vendas = [row[0] for row in conn.execute(sql, parametros)]
+    for venda_id in vendas:
+        aplicar_venda_no_cubo(conn, venda_id, -1)
+    yield
+    for venda_id in vendas:
+        aplicar_venda_no_cubo(conn, venda_id)
+
+
+_SQL_VENDAS_DO_PRODUTO = "SELECT DISTINCT venda_id FROM venda_itens WHERE produto_id = ?"
+_SQL_VENDAS_DO_USUARIO = "SELECT id FROM vendas WHERE usuario_id = ?"
+
+
+def reconstruir_cubo_vendas():
+    """Recalcula o cubo inteiro a partir de vendas e venda_itens."""
+    with get_db_connection() as conn:
+        conn.execute('BEGIN')
+        conn.execute("DELETE FROM vendas_cubo")
+        _agregar_no_cubo(conn, "1", (), 1)
+        total = conn.execute("SELECT COUNT(*) FROM vendas_cubo").fetchone()[0]
+        bump_data_version(conn)
+        conn.commit()
+    return total
+
 
 
 
@@ -209,7 +444,10 @@ def update_user_role(user_id, new_role):
 
 def delete_user(user_id):
     with get_db_connection() as conn:
-        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        # As vendas do usuário são excluídas em cascata
+        with _vendas_refeitas_no_cubo(conn, _SQL_VENDAS_DO_USUARIO, (user_id,)):
+            conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        bump_data_version(conn)
         conn.commit()
 
 # -----------------------
@@ -225,6 +463,7 @@ def create_fornecedor(nome, cnpj, contato, endereco=None):
                 "INSERT INTO fornecedores (nome, cnpj, contato, endereco) VALUES (?, ?, ?, ?)",
                 (nome, cnpj, contato, endereco)
             )
+            bump_data_version(conn)
             conn.commit()
             return cursor.lastrowid
         except sqlite3.IntegrityError as e:
@@ -244,6 +483,7 @@ def update_fornecedor(fornecedor_id, **kwargs):
     with get_db_connection() as conn:
         try:
             conn.execute(f"UPDATE fornecedores SET {', '.join(fields)} WHERE id = ?", params)
+            bump_data_version(conn)
             conn.commit()
         except sqlite3.IntegrityError as e:
             if 'UNIQUE' in str(e) and 'cnpj' in str(e):
@@ -263,6 +503,7 @@ def get_all_fornecedores():
 def delete_fornecedor(fornecedor_id):
     with get_db_connection() as conn:
         conn.execute("DELETE FROM fornecedores WHERE id = ?", (fornecedor_id,))
+        bump_data_version(conn)
         conn.commit()
 
 # -----------------------
@@ -289,6 +530,7 @@ def create_produto(nome, descricao, categoria, preco, quantidade,
             (nome, descricao, categoria, preco, quantidade, estoque_minimo,
              codigo_barras, foto_filename, fornecedor_id, data_validade, tipo_venda)
         )
+        bump_data_version(conn)
         conn.commit()
         return cursor.lastrowid
 
@@ -313,12 +555,19 @@ def update_produto(produto_id, **kwargs):
         params.append(value)
     params.append(produto_id)
     with get_db_connection() as conn:
-        conn.execute(f"UPDATE produtos SET {', '.join(fields)} WHERE id = ?", params)
+        # Só a categoria do produto entra no cubo
+        with (_vendas_refeitas_no_cubo(conn, _SQL_VENDAS_DO_PRODUTO, (produto_id,))
+              if 'categoria' in kwargs else nullcontext()):
+            conn.execute(f"UPDATE produtos SET {', '.join(fields)} WHERE id = ?", params)
+        bump_data_version(conn)
         conn.commit()
 
 def delete_produto(produto_id):
     with get_db_connection() as conn:
-        conn.execute("DELETE FROM produtos WHERE id = ?", (produto_id,))
+        # Os itens de venda do produto são excluídos em cascata
+        with _vendas_refeitas_no_cubo(conn, _SQL_VENDAS_DO_PRODUTO, (produto_id,)):
+            conn.execute("DELETE FROM produtos WHERE id = ?", (produto_id,))
+        bump_data_version(conn)
         conn.commit()
 
 def excluir_produto(produto_id: int):
@@ -417,6 +666,8 @@ def create_venda(venda_id, cliente_cpf, cliente_nome, total,
             (venda_id, cliente_cpf, cliente_nome, total, metodo_pagamento,
              usuario_id, status_pagamento, data_vencimento, observacao)
         )
+        aplicar_venda_no_cubo(conn, venda_id)
+        bump_data_version(conn)
         conn.commit()
         return venda_id
 
@@ -437,13 +688,22 @@ def update_venda(venda_id, **kwargs):
         fields.append(f"{key} = ?")
         params.append(value)
     params.append(venda_id)
+    # Status e observação não entram no cubo; evita recalcular nesses casos
+    altera_cubo = bool(CAMPOS_CUBO.intersection(kwargs))
     with get_db_connection() as conn:
+        if altera_cubo:
+            aplicar_venda_no_cubo(conn, venda_id, -1)
         conn.execute(f"UPDATE vendas SET {', '.join(fields)} WHERE id = ?", params)
+        if altera_cubo:
+            aplicar_venda_no_cubo(conn, kwargs.get('id', venda_id))
+        bump_data_version(conn)
         conn.commit()
 
 def delete_venda(venda_id):
     with get_db_connection() as conn:
+        aplicar_venda_no_cubo(conn, venda_id, -1)
         conn.execute("DELETE FROM vendas WHERE id = ?", (venda_id,))
+        bump_data_version(conn)
         conn.commit()
 
 def processar_venda(venda_id, venda_data, usuario_id):
@@ -484,6 +744,8 @@ def processar_venda(venda_id, venda_data, usuario_id):
                 "UPDATE produtos SET quantidade = quantidade - ? WHERE id = ?",
                 (item['quantidade'], item['id'])
             )
+        aplicar_venda_no_cubo(conn, venda_id)
+        bump_data_version(conn)
         conn.commit()
     return True
 
@@ -501,6 +763,7 @@ def listar_produtos_simples():
 def create_venda_item(venda_id, produto_id, quantidade, preco_unitario):
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        aplicar_venda_no_cubo(conn, venda_id, -1)
         cursor.execute(
             """
             INSERT INTO venda_itens (venda_id, produto_id, quantidade, preco_unitario)
@@ -508,6 +771,8 @@ def create_venda_item(venda_id, produto_id, quantidade, preco_unitario):
             """,
             (venda_id, produto_id, quantidade, preco_unitario)
         )
+        aplicar_venda_no_cubo(conn, venda_id)
+        bump_data_version(conn)
         conn.commit()
         return cursor.lastrowid
 
@@ -516,6 +781,10 @@ def get_venda_items(venda_id):
         cursor = conn.execute("SELECT * FROM venda_itens WHERE venda_id = ?", (venda_id,))
         return cursor.fetchall()
 
+def _vendas_do_item(conn, item_id):
+    row = conn.execute("SELECT venda_id FROM venda_itens WHERE id = ?", (item_id,)).fetchone()
+    return {row['venda_id']} if row else set()
+
 def update_venda_item(item_id, **kwargs):
     fields = []
     params = []
@@ -524,13 +793,25 @@ def update_venda_item(item_id, **kwargs):
         params.append(value)
     params.append(item_id)
     with get_db_connection() as conn:
+        vendas = _vendas_do_item(conn, item_id) | ({kwargs['venda_id']} if 'venda_id' in kwargs else set())
+        for venda_id in vendas:
+            aplicar_venda_no_cubo(conn, venda_id, -1)
         conn.execute(f"UPDATE venda_itens SET {', '.join(fields)} WHERE id = ?", params)
+        for venda_id in vendas:
+            aplicar_venda_no_cubo(conn, venda_id)
+        bump_data_version(conn)
         conn.commit()
 
 
 def delete_venda_item(item_id):
     with get_db_connection() as conn:
+        vendas = _vendas_do_item(conn, item_id)
+        for venda_id in vendas:
+            aplicar_venda_no_cubo(conn, venda_id, -1)
         conn.execute("DELETE FROM venda_itens WHERE id = ?", (item_id,))
+        for venda_id in vendas:
+            aplicar_venda_no_cubo(conn, venda_id)
+        bump_data_version(conn)
         conn.commit()
 
 
@@ -570,6 +851,56 @@ def create_user(username, email, password, role='funcionario'):
 # ---------------------------------------------------------------
 
 
+def _registrar_upload(conn, upload):
+    """Registra a foto na transação do produto; True se o arquivo é novo."""
+    return registrar_upload(conn, current_app.config['UPLOAD_FOLDER'], upload)
+
+
+def _upload_gravado(upload, novo):
+    """Após o commit: gera as versões reduzidas de uma foto nova."""
+    if novo:
+        processar_foto(upload[0])
+
+
+def _upload_rejeitado(upload):
+    """Após a falha ao gravar o produto: descarta o temporário e a foto, se
+    ela chegou a ser posta no lugar e nenhum produto a usa."""
+    descartar_upload(upload)
+    _remover_fotos_sem_uso([upload[0]])
+
+
+def _remover_fotos_sem_uso(nomes):
+    """Apaga, após o commit, as fotos (e versões reduzidas) que ficaram sem uso."""
+    if not nomes:
+        return
+    with get_db_connection() as conn:
+        for nome in nomes:
+            try:
+                remover_sem_uso(conn, current_app.config['UPLOAD_FOLDER'], nome, descartar_foto)
+            except Exception as rm_err:
+                logging.error(f"Falha ao remover arquivo: {rm_err}")
+
+
+def deduplicar_fotos_produtos():
+    """Migração das fotos para nomes pelo conteúdo (ver armazenamento_fotos)."""
+    with get_db_connection() as conn:
+        bump_data_version(conn)
+        return deduplicar_pasta(conn, current_app.config['UPLOAD_FOLDER'])
+
+
+def coletar_fotos_orfas(carencia, pasta_quarentena=None):
+    """Recolhe as fotos sem produto (e suas versões reduzidas) da pasta de
+    uploads; ver armazenamento_fotos.coletar_orfaos."""
+    pasta = current_app.config['UPLOAD_FOLDER']
+    with get_db_connection() as conn:
+        resumo = coletar_orfaos(conn, pasta, carencia, pasta_quarentena)
+    derivados, liberados = remover_derivados_orfaos(
+        pasta, current_app.config['UPLOAD_DERIVATIVES_FOLDER'], carencia)
+    resumo['derivados'] = derivados
+    resumo['bytes_liberados'] += liberados
+    return resumo
+
+
 def inserir_produto(form: dict, foto):
     # Validações básicas
     nome = form.get('nome', '').strip()
@@ -602,6 +933,12 @@ def inserir_produto(form: dict, foto):
         'tipo_venda': form.get('tipo_venda'),
         'foto': None
     }
+
+    upload = None
+    novo = False
+    if foto and foto.filename:
+        upload = guardar_foto(foto, current_app.config['UPLOAD_FOLDER'])
+        produto_data['foto'] = upload[0]
     
     conn = None
     cursor = None
@@ -632,14 +969,21 @@ def inserir_produto(form: dict, foto):
             )
             
             cursor.execute(query, valores)
+            if upload:
+                novo = _registrar_upload(conn, upload)
+            bump_data_version(conn)
             conn.commit()
             
             produto_id = cursor.lastrowid
-            return produto_id
             
     except Exception as e:
         logging.error(f"Erro ao inserir produto no banco de dados: {str(e)}")
+        if upload:
+            _upload_rejeitado(upload)
         raise ValueError("Erro ao salvar produto no banco de dados")
+    if upload:
+        _upload_gravado(upload, novo)
+    return produto_id
 
 def atualizar_produto(produto_id: int, form: dict, foto):
     # Buscar existente
@@ -672,15 +1016,11 @@ def atualizar_produto(produto_id: int, form: dict, foto):
     update_data['tipo_venda'] = form.get('tipo_venda') or existing['tipo_venda']
 
     # Processar nova imagem
-    new_filename = None
+    upload = None
+    novo = False
     if foto and foto.filename:
-        filename = secure_filename(f"{datetime.now().timestamp()}_{foto.filename}")
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
-        path = os.path.join(upload_folder, filename)
-        foto.save(path)
-        new_filename = filename
-        update_data['foto'] = filename
+        upload = guardar_foto(foto, current_app.config['UPLOAD_FOLDER'])
+        update_data['foto'] = upload[0]
     else:
         update_data['foto'] = existing['foto']
 
@@ -689,26 +1029,30 @@ def atualizar_produto(produto_id: int, form: dict, foto):
     set_clause = ', '.join([f"{col} = ?" for col in cols])
     params = [update_data[col] for col in cols] + [produto_id]
 
+    liberadas = []
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f'UPDATE produtos SET {set_clause} WHERE id = ?', params)
+            with (_vendas_refeitas_no_cubo(conn, _SQL_VENDAS_DO_PRODUTO, (produto_id,))
+                  if update_data['categoria'] != existing['categoria'] else nullcontext()):
+                cursor.execute(f'UPDATE produtos SET {set_clause} WHERE id = ?', params)
+            if upload:
+                # Soma antes de liberar: reenviar a mesma imagem não a apaga
+                novo = _registrar_upload(conn, upload)
+                if existing['foto'] and liberar_referencia(conn, nome_foto(existing['foto'])):
+                    liberadas.append(nome_foto(existing['foto']))
+            bump_data_version(conn)
             conn.commit()
     except Exception as e:
         # rollback imagem nova
-        if new_filename:
-            try:
-                os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], new_filename))
-            except Exception as rm_err:
-                logging.error(f"Falha ao remover arquivo: {rm_err}")
+        if upload:
+            _upload_rejeitado(upload)
         raise
 
-    # remover imagem antiga
-    if new_filename and existing['foto']:
-        try:
-            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], existing['foto']))
-        except Exception as rm_err:
-            logging.error(f"Falha ao remover arquivo antigo: {rm_err}")
+    if upload:
+        _upload_gravado(upload, novo)
+    # remover imagem antiga, se nenhum outro produto a usa
+    _remover_fotos_sem_uso(liberadas)
 
 
 def excluir_produto(produto_id: int):
@@ -717,14 +1061,15 @@ def excluir_produto(produto_id: int):
         cursor.execute('SELECT foto FROM produtos WHERE id = ?', (produto_id,))
         row = cursor.fetchone()
         foto = row['foto'] if row else None
-        cursor.execute('DELETE FROM produtos WHERE id = ?', (produto_id,))
+        # Os itens de venda do produto são excluídos em cascata
+        with _vendas_refeitas_no_cubo(conn, _SQL_VENDAS_DO_PRODUTO, (produto_id,)):
+            cursor.execute('DELETE FROM produtos WHERE id = ?', (produto_id,))
+        liberada = bool(foto) and liberar_referencia(conn, nome_foto(foto))
+        bump_data_version(conn)
         conn.commit()
-    # remover foto
-    if foto:
-        try:
-            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], foto))
-        except Exception as rm_err:
-            logging.error(f"Falha ao remover arquivo: {rm_err}")
+    # remover foto, se nenhum outro produto a usa
+    if liberada:
+        _remover_fotos_sem_uso([nome_foto(foto)])
             
 def get_fornecedores(search=None):
     """Retorna lista de fornecedores com todos os campos, filtrados por busca (nome ou CNPJ)."""
@@ -0,0 +1,121 @@
+"""Benchmark: relatórios via SQL (registro_relatorios) x motor NumPy (analise_vendas).
+
+Gera um banco sintético e mede cada relatório nas duas implementações.
+
+    python benchmarks/bench_analise_vendas.py --itens 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def popular(itens, seed=42):
+    from banco_dados import get_db_connection, init_db
+    init_db()
+    rnd = random.Random(seed)
+    categorias = ['BOI', 'PORCO', 'FRANGO', 'BEBIDAS', 'EMBUTIDOS']
+    clientes = [f'Cliente {i}' for i in range(500)] + [None] * 100
+    metodos = ['dinheiro', 'pix', 'cartao', 'pagamento_prazo']
+    inicio = datetime(2022, 1, 1)
+
+    with get_db_connection() as conn:
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('bench', 'b@b', 'x')")
+        conn.executemany(
+            "INSERT INTO produtos (id, nome, categoria, preco, quantidade) VALUES (?, ?, ?, ?, 0)",
+            [(i, f'Produto {i}', categorias[i % len(categorias)], rnd.uniform(5, 90))
+             for i in range(1, 121)]
+        )
+
+        vendas, venda_itens = [], []
+        n = 0
+        while n < itens:
+            venda_id = f'V{len(vendas):09d}'
+            data = inicio + timedelta(seconds=rnd.randrange(3 * 365 * 86400))
+            total = 0.0
+            for _ in range(rnd.randint(1, 5)):
+                preco = round(rnd.uniform(5, 90), 2)
+                quantidade = round(rnd.uniform(0.2, 3), 3)
+                venda_itens.append((venda_id, rnd.randint(1, 120), quantidade, preco))
+                total += quantidade * preco
+                n += 1
+            vendas.append((venda_id, data.strftime('%Y-%m-%d %H:%M:%S'), rnd.choice(clientes),
+                           round(total, 2), rnd.choice(metodos)))
+
+        conn.executemany(
+            "INSERT INTO vendas (id, data, cliente_nome, total, metodo_pagamento, usuario_id) "
+            "VALUES (?, ?, ?, ?, ?, 1)", vendas)
+        conn.executemany(
+            "INSERT INTO venda_itens (venda_id, produto_id, quantidade, preco_unitario) "
+            "VALUES (?, ?, ?, ?)", venda_itens)
+        conn.commit()
+    return len(vendas), len(venda_itens)
+
+
+def cronometrar(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--itens', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        os.environ['DB_PATH'] = os.path.join(pasta, 'bench.db')
+
+        import analise_vendas
+        from banco_dados import get_db_connection
+        from registro_relatorios import get_relatorio
+
+        t = time.perf_counter()
+        total_vendas, total_itens = popular(args.itens)
+        print(f"Banco sintético: {total_vendas} vendas, {total_itens} itens "
+              f"({time.perf_counter() - t:.1f}s)")
+
+        def sql(chave, **parametros):
+            relatorio = get_relatorio(chave)
+            valores = relatorio.validar(parametros)
+            with get_db_connection() as conn:
+                return relatorio.executar(conn, valores)
+
+        t = time.perf_counter()
+        colunas = analise_vendas.carregar_colunas()
+        carga = time.perf_counter() - t
+        print(f"Carga das colunas NumPy: {carga * 1000:.0f} ms\n")
+
+        casos = [
+            ('vendas_periodo',
+             lambda: sql('vendas_periodo', start_date='2022-01-01', end_date='2024-12-31'),
+             lambda: analise_vendas.vendas_periodo(colunas, '2022-01-01', '2024-12-31')),
+            ('comparativo',
+             lambda: sql('comparativo'),
+             lambda: analise_vendas.comparativo(colunas)),
+            ('vendas_categorias',
+             lambda: sql('vendas_categorias'),
+             lambda: analise_vendas.vendas_categorias(colunas)),
+            ('clientes_fieis',
+             lambda: sql('clientes_fieis', limit=10),
+             lambda: analise_vendas.clientes_fieis(colunas, 10)),
+        ]
+
+        print(f"{'relatório':<20}{'SQL (ms)':>12}{'NumPy (ms)':>12}{'ganho':>10}")
+        for nome, via_sql, via_numpy in casos:
+            t_sql = cronometrar(via_sql, args.repeticoes)
+            t_np = cronometrar(via_numpy, args.repeticoes)
+            print(f"{nome:<20}{t_sql * 1000:>12.1f}{t_np * 1000:>12.1f}{t_sql / t_np:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import glob
+import logging
+import os
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class CachePDF:
+    """PDFs já renderizados, gravados em disco e identificados pela versão dos
+    dados (tabela data_version) e pelo dia.
+
+    Requisições simultâneas para a mesma chave aguardam uma única renderização.
+    """
+
+    def __init__(self, pasta, manter=2):
+        self.pasta = pasta
+        self.manter = manter
+        self._lock = threading.Lock()
+        self._locks_chave = defaultdict(threading.Lock)
+        self._estatisticas = {'hits': 0, 'renderizacoes': 0, 'aguardaram': 0}
+        os.makedirs(pasta, exist_ok=True)
+
+    @staticmethod
+    def chave(versao, dia):
+        return f"{dia}_v{versao}"
+
+    def caminho(self, chave):
+        return os.path.join(self.pasta, f"relatorio_completo_{chave}.pdf")
+
+    def obter(self, versao, dia, renderizar):
+        """Retorna (chave, caminho) do PDF, chamando `renderizar(caminho)` se
+        ainda não houver arquivo para a chave."""
+        chave = self.chave(versao, dia)
+        caminho = self.caminho(chave)
+        if os.path.exists(caminho):
+            self._contar('hits')
+            return chave, caminho
+
+        with self._lock:
+            lock_chave = self._locks_chave[chave]
+        with lock_chave:
+            # Outra requisição pode ter renderizado enquanto esta aguardava
+            if os.path.exists(caminho):
+                self._contar('aguardaram')
+                return chave, caminho
+            temporario = f"{caminho}.{threading.get_ident()}.tmp"
+            try:
+                renderizar(temporario)
+                os.replace(temporario, caminho)
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+            self._contar('renderizacoes')
+
+        with self._lock:
+            self._locks_chave.pop(chave, None)
+        self._remover_antigos()
+        return chave, caminho
+
+    def _contar(self, evento):
+        with self._lock:
+            self._estatisticas[evento] += 1
+
+    def _remover_antigos(self):
+        # Mantém os mais recentes: um download em andamento pode estar lendo a versão anterior
+        arquivos = sorted(glob.glob(os.path.join(self.pasta, 'relatorio_completo_*.pdf')),
+                          key=os.path.getmtime, reverse=True)
+        for arquivo in arquivos[self.manter:]:
+            try:
+                os.remove(arquivo)
+            except OSError:
+                logger.warning("Não foi possível remover o PDF em cache %s", arquivo, exc_info=True)
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self._estatisticas)
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class CacheRelatorios:
+    """Cache LRU com TTL para resultados dos relatórios unificados.
+
+    Cada entrada guarda a versão dos dados (tabela data_version) em que foi
+    calculada; quando a versão muda a entrada é descartada na próxima leitura.
+    """
+
+    def __init__(self, max_entradas=128, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._estatisticas = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    @staticmethod
+    def chave(report_type, params):
+        """Normaliza os parâmetros (dict ou sequência) em uma chave hashable."""
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        else:
+            params = tuple(params)
+        return (report_type, params)
+
+    def get(self, report_type, params, versao):
+        chave = self.chave(report_type, params)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                versao_entrada, expira_em, dados = entrada
+                if versao_entrada == versao and expira_em > time.monotonic():
+                    self._entradas.move_to_end(chave)
+                    self._estatisticas[report_type]['hits'] += 1
+                    return dados
+                del self._entradas[chave]
+            self._estatisticas[report_type]['misses'] += 1
+            return None
+
+    def set(self, report_type, params, versao, dados):
+        chave = self.chave(report_type, params)
+        with self._lock:
+            self._entradas[chave] = (versao, time.monotonic() + self.ttl, dados)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def obter_ou_calcular(self, report_type, params, versao, calcular):
+        """Retorna o resultado em cache ou executa `calcular()` e armazena."""
+        dados = self.get(report_type, params, versao)
+        if dados is None:
+            dados = calcular()
+            self.set(report_type, params, versao, dados)
+        return dados
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+                'relatorios': {tipo: dict(valores)
+                               for tipo, valores in self._estatisticas.items()}
+            }
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._estatisticas.clear()
@@ -0,0 +1,170 @@
+"""Exportação dos relatórios unificados em CSV e XLSX por streaming.
+
+As linhas são lidas do cursor do relatório em lotes e escritas conforme são
+produzidas, sem montar o resultado inteiro em memória. O XLSX é gerado à mão
+(zip + XML da planilha com strings inline), linha a linha.
+"""
+import csv
+import io
+import math
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from banco_dados import get_db_connection
+
+TAMANHO_LOTE = 500
+
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def linhas_relatorio(relatorio, valores):
+    """Gera o cabeçalho e depois cada linha (tupla) do relatório."""
+    if relatorio.paginado:
+        # Exporta o intervalo inteiro: LIMIT -1 no SQLite não limita
+        valores = dict(valores, page=1, per_page=-1)
+    with get_db_connection() as conn:
+        cursor = relatorio.cursor(conn, valores)
+        yield [coluna[0] for coluna in cursor.description]
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE)
+            if not lote:
+                break
+            for row in lote:
+                yield tuple(row)
+
+
+def exportar(relatorio, valores, formato):
+    linhas = linhas_relatorio(relatorio, valores)
+    if formato == 'csv':
+        return gerar_csv(linhas)
+    return gerar_xlsx(linhas, relatorio.titulo)
+
+
+# ---------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------
+
+def gerar_csv(linhas):
+    # BOM + ';' para o Excel em português abrir acentos e colunas corretamente
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    yield '\ufeff'.encode('utf-8')
+    for i, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if i % TAMANHO_LOTE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+# ---------------------------------------------------------------
+# XLSX
+# ---------------------------------------------------------------
+
+class _SaidaStreaming(io.RawIOBase):
+    """Destino não pesquisável para o ZipFile; os bytes são retirados aos poucos."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+# Caracteres de controle não são permitidos em XML 1.0
+_CONTROLE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _nome_planilha(titulo):
+    return escape(re.sub(r'[\[\]:*?/\\]', ' ', titulo or 'Relatório')[:31], {'"': '&quot;'})
+
+
+def _celula(valor):
+    # NaN e infinito não são números válidos no XLSX (o Excel recusa o arquivo)
+    if valor is None or (isinstance(valor, float) and not math.isfinite(valor)):
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor!r}</v></c>'
+    texto = escape(_CONTROLE.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def gerar_xlsx(linhas, titulo=None):
+    saida = _SaidaStreaming()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        arquivo.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        arquivo.writestr('_rels/.rels', XLSX_RELS)
+        arquivo.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(nome=_nome_planilha(titulo)))
+        arquivo.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield saida.retirar()
+
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w') as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            partes = []
+            for i, linha in enumerate(linhas, 1):
+                partes.append('<row>' + ''.join(_celula(v) for v in linha) + '</row>')
+                if i % TAMANHO_LOTE == 0:
+                    planilha.write(''.join(partes).encode('utf-8'))
+                    partes.clear()
+                    yield saida.retirar()
+            planilha.write(''.join(partes).encode('utf-8'))
+            planilha.write(b'</sheetData></worksheet>')
+    yield saida.retirar()
@@ -0,0 +1,178 @@
+"""Fila local de jobs para relatórios demorados.
+
+Os jobs ficam na tabela report_jobs (criada em init_db) e são executados por
+threads de trabalho do próprio processo. Cada tipo de job é uma função
+registrada com `registrar_tipo`, que recebe os parâmetros, um callback de
+progresso e o caminho do arquivo de saída, e retorna (nome_download, mimetype).
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from banco_dados import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+
+class TipoJobDesconhecido(ValueError):
+    pass
+
+
+class FilaRelatorios:
+    def __init__(self, pasta_resultados, workers=2, ttl_resultado=3600):
+        self.pasta_resultados = pasta_resultados
+        self.workers = workers
+        self.ttl_resultado = ttl_resultado
+        self._tipos = {}
+        self._fila = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def registrar_tipo(self, tipo, funcao):
+        self._tipos[tipo] = funcao
+
+    # -----------------------
+    # API pública
+    # -----------------------
+    def submeter(self, tipo, parametros=None, usuario_id=None):
+        """Cria o job e o coloca na fila; retorna o id."""
+        if tipo not in self._tipos:
+            raise TipoJobDesconhecido(f"Tipo de job desconhecido: {tipo}")
+        job_id = uuid.uuid4().hex
+        with get_db_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO report_jobs (id, tipo, parametros, status, progresso, usuario_id)
+                VALUES (?, ?, ?, ?, 0, ?)
+                """,
+                (job_id, tipo, json.dumps(parametros or {}), STATUS_PENDENTE, usuario_id)
+            )
+            conn.commit()
+        self._garantir_workers()
+        self._fila.put(job_id)
+        return job_id
+
+    def status(self, job_id):
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['parametros'] = json.loads(job['parametros'] or '{}')
+        return job
+
+    def caminho_resultado(self, job):
+        if job['status'] != STATUS_CONCLUIDO or not job['arquivo']:
+            return None
+        caminho = os.path.join(self.pasta_resultados, job['arquivo'])
+        return caminho if os.path.exists(caminho) else None
+
+    def limpar_expirados(self):
+        """Remove jobs concluídos/falhos cujo prazo de download expirou."""
+        agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with get_db_connection() as conn:
+            expirados = conn.execute(
+                "SELECT id, arquivo FROM report_jobs WHERE expira_em IS NOT NULL AND expira_em < ?",
+                (agora,)
+            ).fetchall()
+            for job in expirados:
+                if job['arquivo']:
+                    try:
+                        os.remove(os.path.join(self.pasta_resultados, job['arquivo']))
+                    except FileNotFoundError:
+                        pass
+                conn.execute("DELETE FROM report_jobs WHERE id = ?", (job['id'],))
+            conn.commit()
+        if expirados:
+            logger.info(f"Jobs de relatório expirados removidos: {len(expirados)}")
+        return len(expirados)
+
+    def recuperar_pendentes(self):
+        """Na inicialização: reenfileira pendentes e marca como erro os interrompidos."""
+        with get_db_connection() as conn:
+            conn.execute(
+                "UPDATE report_jobs SET status = ?, mensagem = ?, expira_em = ? WHERE status = ?",
+                (STATUS_ERRO, 'Interrompido pela reinicialização do servidor',
+                 self._expiracao(), STATUS_EXECUTANDO)
+            )
+            conn.commit()
+            pendentes = [row['id'] for row in conn.execute(
+                "SELECT id FROM report_jobs WHERE status = ? ORDER BY criado_em",
+                (STATUS_PENDENTE,)
+            )]
+        if pendentes:
+            self._garantir_workers()
+            for job_id in pendentes:
+                self._fila.put(job_id)
+        return len(pendentes)
+
+    # -----------------------
+    # Execução
+    # -----------------------
+    def _garantir_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._loop, name='fila-relatorios', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _loop(self):
+        while True:
+            job_id = self._fila.get()
+            try:
+                self.executar(job_id)
+            except Exception:
+                logger.error(f"Falha inesperada no job {job_id}", exc_info=True)
+            finally:
+                self._fila.task_done()
+
+    def _expiracao(self):
+        return (datetime.now() + timedelta(seconds=self.ttl_resultado)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _atualizar(self, job_id, **campos):
+        colunas = ', '.join(f"{c} = ?" for c in campos)
+        with get_db_connection() as conn:
+            conn.execute(f"UPDATE report_jobs SET {colunas} WHERE id = ?",
+                         list(campos.values()) + [job_id])
+            conn.commit()
+
+    def executar(self, job_id):
+        """Executa um job de forma síncrona (usado pelas threads de trabalho)."""
+        job = self.status(job_id)
+        if not job or job['status'] != STATUS_PENDENTE:
+            return
+        funcao = self._tipos[job['tipo']]
+        os.makedirs(self.pasta_resultados, exist_ok=True)
+        caminho = os.path.join(self.pasta_resultados, job_id)
+
+        self._atualizar(job_id, status=STATUS_EXECUTANDO,
+                        iniciado_em=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+        def progresso(percentual, mensagem=None):
+            self._atualizar(job_id, progresso=max(0, min(int(percentual), 100)), mensagem=mensagem)
+
+        try:
+            nome_download, mimetype = funcao(job['parametros'], progresso, caminho)
+        except Exception as e:
+            logger.error(f"Erro no job de relatório {job_id} ({job['tipo']}): {e}", exc_info=True)
+            if os.path.exists(caminho):
+                os.remove(caminho)
+            self._atualizar(job_id, status=STATUS_ERRO, mensagem=str(e),
+                            concluido_em=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                            expira_em=self._expiracao())
+            return
+
+        self._atualizar(job_id, status=STATUS_CONCLUIDO, progresso=100, mensagem=None,
+                        arquivo=job_id, nome_download=nome_download, mimetype=mimetype,
+                        concluido_em=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        expira_em=self._expiracao())
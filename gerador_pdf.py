@@ -4,16 +4,35 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from datetime import datetime
-import sqlite3
-from io import BytesIO
-from flask import make_response
-from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, closing
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Optional
+from flask import request, send_file
+import io
+import logging
+import multiprocessing
 import os
+import tempfile
+import threading
+import time
 
+from banco_dados import get_db_connection
+from registro_relatorios import Parametro, ParametroInvalido
+
+logger = logging.getLogger(__name__)
+
+# Consultas das seções executadas em paralelo (uma conexão de leitura por thread)
+MAX_CONSULTAS_PARALELAS = 4
+
+@lru_cache(maxsize=1)
 def get_custom_styles():
+    # Folha de estilos compartilhada por todos os PDFs (somente leitura no build)
     styles = getSampleStyleSheet()
-    
+
     # Verifica se o estilo já existe antes de adicionar
     if 'Title' not in styles:
         styles.add(ParagraphStyle(name='Title', fontSize=18, alignment=1, spaceAfter=12))
@@ -23,383 +42,538 @@ def get_custom_styles():
         styles.add(ParagraphStyle(name='Header', fontSize=12, alignment=1, spaceAfter=6))
     if 'Body' not in styles:
         styles.add(ParagraphStyle(name='Body', fontSize=10, alignment=0, spaceAfter=3))
-    
-    return styles
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('acougue.db')
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    try:
-        yield conn
-    finally:
-        conn.close()
+    return styles
 
 def format_currency(value):
-    return f"R$ {float(value):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"R$ {float(value or 0):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
-def gerar_pdf_completo():
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    styles = get_custom_styles()
-    
-    
-    # Cabeçalho
-    logo_path = os.path.join('static', 'images', 'logo.png') if os.path.exists(os.path.join('static', 'images', 'logo.png')) else None
-    
-    if logo_path:
-        logo = Image(logo_path, width=1.5*inch, height=1*inch)
-        elements.append(logo)
-    
-    elements.append(Paragraph("Relatório Completo do Açougue", styles['Title']))
-    elements.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Subtitle']))
-    elements.append(Spacer(1, 0.5*inch))
-    
-    # 1. Relatórios de Vendas
-    elements.append(Paragraph("1. Relatórios de Vendas", styles['Header']))
-    
-    # Vendas por Período
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+
+ESTILO_TABELA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+@dataclass(frozen=True)
+class SecaoPDF:
+    chave: str
+    grupo: str           # título do grupo (ex.: "1. Relatórios de Vendas")
+    titulo: str
+    sql: str
+    cabecalho: tuple
+    linha: Callable      # row -> lista de textos da linha da tabela
+    # Seções de vendas aceitam período (:inicio, :fim exclusivo); sem datas
+    # informadas usam os últimos `dias_padrao` dias, ou todo o histórico se None
+    filtra_periodo: bool = False
+    dias_padrao: Optional[int] = None
+    # Comandos de estilo adicionais a partir das linhas consultadas
+    estilo: Callable = lambda rows: []
+
+
+def _cor_por_linha(coluna, cor):
+    """Comandos TEXTCOLOR da coluna informada, com a cor calculada por linha."""
+    def estilo(rows):
+        return [('TEXTCOLOR', (coluna, i), (coluna, i), cor(row))
+                for i, row in enumerate(rows, 1)]
+    return estilo
+
+
+SECOES_PDF = (
+    SecaoPDF(
+        chave='vendas_periodo',
+        grupo="1. Relatórios de Vendas",
+        titulo="Vendas por Período",
+        sql='''
             SELECT DATE(data) as data, COUNT(*) as total_vendas, SUM(total) as valor_total, AVG(total) as ticket_medio
             FROM vendas
-            WHERE DATE(data) BETWEEN DATE('now', '-30 days') AND DATE('now')
+            WHERE data >= :inicio AND data < :fim
             GROUP BY DATE(data)
             ORDER BY data
-        ''')
-        vendas_periodo = cursor.fetchall()
-    
-    data = [['Data', 'Total Vendas', 'Valor Total', 'Ticket Médio']]
-    for row in vendas_periodo:
-        data.append([
-            row['data'],
-            str(row['total_vendas']),
-            format_currency(row['valor_total']),
-            format_currency(row['ticket_medio'])
-        ])
-    
-    elements.append(Paragraph("Vendas por Período (Últimos 30 dias)", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Vendas por Categoria
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT p.categoria, SUM(vi.quantidade) as quantidade_vendida, 
+        ''',
+        cabecalho=('Data', 'Total Vendas', 'Valor Total', 'Ticket Médio'),
+        linha=lambda row: [row['data'], str(row['total_vendas']),
+                           format_currency(row['valor_total']), format_currency(row['ticket_medio'])],
+        filtra_periodo=True,
+        dias_padrao=30,
+    ),
+    SecaoPDF(
+        chave='vendas_categoria',
+        grupo="1. Relatórios de Vendas",
+        titulo="Vendas por Categoria",
+        sql='''
+            SELECT p.categoria, SUM(vi.quantidade) as quantidade_vendida,
                    SUM(vi.quantidade * vi.preco_unitario) as valor_total
             FROM venda_itens vi
             JOIN produtos p ON vi.produto_id = p.id
+            JOIN vendas v ON v.id = vi.venda_id
+            WHERE v.data >= :inicio AND v.data < :fim
             GROUP BY p.categoria
             ORDER BY valor_total DESC
-        ''')
-        vendas_categoria = cursor.fetchall()
-    
-    data = [['Categoria', 'Quantidade Vendida', 'Valor Total']]
-    for row in vendas_categoria:
-        data.append([
-            row['categoria'],
-            str(row['quantidade_vendida']),
-            format_currency(row['valor_total'])
-        ])
-    
-    elements.append(Paragraph("Vendas por Categoria", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # 2. Relatórios Financeiros
-    elements.append(Paragraph("2. Relatórios Financeiros", styles['Header']))
-    
-    # Contas a Receber
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        ''',
+        cabecalho=('Categoria', 'Quantidade Vendida', 'Valor Total'),
+        linha=lambda row: [row['categoria'], str(row['quantidade_vendida']),
+                           format_currency(row['valor_total'])],
+        filtra_periodo=True,
+    ),
+    SecaoPDF(
+        chave='contas_receber',
+        grupo="2. Relatórios Financeiros",
+        titulo="Contas a Receber",
+        sql='''
             SELECT cliente_nome, total, data_vencimento,
                    CASE WHEN data_vencimento < DATE('now') THEN 'Vencido' ELSE 'A Vencer' END as status
             FROM vendas
             WHERE status_pagamento = 'pendente'
             ORDER BY data_vencimento
-        ''')
-        contas_receber = cursor.fetchall()
-    
-    data = [['Cliente', 'Valor', 'Vencimento', 'Status']]
-    for row in contas_receber:
-        data.append([
-            row['cliente_nome'],
-            format_currency(row['total']),
-            row['data_vencimento'],
-            row['status']
-        ])
-    
-    elements.append(Paragraph("Contas a Receber", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('TEXTCOLOR', (3, 1), (3, -1), lambda r, c, v: colors.red if v == 'Vencido' else colors.green)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # 3. Relatórios de Estoque
-    elements.append(Paragraph("3. Relatórios de Estoque", styles['Header']))
-    
-    # Nível de Estoque
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        ''',
+        cabecalho=('Cliente', 'Valor', 'Vencimento', 'Status'),
+        linha=lambda row: [row['cliente_nome'], format_currency(row['total']),
+                           row['data_vencimento'], row['status']],
+        estilo=_cor_por_linha(3, lambda row: colors.red if row['status'] == 'Vencido' else colors.green),
+    ),
+    SecaoPDF(
+        chave='estoque_nivel',
+        grupo="3. Relatórios de Estoque",
+        titulo="Produtos Abaixo do Estoque Mínimo",
+        sql='''
             SELECT nome, quantidade, estoque_minimo, (quantidade - estoque_minimo) as diferenca
             FROM produtos
             WHERE quantidade < estoque_minimo
             ORDER BY diferenca ASC
-        ''')
-        estoque_nivel = cursor.fetchall()
-    
-    data = [['Produto', 'Quantidade', 'Estoque Mínimo', 'Diferença']]
-    for row in estoque_nivel:
-        data.append([
-            row['nome'],
-            str(row['quantidade']),
-            str(row['estoque_minimo']),
-            str(row['diferenca'])
-        ])
-    
-    elements.append(Paragraph("Produtos Abaixo do Estoque Mínimo", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('TEXTCOLOR', (3, 1), (3, -1), colors.red)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # 4. Relatórios de Clientes
-    elements.append(Paragraph("4. Relatórios de Clientes", styles['Header']))
-    
-    # Clientes Fiéis
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        ''',
+        cabecalho=('Produto', 'Quantidade', 'Estoque Mínimo', 'Diferença'),
+        linha=lambda row: [row['nome'], str(row['quantidade']), str(row['estoque_minimo']),
+                           str(row['diferenca'])],
+        estilo=lambda rows: [('TEXTCOLOR', (3, 1), (3, -1), colors.red)],
+    ),
+    SecaoPDF(
+        chave='clientes_fieis',
+        grupo="4. Relatórios de Clientes",
+        titulo="Top 10 Clientes Fiéis",
+        sql='''
             SELECT cliente_nome, COUNT(*) as total_compras, SUM(total) as valor_total_gasto
             FROM vendas
-            WHERE cliente_nome IS NOT NULL
+            WHERE cliente_nome IS NOT NULL AND data >= :inicio AND data < :fim
             GROUP BY cliente_nome
             ORDER BY total_compras DESC
             LIMIT 10
-        ''')
-        clientes_fieis = cursor.fetchall()
-    
-    data = [['Cliente', 'Total Compras', 'Valor Total Gasto']]
-    for row in clientes_fieis:
-        data.append([
-            row['cliente_nome'],
-            str(row['total_compras']),
-            format_currency(row['valor_total_gasto'])
-        ])
-    
-    elements.append(Paragraph("Top 10 Clientes Fiéis", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # 5. Relatórios de Fornecedores
-    elements.append(Paragraph("5. Relatórios de Fornecedores", styles['Header']))
-    
-    # Produtos por Fornecedor
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        ''',
+        cabecalho=('Cliente', 'Total Compras', 'Valor Total Gasto'),
+        linha=lambda row: [row['cliente_nome'], str(row['total_compras']),
+                           format_currency(row['valor_total_gasto'])],
+        filtra_periodo=True,
+    ),
+    SecaoPDF(
+        chave='fornecedores_produtos',
+        grupo="5. Relatórios de Fornecedores",
+        titulo="Produtos por Fornecedor",
+        sql='''
             SELECT f.nome as fornecedor, COUNT(p.id) as total_produtos, SUM(p.quantidade) as total_estoque
             FROM fornecedores f
             LEFT JOIN produtos p ON f.id = p.fornecedor_id
             GROUP BY f.id
             ORDER BY total_produtos DESC
-        ''')
-        fornecedores_produtos = cursor.fetchall()
-    
-    data = [['Fornecedor', 'Total Produtos', 'Total em Estoque']]
-    for row in fornecedores_produtos:
-        data.append([
-            row['fornecedor'],
-            str(row['total_produtos']),
-            str(row['total_estoque'])
-        ])
-    
-    elements.append(Paragraph("Produtos por Fornecedor", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # 6. Relatórios Operacionais
-    elements.append(Paragraph("6. Relatórios Operacionais", styles['Header']))
-    
-    # Movimentação de Caixa
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        ''',
+        cabecalho=('Fornecedor', 'Total Produtos', 'Total em Estoque'),
+        linha=lambda row: [row['fornecedor'], str(row['total_produtos']), str(row['total_estoque'])],
+    ),
+    SecaoPDF(
+        chave='movimentacao_caixa',
+        grupo="6. Relatórios Operacionais",
+        titulo="Movimentação de Caixa",
+        sql='''
             SELECT DATE(data) as data,
                    SUM(CASE WHEN metodo_pagamento = 'fiado' THEN 0 ELSE total END) as entradas,
-                   SUM(CASE WHEN metodo_pagamento = 'fiado' THEN total ELSE 0 END) as saidas
+                   SUM(CASE WHEN metodo_pagamento = 'fiado' THEN total ELSE 0 END) as saidas,
+                   SUM(CASE WHEN metodo_pagamento = 'fiado' THEN -total ELSE total END) as saldo
             FROM vendas
-            WHERE DATE(data) BETWEEN DATE('now', '-7 days') AND DATE('now')
+            WHERE data >= :inicio AND data < :fim
             GROUP BY DATE(data)
             ORDER BY data DESC
-        ''')
-        movimentacao = cursor.fetchall()
-    
-    data = [['Data', 'Entradas', 'Saídas', 'Saldo']]
-    for row in movimentacao:
-        saldo = row['entradas'] - row['saidas']
-        data.append([
-            row['data'],
-            format_currency(row['entradas']),
-            format_currency(row['saidas']),
-            format_currency(saldo)
-        ])
-    
-    elements.append(Paragraph("Movimentação de Caixa (Últimos 7 dias)", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('TEXTCOLOR', (3, 1), (3, -1), lambda r, c, v: colors.green if float(v.replace('R$', '').replace(',', '')) > 0 else colors.red)
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # 7. Relatórios Estratégicos
-    elements.append(Paragraph("7. Relatórios Estratégicos", styles['Header']))
-    
-    # Comparativo Mensal
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        ''',
+        cabecalho=('Data', 'Entradas', 'Saídas', 'Saldo'),
+        linha=lambda row: [row['data'], format_currency(row['entradas']),
+                           format_currency(row['saidas']), format_currency(row['saldo'])],
+        estilo=_cor_por_linha(3, lambda row: colors.green if (row['saldo'] or 0) > 0 else colors.red),
+        filtra_periodo=True,
+        dias_padrao=7,
+    ),
+    SecaoPDF(
+        chave='comparativo',
+        grupo="7. Relatórios Estratégicos",
+        titulo="Comparativo Mensal",
+        sql='''
             SELECT strftime('%Y-%m', data) as periodo,
                    COUNT(*) as total_vendas,
                    SUM(total) as valor_total
             FROM vendas
+            WHERE data >= :inicio AND data < :fim
             GROUP BY periodo
             ORDER BY periodo DESC
             LIMIT 12
-        ''')
-        comparativo = cursor.fetchall()
-    
-    data = [['Período', 'Total Vendas', 'Valor Total']]
-    for row in comparativo:
-        data.append([
-            row['periodo'],
-            str(row['total_vendas']),
-            format_currency(row['valor_total'])
-        ])
-    
-    elements.append(Paragraph("Comparativo Mensal", styles['Body']))
-    elements.append(Spacer(1, 0.1*inch))
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(t)
-    
+        ''',
+        cabecalho=('Período', 'Total Vendas', 'Valor Total'),
+        linha=lambda row: [row['periodo'], str(row['total_vendas']), format_currency(row['valor_total'])],
+        filtra_periodo=True,
+    ),
+)
+
+SECOES_POR_CHAVE = {secao.chave: secao for secao in SECOES_PDF}
+
+PARAMETROS_PDF = (
+    Parametro('start_date', 'date'),
+    Parametro('end_date', 'date'),
+)
+
+
+def validar_parametros(args):
+    """Resolve seções (lista ou separadas por vírgula) e período do PDF."""
+    valores = {p.nome: p.resolver(args.get(p.nome)) for p in PARAMETROS_PDF}
+    if valores['start_date'] and valores['end_date'] and valores['start_date'] > valores['end_date']:
+        raise ParametroInvalido("A data inicial deve ser anterior ou igual à data final")
+
+    brutos = args.getlist('secoes') if hasattr(args, 'getlist') else args.get('secoes') or []
+    if isinstance(brutos, str):
+        brutos = [brutos]
+    chaves = {chave.strip() for bruto in brutos for chave in bruto.split(',') if chave.strip()}
+    desconhecidas = chaves - SECOES_POR_CHAVE.keys()
+    if desconhecidas:
+        raise ParametroInvalido(
+            f"Seções desconhecidas: {', '.join(sorted(desconhecidas))}. "
+            f"Disponíveis: {', '.join(SECOES_POR_CHAVE)}")
+    # Mantém a ordem do relatório completo; nenhuma seção informada = todas
+    valores['secoes'] = tuple(s.chave for s in SECOES_PDF if not chaves or s.chave in chaves)
+    return valores
+
+
+def relatorio_padrao(valores):
+    """Todas as seções nos períodos padrão (o PDF mantido em cache)."""
+    return (len(valores['secoes']) == len(SECOES_PDF)
+            and not valores['start_date'] and not valores['end_date'])
+
+
+def periodo_secao(secao, start_date=None, end_date=None):
+    """Argumentos da consulta e sufixo do título da seção para o período pedido."""
+    if not secao.filtra_periodo:
+        return {}, ''
+    fim = date.fromisoformat(end_date) if end_date else date.today()
+    if start_date:
+        inicio = date.fromisoformat(start_date)
+    elif secao.dias_padrao:
+        inicio = fim - timedelta(days=secao.dias_padrao)
+    else:
+        inicio = None
+
+    argumentos = {
+        'inicio': inicio.isoformat() if inicio else '',
+        'fim': (fim + timedelta(days=1)).isoformat() if inicio or end_date else '9999-12-31',
+    }
+    if start_date or end_date:
+        sufixo = (f" ({inicio:%d/%m/%Y} a {fim:%d/%m/%Y})" if inicio
+                  else f" (até {fim:%d/%m/%Y})")
+    elif secao.dias_padrao:
+        sufixo = f" (Últimos {secao.dias_padrao} dias)"
+    else:
+        sufixo = ''
+    return argumentos, sufixo
+
+
+def consultar_secoes(consultas, max_workers=MAX_CONSULTAS_PARALELAS):
+    """Dispara as consultas (seção, argumentos) em paralelo e retorna os futures, na ordem.
+
+    Cada thread de trabalho abre uma única conexão somente leitura, fechada
+    quando todas as consultas terminam.
+    """
+    pilha = ExitStack()
+    local = threading.local()
+    lock = threading.Lock()
+
+    def consultar(secao, argumentos):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            with lock:
+                conn = local.conn = pilha.enter_context(get_db_connection(somente_leitura=True))
+        inicio = time.perf_counter()
+        linhas = conn.execute(secao.sql, argumentos).fetchall()
+        return linhas, time.perf_counter() - inicio
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(consultas))),
+                              thread_name_prefix='pdf-secao')
+    futures = [pool.submit(consultar, secao, argumentos) for secao, argumentos in consultas]
+
+    def encerrar():
+        pool.shutdown(wait=True)
+        pilha.close()
+    return futures, encerrar
+
+
+def montar_secao(secao, linhas, styles, sufixo_titulo=''):
+    """Flowables de uma seção (título + tabela) a partir das linhas consultadas."""
+    dados = [secao.linha(row) for row in linhas]
+    tabela = Table([list(secao.cabecalho)] + dados)
+    tabela.setStyle(ESTILO_TABELA)
+    extras = secao.estilo(linhas)
+    if extras:
+        tabela.setStyle(extras)
+    return [
+        Paragraph(secao.titulo + sufixo_titulo, styles['Body']),
+        Spacer(1, 0.1*inch),
+        tabela,
+        Spacer(1, 0.3*inch),
+    ]
+
+
+def coletar_secoes(secoes=None, start_date=None, end_date=None):
+    """Gera (chave, sufixo do título, linhas, tempo da consulta) na ordem do
+    relatório, à medida que as consultas paralelas terminam.
+
+    As linhas são dicts simples, para poderem ser enviadas a outro processo.
+    """
+    selecionadas = [s for s in SECOES_PDF if secoes is None or s.chave in secoes]
+    periodos = [periodo_secao(s, start_date, end_date) for s in selecionadas]
+    futures, encerrar = consultar_secoes(
+        [(secao, argumentos) for secao, (argumentos, _) in zip(selecionadas, periodos)])
+    try:
+        for secao, (_, sufixo), future in zip(selecionadas, periodos, futures):
+            linhas, tempo_consulta = future.result()
+            yield secao.chave, sufixo, [dict(row) for row in linhas], tempo_consulta
+    finally:
+        encerrar()
+
+
+def renderizar_pdf(destino, secoes, tempos=None):
+    """Monta e grava o PDF a partir das seções já consultadas (ver coletar_secoes)."""
+    tempos = tempos if tempos is not None else {}
+    tempos.setdefault('secoes', {})
+
+    doc = SimpleDocTemplate(destino, pagesize=letter)
+    elements = []
+
+    styles = get_custom_styles()
+
+    # Cabeçalho
+    logo_path = os.path.join('static', 'images', 'logo.png') if os.path.exists(os.path.join('static', 'images', 'logo.png')) else None
+
+    if logo_path:
+        logo = Image(logo_path, width=1.5*inch, height=1*inch)
+        elements.append(logo)
+
+    elements.append(Paragraph("Relatório Completo do Açougue", styles['Title']))
+    elements.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Subtitle']))
+    elements.append(Spacer(1, 0.5*inch))
+
+    # Com um gerador, cada seção é montada assim que a sua consulta termina,
+    # enquanto as seguintes continuam em execução
+    grupo_atual = None
+    for chave, sufixo, linhas, tempo_consulta in secoes:
+        secao = SECOES_POR_CHAVE[chave]
+        inicio = time.perf_counter()
+        if secao.grupo != grupo_atual:
+            elements.append(Paragraph(secao.grupo, styles['Header']))
+            grupo_atual = secao.grupo
+        elements.extend(montar_secao(secao, linhas, styles, sufixo))
+        tempos['secoes'][chave] = {
+            'linhas': len(linhas),
+            'consulta': tempo_consulta,
+            'montagem': time.perf_counter() - inicio,
+        }
+
     # Rodapé
     elements.append(Spacer(1, 0.5*inch))
     elements.append(Paragraph("Relatório gerado automaticamente pelo Sistema de Gestão do Açougue", styles['Body']))
-    
+
     # Construir o PDF
+    inicio = time.perf_counter()
     doc.build(elements)
-    
-    buffer.seek(0)
-    return buffer
-
-def gerar_relatorio_pdf():
-    pdf = gerar_pdf_completo()
-    response = make_response(pdf.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = 'inline; filename=relatorio_completo.pdf'
-    return response
\ No newline at end of file
+    tempos['build'] = time.perf_counter() - inicio
+    return destino
+
+
+def gerar_pdf_completo(destino, tempos=None, secoes=None, start_date=None, end_date=None,
+                       renderizador=None):
+    """Gera o relatório em `destino` (caminho ou arquivo binário).
+
+    `secoes` limita as seções geradas (chaves de SECOES_PDF; None = todas) e
+    `start_date`/`end_date` definem o período das seções de vendas.
+    Com um `renderizador` (RenderizadorProcessos) a montagem roda em outro
+    processo e `destino` deve ser um caminho.
+    `tempos`, se informado, recebe as medições por seção.
+    """
+    inicio_total = time.perf_counter()
+    tempos = tempos if tempos is not None else {}
+    tempos['secoes'] = {}
+
+    dados = coletar_secoes(secoes, start_date, end_date)
+    with closing(dados):
+        if renderizador is None:
+            renderizar_pdf(destino, dados, tempos)
+        else:
+            tempos.update(renderizador.renderizar(destino, list(dados)))
+    tempos['total'] = time.perf_counter() - inicio_total
+
+    logger.info(
+        "PDF gerado em %.0f ms (build %.0f ms): %s",
+        tempos['total'] * 1000, tempos['build'] * 1000,
+        ', '.join(f"{chave} {t['consulta'] * 1000:.0f}+{t['montagem'] * 1000:.0f} ms"
+                  for chave, t in tempos['secoes'].items())
+    )
+
+    return destino
+
+
+# ---------------------------------------------------------------
+# Renderização em processos separados
+# ---------------------------------------------------------------
+
+class TempoEsgotadoPDF(TimeoutError):
+    """Sem vaga no pool ou renderização acima do tempo limite."""
+
+
+def remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _renderizar_em_processo(caminho, secoes):
+    tempos = {}
+    renderizar_pdf(caminho, secoes, tempos)
+    return tempos
+
+
+class RenderizadorProcessos:
+    """Executa a montagem do ReportLab (CPU, segura o GIL) em um pool de
+    processos, para não travar as demais requisições do servidor.
+
+    Os processos recebem só dados simples (linhas em dicts) e gravam o PDF no
+    caminho informado. `max_processos` limita as renderizações simultâneas;
+    quem não consegue vaga ou resultado em `timeout` segundos recebe
+    TempoEsgotadoPDF.
+    """
+
+    def __init__(self, max_processos=2, timeout=60):
+        self.max_processos = max_processos
+        self.timeout = timeout
+        self._vagas = threading.BoundedSemaphore(max_processos)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: o processo do Flask tem threads (scheduler, fila), fork não é seguro
+                self._pool = ProcessPoolExecutor(max_workers=self.max_processos,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def prazo(self):
+        return time.monotonic() + self.timeout
+
+    def submeter(self, funcao, caminho, *args, prazo):
+        """Aguarda uma vaga até `prazo` e envia `funcao(caminho, *args)` ao pool."""
+        if not self._vagas.acquire(timeout=max(prazo - time.monotonic(), 0)):
+            raise TempoEsgotadoPDF("Todas as renderizações de PDF estão ocupadas")
+        try:
+            future = self._executor().submit(funcao, caminho, *args)
+        except BrokenProcessPool:
+            self._vagas.release()
+            self._descartar_pool()
+            raise
+        except Exception:
+            self._vagas.release()
+            raise
+        # A vaga só é liberada quando o processo termina, mesmo após o timeout
+        future.add_done_callback(lambda _: self._vagas.release())
+        return future
+
+    def resultado(self, future, caminho, prazo):
+        try:
+            return future.result(timeout=max(prazo - time.monotonic(), 0))
+        except FuturesTimeoutError:
+            # O processo não pode ser interrompido; o arquivo que ele gravar é descartado
+            future.add_done_callback(lambda _: remover_arquivo(caminho))
+            raise TempoEsgotadoPDF(f"Renderização do PDF excedeu {self.timeout}s")
+        except BrokenProcessPool:
+            # Processo morto (ex.: falta de memória): recria o pool na próxima chamada
+            self._descartar_pool()
+            raise
+
+    def renderizar(self, caminho, secoes):
+        """Renderiza o relatório no pool e retorna as medições de montagem e build."""
+        prazo = self.prazo()
+        future = self.submeter(_renderizar_em_processo, caminho, secoes, prazo=prazo)
+        return self.resultado(future, caminho, prazo)
+
+    def _descartar_pool(self):
+        with self._lock:
+            self._pool = None
+
+    def encerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+class ArquivoTemporario(io.FileIO):
+    """Arquivo aberto para envio que é apagado quando o servidor o fecha."""
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            remover_arquivo(self.name)
+
+
+def enviar_temporario(caminho, **opcoes):
+    """send_file de um arquivo temporário, apagado ao fim do envio.
+
+    O arquivo vai aberto, e não pelo caminho: a resposta continua
+    direct_passthrough (o servidor pode usar wsgi.file_wrapper/sendfile) e o
+    servidor fecha o arquivo ao terminar. Tamanho e data são preenchidos
+    como no send_file por caminho, para Content-Length e Range.
+    """
+    arquivo = ArquivoTemporario(caminho)
+    try:
+        estado = os.fstat(arquivo.fileno())
+        resposta = send_file(arquivo, conditional=False, **opcoes)
+        resposta.content_length = estado.st_size
+        resposta.last_modified = estado.st_mtime
+        return resposta.make_conditional(request, accept_ranges=True,
+                                         complete_length=estado.st_size)
+    except BaseException:
+        arquivo.close()
+        raise
+
+
+def enviar_pdf_temporario(gerar, nome_download):
+    """Grava o PDF com `gerar(caminho)` em arquivo temporário e o envia com
+    send_file (aceita Range); o arquivo é removido ao fim do envio."""
+    fd, caminho = tempfile.mkstemp(prefix='pdf_', suffix='.pdf')
+    os.close(fd)
+    try:
+        gerar(caminho)
+    except Exception:
+        remover_arquivo(caminho)
+        raise
+    return enviar_temporario(caminho, mimetype='application/pdf', download_name=nome_download)
+
+
+def gerar_relatorio_pdf(**parametros):
+    """Resposta com o PDF gravado em arquivo temporário, removido ao fim do envio.
+
+    Os parâmetros são repassados a gerar_pdf_completo (secoes, start_date,
+    end_date, renderizador).
+    """
+    return enviar_pdf_temporario(lambda caminho: gerar_pdf_completo(caminho, **parametros),
+                                 'relatorio_completo.pdf')
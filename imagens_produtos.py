@@ -0,0 +1,182 @@
+"""Versões reduzidas das fotos de produtos (pequena e média, em WebP e no
+formato de origem) e o HTML com srcset que as usa.
+
+As versões ficam em UPLOAD_DERIVATIVES_FOLDER com o nome da foto original
+seguido da largura, ex.: picanha.webp.160w.webp e picanha.webp.160w.png.
+São regeneráveis a qualquer momento (`flask gerar-miniaturas`) e por isso não
+entram nos backups.
+"""
+import logging
+import os
+import re
+import time
+
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Nome -> largura máxima (px); PDV mostra 50px, listagem 100px e edição 200px
+TAMANHOS = {'pequena': 160, 'media': 480}
+QUALIDADE_WEBP = 80
+QUALIDADE_JPEG = 85
+# <foto original>.<largura>w.<formato>
+NOME_DERIVADO = re.compile(r'^(?P<original>.+)\.\d+w\.(webp|png|jpg)$')
+
+
+def nome_foto(foto):
+    """Nome do arquivo na pasta de uploads; o campo produtos.foto pode trazer o
+    caminho relativo a static/ (uploads/produtos/x.png) ou só o nome."""
+    return os.path.basename(foto) if foto else None
+
+
+def _formato_alternativo(imagem):
+    # Sem suporte a WebP o navegador recebe PNG (se houver transparência) ou JPEG
+    if imagem.mode in ('RGBA', 'LA') or 'transparency' in imagem.info:
+        return 'png'
+    return 'jpg'
+
+
+def nomes_derivados(nome, formato_alternativo):
+    """{tamanho: (nome webp, nome no formato alternativo)}."""
+    return {
+        tamanho: (f"{nome}.{largura}w.webp", f"{nome}.{largura}w.{formato_alternativo}")
+        for tamanho, largura in TAMANHOS.items()
+    }
+
+
+def _existentes(pasta_derivados, nome):
+    for formato in ('png', 'jpg'):
+        derivados = nomes_derivados(nome, formato)
+        if all(os.path.exists(os.path.join(pasta_derivados, arquivo))
+               for par in derivados.values() for arquivo in par):
+            return derivados
+    return None
+
+
+def gerar_derivados(caminho_original, pasta_derivados, forcar=False):
+    """Grava as versões reduzidas da foto; retorna quantos arquivos foram gerados
+    (0 se já existiam e são mais novos que a original)."""
+    nome = os.path.basename(caminho_original)
+    os.makedirs(pasta_derivados, exist_ok=True)
+    existentes = _existentes(pasta_derivados, nome)
+    if existentes and not forcar:
+        atualizados = min(os.path.getmtime(os.path.join(pasta_derivados, arquivo))
+                          for par in existentes.values() for arquivo in par)
+        if atualizados >= os.path.getmtime(caminho_original):
+            return 0
+
+    with Image.open(caminho_original) as original:
+        imagem = ImageOps.exif_transpose(original)
+        formato = _formato_alternativo(imagem)
+        imagem = imagem.convert('RGBA' if formato == 'png' else 'RGB')
+
+    gerados = 0
+    for tamanho, (webp, alternativo) in nomes_derivados(nome, formato).items():
+        largura = TAMANHOS[tamanho]
+        reduzida = imagem.copy()
+        reduzida.thumbnail((largura, largura), Image.LANCZOS)
+        reduzida.save(os.path.join(pasta_derivados, webp), 'WEBP', quality=QUALIDADE_WEBP, method=4)
+        if formato == 'png':
+            reduzida.save(os.path.join(pasta_derivados, alternativo), 'PNG', optimize=True)
+        else:
+            reduzida.save(os.path.join(pasta_derivados, alternativo), 'JPEG',
+                          quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+        gerados += 2
+    return gerados
+
+
+def remover_derivados(pasta_derivados, nome):
+    for formato in ('png', 'jpg'):
+        for par in nomes_derivados(nome, formato).values():
+            for arquivo in par:
+                try:
+                    os.remove(os.path.join(pasta_derivados, arquivo))
+                except FileNotFoundError:
+                    pass
+
+
+def remover_derivados_orfaos(pasta_uploads, pasta_derivados, carencia=0, agora=None):
+    """Apaga as versões reduzidas cuja foto original não existe mais em
+    pasta_uploads; retorna (arquivos, bytes)."""
+    if not os.path.isdir(pasta_derivados):
+        return 0, 0
+    agora = time.time() if agora is None else agora
+    arquivos = liberados = 0
+    for nome in sorted(os.listdir(pasta_derivados)):
+        encontrado = NOME_DERIVADO.match(nome)
+        caminho = os.path.join(pasta_derivados, nome)
+        if (not encontrado or os.path.exists(os.path.join(pasta_uploads, encontrado['original']))
+                or agora - os.path.getmtime(caminho) < carencia):
+            continue
+        liberados += os.path.getsize(caminho)
+        os.remove(caminho)
+        arquivos += 1
+    return arquivos, liberados
+
+
+def gerar_derivados_pasta(pasta_uploads, pasta_derivados, forcar=False):
+    """Gera as versões que faltam para todas as fotos da pasta; retorna
+    (fotos processadas, arquivos gerados, nomes com falha)."""
+    fotos = gerados = 0
+    falhas = []
+    for nome in sorted(os.listdir(pasta_uploads)):
+        caminho = os.path.join(pasta_uploads, nome)
+        if not os.path.isfile(caminho):
+            continue
+        try:
+            gerados += gerar_derivados(caminho, pasta_derivados, forcar=forcar)
+            fotos += 1
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.warning("Não foi possível gerar as versões de %s: %s", nome, e)
+            falhas.append(nome)
+    return fotos, gerados, falhas
+
+
+# ---------------------------------------------------------------
+# Integração com o Flask
+# ---------------------------------------------------------------
+
+def processar_foto(nome):
+    """Gera as versões de uma foto recém-gravada em UPLOAD_FOLDER; uma falha
+    não impede o cadastro (a página usa a original)."""
+    try:
+        gerar_derivados(os.path.join(current_app.config['UPLOAD_FOLDER'], nome),
+                        current_app.config['UPLOAD_DERIVATIVES_FOLDER'], forcar=True)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error("Falha ao gerar as versões reduzidas de %s: %s", nome, e)
+
+
+def descartar_foto(nome):
+    remover_derivados(current_app.config['UPLOAD_DERIVATIVES_FOLDER'], nome)
+
+
+def _url(pasta, arquivo):
+    relativo = os.path.relpath(os.path.join(pasta, arquivo), current_app.static_folder)
+    return url_for('static', filename=relativo.replace(os.sep, '/'))
+
+
+def foto_produto(foto, alt='', sizes='100px', **atributos):
+    """<picture> com srcset das versões WebP e alternativas (pequena e média);
+    sem versões geradas, apenas o <img> da original."""
+    nome = nome_foto(foto)
+    if not nome:
+        return Markup('')
+    pasta_derivados = current_app.config['UPLOAD_DERIVATIVES_FOLDER']
+    atributos.setdefault('loading', 'lazy')
+    extras = ''.join(f' {chave}="{escape(valor)}"' for chave, valor in atributos.items())
+    original = _url(current_app.config['UPLOAD_FOLDER'], nome)
+
+    derivados = _existentes(pasta_derivados, nome)
+    if not derivados:
+        return Markup(f'<img src="{escape(original)}" alt="{escape(alt)}"{extras}>')
+
+    def srcset(indice):
+        return ', '.join(f"{_url(pasta_derivados, par[indice])} {TAMANHOS[tamanho]}w"
+                         for tamanho, par in derivados.items())
+    return Markup(
+        f'<picture><source type="image/webp" srcset="{escape(srcset(0))}" sizes="{escape(sizes)}">'
+        f'<img src="{escape(original)}" srcset="{escape(srcset(1))}" sizes="{escape(sizes)}" '
+        f'alt="{escape(alt)}"{extras}></picture>'
+    )
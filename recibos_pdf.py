@@ -0,0 +1,266 @@
+"""Recibos de venda e extrato de cliente em PDF, gerados em lote.
+
+As vendas e seus itens são lidos em uma única consulta (venda_itens + produtos)
+e agrupados por venda. Estilos e tabela são montados uma vez no módulo e o
+cabeçalho das páginas é desenhado uma vez por documento (form XObject),
+reaproveitado em todas as páginas. Lotes grandes de recibos são divididos entre
+os processos do RenderizadorProcessos e os PDFs parciais unidos com PyPDF2.
+"""
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A5
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import (
+    BaseDocTemplate, Frame, KeepTogether, PageBreak, PageTemplate, Paragraph,
+    Spacer, Table, TableStyle
+)
+
+from banco_dados import get_db_connection
+from gerador_pdf import format_currency, remover_arquivo
+
+try:
+    from PyPDF2 import PdfMerger
+except ImportError:  # sem PyPDF2 os lotes são renderizados no próprio processo
+    PdfMerger = None
+
+logger = logging.getLogger(__name__)
+
+# Recibos por processo quando a renderização é dividida
+TAMANHO_LOTE_RECIBOS = 200
+
+# Os demais métodos já são gravados com o rótulo exibido no PDV
+METODOS_PAGAMENTO = {'pagamento_prazo': 'Pagamento a Prazo'}
+
+ESTILO_TITULO = ParagraphStyle('ReciboTitulo', fontName='Helvetica-Bold', fontSize=13,
+                               alignment=1, spaceAfter=4 * mm)
+ESTILO_TEXTO = ParagraphStyle('ReciboTexto', fontName='Helvetica', fontSize=9, leading=12)
+ESTILO_TOTAL = ParagraphStyle('ReciboTotal', fontName='Helvetica-Bold', fontSize=11,
+                              alignment=2, spaceBefore=3 * mm)
+
+ESTILO_ITENS = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+    ('LINEBELOW', (0, -1), (-1, -1), 0.5, colors.grey),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+LARGURAS_ITENS = (58 * mm, 18 * mm, 24 * mm, 24 * mm)
+
+MARGEM = 10 * mm
+ALTURA_CABECALHO = 18 * mm
+
+
+# ---------------------------------------------------------------
+# Dados
+# ---------------------------------------------------------------
+
+SQL_VENDAS = '''
+    SELECT v.id, v.data, v.cliente_nome, v.cliente_cpf, v.total, v.metodo_pagamento,
+           v.status_pagamento, v.data_vencimento,
+           p.nome AS produto, vi.quantidade, vi.preco_unitario
+    FROM vendas v
+    LEFT JOIN venda_itens vi ON vi.venda_id = v.id
+    LEFT JOIN produtos p ON p.id = vi.produto_id
+    WHERE {filtro}
+    ORDER BY v.data, v.id, vi.id
+'''
+
+
+def carregar_vendas(venda_ids=None, dia=None, cliente=None):
+    """Vendas (dicts simples, com a lista de itens) por ids, por dia
+    (AAAA-MM-DD) ou as pendentes de um cliente."""
+    if venda_ids:
+        # json_each evita o limite de variáveis do SQLite em lotes grandes
+        filtro, params = "v.id IN (SELECT value FROM json_each(?))", (json.dumps(list(venda_ids)),)
+    elif dia:
+        inicio = date.fromisoformat(dia)
+        filtro, params = "v.data >= ? AND v.data < ?", (inicio.isoformat(),
+                                                        (inicio + timedelta(days=1)).isoformat())
+    elif cliente:
+        filtro, params = "v.cliente_nome = ? AND v.status_pagamento = 'pendente'", (cliente,)
+    else:
+        raise ValueError("Informe venda_ids, dia ou cliente")
+
+    with get_db_connection(somente_leitura=True) as conn:
+        rows = conn.execute(SQL_VENDAS.format(filtro=filtro), params).fetchall()
+
+    vendas = []
+    for _, linhas in groupby(rows, key=lambda row: row['id']):
+        linhas = list(linhas)
+        venda = {k: linhas[0][k] for k in ('id', 'data', 'cliente_nome', 'cliente_cpf', 'total',
+                                           'metodo_pagamento', 'status_pagamento', 'data_vencimento')}
+        venda['itens'] = [
+            {'produto': row['produto'], 'quantidade': row['quantidade'],
+             'preco_unitario': row['preco_unitario']}
+            for row in linhas if row['quantidade'] is not None
+        ]
+        vendas.append(venda)
+    return vendas
+
+
+# ---------------------------------------------------------------
+# Layout
+# ---------------------------------------------------------------
+
+def _formatar_data(valor, formato='%d/%m/%Y %H:%M'):
+    if not valor:
+        return '-'
+    for entrada in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(str(valor), entrada).strftime(formato)
+        except ValueError:
+            continue
+    return str(valor)
+
+
+def _desenhar_pagina(canvas, doc):
+    # O cabeçalho vira um form XObject na primeira página; as seguintes só o referenciam
+    if not canvas.hasForm('cabecalho'):
+        largura, altura = doc.pagesize
+        canvas.beginForm('cabecalho')
+        canvas.setFont('Helvetica-Bold', 12)
+        canvas.drawString(MARGEM, altura - MARGEM - 5 * mm, "Açougue")
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(MARGEM, altura - MARGEM - 9 * mm, "Sistema de Gestão do Açougue")
+        canvas.setLineWidth(0.5)
+        canvas.line(MARGEM, altura - MARGEM - ALTURA_CABECALHO + 4 * mm,
+                    largura - MARGEM, altura - MARGEM - ALTURA_CABECALHO + 4 * mm)
+        canvas.endForm()
+    canvas.doForm('cabecalho')
+    canvas.setFont('Helvetica', 7)
+    canvas.drawRightString(doc.pagesize[0] - MARGEM, MARGEM / 2, f"Página {doc.page}")
+
+
+def _documento(destino, titulo):
+    doc = BaseDocTemplate(destino, pagesize=A5, title=titulo,
+                          leftMargin=MARGEM, rightMargin=MARGEM,
+                          topMargin=MARGEM + ALTURA_CABECALHO, bottomMargin=MARGEM)
+    quadro = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='corpo')
+    doc.addPageTemplates([PageTemplate(id='recibo', frames=[quadro], onPage=_desenhar_pagina)])
+    return doc
+
+
+def _tabela_itens(itens):
+    dados = [['Produto', 'Qtd.', 'Unitário', 'Subtotal']]
+    dados.extend(
+        [item['produto'] or '-', str(item['quantidade']), format_currency(item['preco_unitario']),
+         format_currency(item['quantidade'] * item['preco_unitario'])]
+        for item in itens
+    )
+    tabela = Table(dados, colWidths=LARGURAS_ITENS, repeatRows=1)
+    tabela.setStyle(ESTILO_ITENS)
+    return tabela
+
+
+def _recibo(venda):
+    cliente = venda['cliente_nome'] or 'Consumidor'
+    if venda['cliente_cpf']:
+        cliente += f" (CPF {venda['cliente_cpf']})"
+    metodo = METODOS_PAGAMENTO.get(venda['metodo_pagamento'], venda['metodo_pagamento'])
+    # Paragraph interpreta marcação: textos digitados são escapados
+    linhas = [
+        f"<b>Venda:</b> {escape(venda['id'])}",
+        f"<b>Data:</b> {_formatar_data(venda['data'])}",
+        f"<b>Cliente:</b> {escape(cliente)}",
+        f"<b>Pagamento:</b> {escape(metodo)}",
+    ]
+    if venda['status_pagamento'] == 'pendente':
+        linhas.append(f"<b>Vencimento:</b> {_formatar_data(venda['data_vencimento'], '%d/%m/%Y')}")
+    return [
+        Paragraph("Recibo de Venda", ESTILO_TITULO),
+        *(Paragraph(linha, ESTILO_TEXTO) for linha in linhas),
+        Spacer(1, 3 * mm),
+        _tabela_itens(venda['itens']),
+        Paragraph(f"Total: {format_currency(venda['total'])}", ESTILO_TOTAL),
+    ]
+
+
+def renderizar_recibos(destino, vendas):
+    """Um recibo por página, na ordem das vendas."""
+    elementos = []
+    for i, venda in enumerate(vendas):
+        if i:
+            elementos.append(PageBreak())
+        elementos.extend(_recibo(venda))
+    _documento(destino, "Recibos de venda").build(elementos)
+    return len(vendas)
+
+
+def renderizar_extrato(destino, cliente, vendas):
+    """Extrato das vendas em aberto de um cliente, com o total devido."""
+    elementos = [
+        Paragraph("Extrato de Vendas em Aberto", ESTILO_TITULO),
+        Paragraph(f"<b>Cliente:</b> {escape(cliente)}", ESTILO_TEXTO),
+        Paragraph(f"<b>Emitido em:</b> {datetime.now():%d/%m/%Y %H:%M}", ESTILO_TEXTO),
+        Spacer(1, 4 * mm),
+    ]
+    for venda in vendas:
+        elementos.append(KeepTogether([
+            Paragraph(
+                f"<b>{escape(venda['id'])}</b> — {_formatar_data(venda['data'])} — "
+                f"vencimento {_formatar_data(venda['data_vencimento'], '%d/%m/%Y')} — "
+                f"{format_currency(venda['total'])}", ESTILO_TEXTO),
+            Spacer(1, 1 * mm),
+            _tabela_itens(venda['itens']),
+            Spacer(1, 4 * mm),
+        ]))
+    total = sum(venda['total'] for venda in vendas)
+    elementos.append(Paragraph(f"Total em aberto: {format_currency(total)}", ESTILO_TOTAL))
+    _documento(destino, f"Extrato - {cliente}").build(elementos)
+    return len(vendas)
+
+
+# ---------------------------------------------------------------
+# Lotes
+# ---------------------------------------------------------------
+
+def gerar_recibos(caminho, vendas, renderizador=None, tamanho_lote=TAMANHO_LOTE_RECIBOS):
+    """Grava os recibos em `caminho`. Com um renderizador (RenderizadorProcessos)
+    e mais de um lote, cada lote é renderizado em um processo e os PDFs parciais
+    são unidos no final."""
+    if renderizador is None or len(vendas) <= tamanho_lote:
+        return renderizar_recibos(caminho, vendas)
+    if PdfMerger is None:
+        logger.warning("PyPDF2 não instalado: %d recibos renderizados em um único processo",
+                       len(vendas))
+        return renderizar_recibos(caminho, vendas)
+
+    prazo = renderizador.prazo()
+    parciais = []
+    try:
+        for inicio in range(0, len(vendas), tamanho_lote):
+            fd, parcial = tempfile.mkstemp(prefix='recibos_', suffix='.pdf')
+            os.close(fd)
+            try:
+                future = renderizador.submeter(renderizar_recibos, parcial,
+                                               vendas[inicio:inicio + tamanho_lote], prazo=prazo)
+            except Exception:
+                remover_arquivo(parcial)
+                raise
+            parciais.append((parcial, future))
+        for parcial, future in parciais:
+            renderizador.resultado(future, parcial, prazo)
+
+        unidor = PdfMerger()
+        for parcial, _ in parciais:
+            unidor.append(parcial)
+        with open(caminho, 'wb') as destino:
+            unidor.write(destino)
+        unidor.close()
+    finally:
+        for parcial, future in parciais:
+            if future.done():
+                remover_arquivo(parcial)
+            else:
+                future.add_done_callback(lambda _, parcial=parcial: remover_arquivo(parcial))
+    logger.info("Recibos gerados: %d vendas em %d lotes", len(vendas), len(parciais))
+    return len(vendas)
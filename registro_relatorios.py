@@ -0,0 +1,513 @@
+"""Registro declarativo dos relatórios unificados.
+
+Cada relatório é definido uma única vez, no carregamento do módulo, com a
+consulta SQL (sempre parametrizada), o esquema dos parâmetros aceitos na
+query string e a forma de convertê-los nos argumentos da consulta.
+Para adicionar um relatório basta chamar `registrar(Relatorio(...))`.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+
+from banco_dados import GRANULARIDADES_CUBO, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class ParametroInvalido(ValueError):
+    """Valor informado na query string não atende ao esquema do relatório."""
+
+
+@dataclass(frozen=True)
+class Parametro:
+    nome: str
+    tipo: str  # 'int', 'date' ou 'choice'
+    default: object = None  # valor ou callable sem argumentos
+    minimo: Optional[int] = None
+    maximo: Optional[int] = None
+    opcoes: tuple = ()
+
+    def valor_padrao(self):
+        return self.default() if callable(self.default) else self.default
+
+    def resolver(self, bruto):
+        """Converte e valida o valor recebido; vazio assume o padrão."""
+        if bruto is None or bruto == '':
+            return self.valor_padrao()
+
+        if self.tipo == 'int':
+            try:
+                valor = int(bruto)
+            except (TypeError, ValueError):
+                raise ParametroInvalido(f"Parâmetro '{self.nome}' deve ser um número inteiro")
+            if self.minimo is not None and valor < self.minimo:
+                raise ParametroInvalido(f"Parâmetro '{self.nome}' deve ser no mínimo {self.minimo}")
+            if self.maximo is not None and valor > self.maximo:
+                raise ParametroInvalido(f"Parâmetro '{self.nome}' deve ser no máximo {self.maximo}")
+            return valor
+
+        if self.tipo == 'date':
+            try:
+                return datetime.strptime(bruto, '%Y-%m-%d').date().isoformat()
+            except (TypeError, ValueError):
+                raise ParametroInvalido(f"Parâmetro '{self.nome}' deve estar no formato AAAA-MM-DD")
+
+        if self.tipo == 'choice':
+            if bruto not in self.opcoes:
+                raise ParametroInvalido(
+                    f"Parâmetro '{self.nome}' deve ser um de: {', '.join(self.opcoes)}")
+            return bruto
+
+        raise ValueError(f"Tipo de parâmetro desconhecido: {self.tipo}")
+
+
+@dataclass(frozen=True)
+class Relatorio:
+    chave: str
+    titulo: str
+    sql: str
+    parametros: tuple = ()
+    # Converte os valores validados nos argumentos posicionais da consulta;
+    # sem ele, os parâmetros são passados na ordem em que foram declarados.
+    argumentos: Optional[Callable] = None
+    # Relatórios paginados informam a consulta de contagem total
+    sql_total: Optional[str] = None
+    argumentos_total: Optional[Callable] = None
+
+    @property
+    def paginado(self):
+        return self.sql_total is not None
+
+    def validar(self, args):
+        """Resolve os parâmetros a partir de um mapeamento (ex.: request.args)."""
+        return {p.nome: p.resolver(args.get(p.nome)) for p in self.parametros}
+
+    def bind(self, valores):
+        if self.argumentos:
+            return tuple(self.argumentos(valores))
+        return tuple(valores[p.nome] for p in self.parametros)
+
+    def bind_total(self, valores):
+        if self.argumentos_total:
+            return tuple(self.argumentos_total(valores))
+        return ()
+
+    def cursor(self, conn, valores):
+        """Executa a consulta e devolve o cursor, para leitura incremental."""
+        return conn.execute(self.sql, self.bind(valores))
+
+    def executar(self, conn, valores):
+        cursor = self.cursor(conn, valores)
+        colunas = [coluna[0] for coluna in cursor.description]
+        return [dict(zip(colunas, row)) for row in cursor.fetchall()]
+
+    def contar(self, conn, valores):
+        return conn.execute(self.sql_total, self.bind_total(valores)).fetchone()[0]
+
+
+RELATORIOS = {}
+
+
+def registrar(relatorio):
+    if relatorio.chave in RELATORIOS:
+        raise ValueError(f"Relatório já registrado: {relatorio.chave}")
+    RELATORIOS[relatorio.chave] = relatorio
+    return relatorio
+
+
+def get_relatorio(chave):
+    return RELATORIOS.get(chave)
+
+
+# ---------------------------------------------------------------
+# Helpers de parâmetros
+# ---------------------------------------------------------------
+
+def inicio_intervalo(data):
+    """Limite inferior (inclusivo) para comparar com vendas.data."""
+    return data or ''
+
+
+def fim_intervalo(data):
+    """Limite superior (exclusivo): dia seguinte à data final informada."""
+    if not data:
+        return '9999-12-31'
+    return (datetime.strptime(data, '%Y-%m-%d') + timedelta(days=1)).date().isoformat()
+
+
+def primeiro_dia_mes():
+    return datetime.now().replace(day=1).date().isoformat()
+
+
+def primeiro_dia_ano():
+    return datetime.now().replace(month=1, day=1).date().isoformat()
+
+
+def hoje():
+    return datetime.now().date().isoformat()
+
+
+FORMATOS_PERIODO = {'month': '%Y-%m', 'year': '%Y'}
+
+GRANULARIDADES = ('day', 'week', 'month', 'year')
+
+# Períodos equivalentes a um ano em cada granularidade. Para dias usa-se 364
+# (52 semanas), comparando sempre o mesmo dia da semana.
+PERIODOS_POR_ANO = {'day': 364, 'week': 52, 'month': 12, 'year': 1}
+
+
+def inicio_periodo(data, granularidade):
+    """Primeiro dia do período (semana começa na segunda) que contém a data."""
+    dia = datetime.strptime(data, '%Y-%m-%d').date()
+    if granularidade == 'week':
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == 'month':
+        return dia.replace(day=1)
+    if granularidade == 'year':
+        return dia.replace(month=1, day=1)
+    return dia
+
+
+def recuar_periodos(dia, granularidade, quantidade):
+    if granularidade == 'week':
+        return dia - timedelta(weeks=quantidade)
+    if granularidade == 'month':
+        meses = dia.year * 12 + dia.month - 1 - quantidade
+        return date(meses // 12, meses % 12 + 1, 1)
+    if granularidade == 'year':
+        return dia.replace(year=dia.year - quantidade)
+    return dia - timedelta(days=quantidade)
+
+
+def argumentos_comparativo_periodos(valores):
+    granularidade = valores['granularidade']
+    if valores['start_date']:
+        # A exibição começa no início do período da data inicial; a consulta lê
+        # também o histórico anterior usado pelo LAG, pelo ano anterior e pela
+        # média móvel dos primeiros períodos exibidos.
+        inicio = inicio_periodo(valores['start_date'], granularidade)
+        inicio_consulta = recuar_periodos(
+            inicio, granularidade, PERIODOS_POR_ANO[granularidade] + valores['janela']
+        ).isoformat()
+        inicio = inicio.isoformat()
+    else:
+        inicio = inicio_consulta = ''
+    return (granularidade, inicio_consulta, fim_intervalo(valores['end_date']), inicio,
+            PERIODOS_POR_ANO[granularidade], valores['janela'] - 1)
+
+
+# ---------------------------------------------------------------
+# Definições
+# ---------------------------------------------------------------
+
+registrar(Relatorio(
+    chave='vendas_totais',
+    titulo='Vendas Totais',
+    # A paginação é aplicada sobre vendas antes dos JOINs, de modo que o
+    # GROUP_CONCAT só processa as vendas da página.
+    sql='''
+        SELECT
+            v.id,
+            v.data,
+            v.cliente_nome as cliente,
+            GROUP_CONCAT(p.nome, ', ') as produtos,
+            v.total,
+            v.metodo_pagamento,
+            COUNT(vi.id) as total_itens
+        FROM (
+            SELECT * FROM vendas
+            WHERE data >= ? AND data < ?
+            ORDER BY data DESC
+            LIMIT ? OFFSET ?
+        ) v
+        LEFT JOIN venda_itens vi ON v.id = vi.venda_id
+        LEFT JOIN produtos p ON vi.produto_id = p.id
+        GROUP BY v.id
+        ORDER BY v.data DESC
+    ''',
+    parametros=(
+        Parametro('start_date', 'date'),
+        Parametro('end_date', 'date'),
+        Parametro('page', 'int', default=1, minimo=1),
+        Parametro('per_page', 'int', default=50, minimo=1, maximo=500),
+    ),
+    argumentos=lambda v: (
+        inicio_intervalo(v['start_date']), fim_intervalo(v['end_date']),
+        v['per_page'], (v['page'] - 1) * v['per_page']
+    ),
+    sql_total='SELECT COUNT(*) FROM vendas WHERE data >= ? AND data < ?',
+    argumentos_total=lambda v: (inicio_intervalo(v['start_date']), fim_intervalo(v['end_date'])),
+))
+
+registrar(Relatorio(
+    chave='vendas_periodo',
+    titulo='Vendas por Período',
+    sql='''
+        SELECT DATE(v.data) as data, COUNT(*) as total_vendas,
+        SUM(v.total) as valor_total, AVG(v.total) as ticket_medio
+        FROM vendas v
+        WHERE v.data >= ? AND v.data < ?
+        GROUP BY DATE(v.data) ORDER BY data
+    ''',
+    parametros=(
+        Parametro('start_date', 'date', default=primeiro_dia_mes),
+        Parametro('end_date', 'date', default=hoje),
+    ),
+    argumentos=lambda v: (inicio_intervalo(v['start_date']), fim_intervalo(v['end_date'])),
+))
+
+registrar(Relatorio(
+    chave='vendas_categorias',
+    titulo='Vendas por Categoria',
+    sql='''
+        SELECT p.categoria, SUM(vi.quantidade) as quantidade_vendida,
+        SUM(vi.quantidade * vi.preco_unitario) as valor_total
+        FROM venda_itens vi JOIN produtos p ON vi.produto_id = p.id
+        GROUP BY p.categoria ORDER BY valor_total DESC
+    ''',
+))
+
+registrar(Relatorio(
+    chave='top_produtos',
+    titulo='Top Produtos Vendidos',
+    sql='''
+        SELECT p.nome, SUM(vi.quantidade) as quantidade_vendida,
+        SUM(vi.quantidade * vi.preco_unitario) as valor_total
+        FROM venda_itens vi JOIN produtos p ON vi.produto_id = p.id
+        GROUP BY p.id ORDER BY valor_total DESC LIMIT ?
+    ''',
+    parametros=(Parametro('limit', 'int', default=10, minimo=1, maximo=500),),
+))
+
+registrar(Relatorio(
+    chave='estoque_nivel',
+    titulo='Nível de Estoque Crítico',
+    sql='''
+        SELECT nome, quantidade, estoque_minimo, (quantidade - estoque_minimo) as diferenca
+        FROM produtos WHERE quantidade < estoque_minimo ORDER BY diferenca ASC
+    ''',
+))
+
+registrar(Relatorio(
+    chave='estoque_validade',
+    titulo='Produtos Próximos do Vencimento',
+    sql='''
+        SELECT nome, data_validade,
+        JULIANDAY(data_validade) - JULIANDAY('now') as dias_restantes
+        FROM produtos WHERE data_validade IS NOT NULL
+        AND dias_restantes BETWEEN 0 AND ? ORDER BY data_validade
+    ''',
+    parametros=(Parametro('dias', 'int', default=30, minimo=0, maximo=3650),),
+))
+
+registrar(Relatorio(
+    chave='clientes_fieis',
+    titulo='Clientes Mais Fieis',
+    sql='''
+        SELECT cliente_nome, COUNT(*) as total_compras, SUM(total) as valor_total_gasto
+        FROM vendas WHERE cliente_nome IS NOT NULL
+        GROUP BY cliente_nome ORDER BY total_compras DESC LIMIT ?
+    ''',
+    parametros=(Parametro('limit', 'int', default=10, minimo=1, maximo=500),),
+))
+
+registrar(Relatorio(
+    chave='fornecedores_produtos',
+    titulo='Produtos por Fornecedor',
+    sql='''
+        SELECT f.nome as fornecedor, COUNT(p.id) as total_produtos, SUM(p.quantidade) as total_estoque
+        FROM fornecedores f LEFT JOIN produtos p ON f.id = p.fornecedor_id
+        GROUP BY f.id ORDER BY total_produtos DESC
+    ''',
+))
+
+registrar(Relatorio(
+    chave='movimentacao_caixa',
+    titulo='Movimentação de Caixa',
+    sql='''
+        SELECT DATE(data) as data,
+        SUM(CASE WHEN metodo_pagamento = 'fiado' THEN 0 ELSE total END) as entradas,
+        SUM(CASE WHEN metodo_pagamento = 'fiado' THEN total ELSE 0 END) as saidas
+        FROM vendas GROUP BY DATE(data) ORDER BY data DESC
+    ''',
+))
+
+registrar(Relatorio(
+    chave='comparativo',
+    titulo='Comparativo de Vendas',
+    # O formato de agrupamento é um parâmetro da consulta, não interpolado no SQL
+    sql='''
+        SELECT strftime(?, data) as periodo,
+        COUNT(*) as total_vendas, SUM(total) as valor_total
+        FROM vendas GROUP BY periodo ORDER BY periodo DESC LIMIT 12
+    ''',
+    parametros=(Parametro('periodo', 'choice', default='month', opcoes=tuple(FORMATOS_PERIODO)),),
+    argumentos=lambda v: (FORMATOS_PERIODO[v['periodo']],),
+))
+
+registrar(Relatorio(
+    chave='comparativo_periodos',
+    titulo='Comparativo entre Períodos',
+    # Uma única consulta: agrega por período e calcula, com funções de janela,
+    # a variação sobre o período anterior (LAG), sobre o mesmo período do ano
+    # anterior (RANGE sobre o índice numérico do período, que respeita meses
+    # ou semanas sem vendas), a média móvel e o acumulado do intervalo exibido.
+    # ?1 granularidade, ?2/?3 intervalo lido, ?4 início exibido,
+    # ?5 períodos por ano, ?6 tamanho da janela da média móvel - 1
+    sql='''
+        WITH por_venda AS (
+            SELECT
+                CASE ?1
+                    WHEN 'day' THEN DATE(data)
+                    WHEN 'week' THEN DATE(data, 'weekday 0', '-6 days')
+                    WHEN 'month' THEN strftime('%Y-%m-01', data)
+                    ELSE strftime('%Y-01-01', data)
+                END AS inicio_periodo,
+                total
+            FROM vendas
+            WHERE data >= ?2 AND data < ?3
+        ),
+        por_periodo AS (
+            SELECT
+                inicio_periodo,
+                CASE ?1
+                    WHEN 'day' THEN CAST(JULIANDAY(inicio_periodo) AS INTEGER)
+                    WHEN 'week' THEN CAST(JULIANDAY(inicio_periodo) AS INTEGER) / 7
+                    WHEN 'month' THEN CAST(strftime('%Y', inicio_periodo) AS INTEGER) * 12
+                                      + CAST(strftime('%m', inicio_periodo) AS INTEGER)
+                    ELSE CAST(strftime('%Y', inicio_periodo) AS INTEGER)
+                END AS indice,
+                COUNT(*) AS total_vendas,
+                SUM(total) AS valor_total
+            FROM por_venda
+            WHERE inicio_periodo IS NOT NULL
+            GROUP BY inicio_periodo
+        ),
+        janelas AS (
+            SELECT
+                *,
+                LAG(valor_total) OVER (ORDER BY indice) AS valor_anterior,
+                SUM(valor_total) OVER (
+                    ORDER BY indice RANGE BETWEEN ?5 PRECEDING AND ?5 PRECEDING
+                ) AS valor_ano_anterior,
+                AVG(valor_total) OVER (
+                    ORDER BY indice ROWS BETWEEN ?6 PRECEDING AND CURRENT ROW
+                ) AS valor_media_movel
+            FROM por_periodo
+        )
+        SELECT
+            CASE ?1
+                WHEN 'month' THEN strftime('%Y-%m', inicio_periodo)
+                WHEN 'year' THEN strftime('%Y', inicio_periodo)
+                ELSE inicio_periodo
+            END AS periodo,
+            total_vendas,
+            valor_total,
+            valor_anterior,
+            ROUND(100.0 * (valor_total - valor_anterior) / valor_anterior, 2) AS variacao_periodo_pct,
+            valor_ano_anterior,
+            ROUND(100.0 * (valor_total - valor_ano_anterior) / valor_ano_anterior, 2) AS variacao_anual_pct,
+            ROUND(valor_media_movel, 2) AS valor_media_movel,
+            SUM(valor_total) OVER (ORDER BY indice ROWS UNBOUNDED PRECEDING) AS valor_acumulado
+        FROM janelas
+        WHERE inicio_periodo >= ?4
+        ORDER BY indice
+    ''',
+    parametros=(
+        Parametro('granularidade', 'choice', default='month', opcoes=GRANULARIDADES),
+        Parametro('start_date', 'date', default=primeiro_dia_ano),
+        Parametro('end_date', 'date'),
+        Parametro('janela', 'int', default=3, minimo=1, maximo=52),
+    ),
+    argumentos=argumentos_comparativo_periodos,
+))
+
+# Relatórios servidos pelo cubo (vendas_cubo): o custo depende do número de
+# períodos no intervalo, não do número de vendas.
+registrar(Relatorio(
+    chave='mapa_calor_vendas',
+    titulo='Mapa de Calor de Vendas (dia da semana x hora)',
+    sql='''
+        SELECT
+            substr('DomSegTerQuaQuiSexSáb', 1 + 3 * strftime('%w', inicio), 3) AS dia_semana,
+            CAST(strftime('%H', inicio) AS INTEGER) AS hora,
+            SUM(quantidade_vendas) AS total_vendas,
+            SUM(valor_total) AS valor_total
+        FROM vendas_cubo
+        WHERE granularidade = 'hour' AND inicio >= ? AND inicio < ? AND categoria = '*'
+        GROUP BY strftime('%w', inicio), hora
+        ORDER BY strftime('%w', inicio), hora
+    ''',
+    parametros=(
+        Parametro('start_date', 'date', default=primeiro_dia_mes),
+        Parametro('end_date', 'date', default=hoje),
+    ),
+    argumentos=lambda v: (inicio_intervalo(v['start_date']), fim_intervalo(v['end_date'])),
+))
+
+registrar(Relatorio(
+    chave='tendencia_vendas',
+    titulo='Tendência de Vendas',
+    sql='''
+        SELECT inicio AS data, SUM(quantidade_vendas) AS total_vendas,
+               SUM(valor_total) AS valor_total,
+               ROUND(SUM(valor_total) / SUM(quantidade_vendas), 2) AS ticket_medio
+        FROM vendas_cubo
+        WHERE granularidade = ? AND inicio >= ? AND inicio < ? AND categoria = '*'
+        GROUP BY inicio
+        ORDER BY inicio
+    ''',
+    parametros=(
+        Parametro('granularidade', 'choice', default='day', opcoes=GRANULARIDADES_CUBO),
+        Parametro('start_date', 'date', default=primeiro_dia_mes),
+        Parametro('end_date', 'date', default=hoje),
+    ),
+    argumentos=lambda v: (
+        v['granularidade'],
+        inicio_periodo(v['start_date'], v['granularidade']).isoformat() if v['start_date'] else '',
+        fim_intervalo(v['end_date']),
+    ),
+))
+
+
+# ---------------------------------------------------------------
+# Verificação na inicialização
+# ---------------------------------------------------------------
+
+def varreduras_de_tabela(conn, sql, argumentos):
+    """Linhas do EXPLAIN QUERY PLAN que percorrem uma tabela inteira sem índice.
+
+    Varreduras de subconsultas/CTEs já materializadas (CO-ROUTINE/MATERIALIZE)
+    são ignoradas, pois percorrem apenas o resultado intermediário.
+    """
+    detalhes = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', argumentos)]
+    intermediarias = {d.split(' ', 1)[1] for d in detalhes
+                      if d.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    return [d for d in detalhes
+            if d.startswith('SCAN ') and 'USING' not in d
+            and d.split(' ')[1] not in intermediarias]
+
+
+def verificar_planos():
+    """Prepara cada consulta com EXPLAIN QUERY PLAN e registra varreduras completas.
+
+    Erros de SQL são propagados, impedindo a aplicação de subir com uma
+    definição inválida. Retorna {chave: [detalhes das varreduras]}.
+    """
+    varreduras = {}
+    with get_db_connection() as conn:
+        for relatorio in RELATORIOS.values():
+            valores = {p.nome: p.valor_padrao() for p in relatorio.parametros}
+            consultas = [(relatorio.sql, relatorio.bind(valores))]
+            if relatorio.paginado:
+                consultas.append((relatorio.sql_total, relatorio.bind_total(valores)))
+
+            for sql, argumentos in consultas:
+                detalhes = varreduras_de_tabela(conn, sql, argumentos)
+                if detalhes:
+                    varreduras.setdefault(relatorio.chave, []).extend(detalhes)
+
+    for chave, detalhes in varreduras.items():
+        logger.warning(f"Relatório '{chave}' faz varredura completa: {'; '.join(detalhes)}")
+    return varreduras
@@ -0,0 +1,131 @@
+"""Séries para os gráficos (ECharts) dos relatórios unificados.
+
+As séries temporais são reduzidas no servidor para o número de pontos que o
+gráfico consegue exibir na largura solicitada (em pixels), usando LTTB
+(Largest-Triangle-Three-Buckets) ou min/max por faixa.
+"""
+import numpy as np
+
+from registro_relatorios import Parametro
+
+PARAMETROS_GRAFICO = (
+    Parametro('largura', 'int', default=800, minimo=50, maximo=4000),
+    Parametro('metodo', 'choice', default='lttb', opcoes=('lttb', 'minmax')),
+)
+
+
+def validar_parametros(args):
+    return {p.nome: p.resolver(args.get(p.nome)) for p in PARAMETROS_GRAFICO}
+
+
+# ---------------------------------------------------------------
+# Redução de pontos (retornam os índices dos pontos mantidos)
+# ---------------------------------------------------------------
+
+def lttb(x, y, limite):
+    """Largest-Triangle-Three-Buckets: mantém o primeiro, o último e, em cada
+    faixa, o ponto que forma o maior triângulo com o escolhido na faixa
+    anterior e a média da faixa seguinte."""
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    limites = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    indices = np.empty(limite, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(limite - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        proximo_fim = limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[fim:proximo_fim].mean() if proximo_fim > fim else x[-1]
+        media_y = y[fim:proximo_fim].mean() if proximo_fim > fim else y[-1]
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+    return indices
+
+
+def minmax(x, y, limite):
+    """Mantém o mínimo e o máximo de cada faixa (limite // 2 faixas)."""
+    n = len(x)
+    faixas = max(limite // 2, 1)
+    if limite >= n:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    limites = np.linspace(0, n, faixas + 1).astype(np.int64)
+    indices = []
+    for inicio, fim in zip(limites[:-1], limites[1:]):
+        if fim > inicio:
+            trecho = y[inicio:fim]
+            indices.extend((inicio + int(np.argmin(trecho)), inicio + int(np.argmax(trecho))))
+    return np.unique(indices)
+
+
+REDUTORES = {'lttb': lttb, 'minmax': minmax}
+
+
+def serie_temporal(datas, valores, largura, metodo='lttb'):
+    """Retorna os pares [data, valor] reduzidos para caber em `largura` pixels."""
+    if not datas:
+        return []
+    x = np.array(datas, dtype='datetime64[s]').astype(np.int64)
+    indices = REDUTORES[metodo](x, valores, largura)
+    return [[datas[i], valores[i]] for i in indices.tolist()]
+
+
+# ---------------------------------------------------------------
+# Gráficos por relatório
+# ---------------------------------------------------------------
+
+def _grafico_vendas_periodo(dados, largura, metodo):
+    datas = [linha['data'] for linha in dados]
+    return {
+        'tipo': 'serie_temporal',
+        'pontos_originais': len(dados),
+        'series': [
+            {'nome': 'Total de Vendas', 'tipo': 'bar', 'eixo': 0,
+             'pontos': serie_temporal(datas, [linha['total_vendas'] for linha in dados], largura, metodo)},
+            {'nome': 'Valor Total', 'tipo': 'line', 'eixo': 1,
+             'pontos': serie_temporal(datas, [linha['valor_total'] for linha in dados], largura, metodo)},
+        ],
+    }
+
+
+def _grafico_categorias(campo_nome):
+    def grafico(dados, largura, metodo):
+        return {
+            'tipo': 'categorias',
+            'pontos_originais': len(dados),
+            'categorias': [linha[campo_nome] for linha in dados],
+            'valores': [linha['valor_total'] for linha in dados],
+        }
+    return grafico
+
+
+DIAS_SEMANA = ['Dom', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb']
+
+
+def _grafico_mapa_calor(dados, largura, metodo):
+    return {
+        'tipo': 'mapa_calor',
+        'pontos_originais': len(dados),
+        'dias': DIAS_SEMANA,
+        'horas': list(range(24)),
+        # [hora, índice do dia, valor, quantidade de vendas]
+        'pontos': [[linha['hora'], DIAS_SEMANA.index(linha['dia_semana']),
+                    linha['valor_total'], linha['total_vendas']] for linha in dados],
+    }
+
+
+GRAFICOS = {
+    'vendas_periodo': _grafico_vendas_periodo,
+    'tendencia_vendas': _grafico_vendas_periodo,
+    'mapa_calor_vendas': _grafico_mapa_calor,
+    'vendas_categorias': _grafico_categorias('categoria'),
+    'top_produtos': _grafico_categorias('nome'),
+}
@@ -0,0 +1,346 @@
+"""Snapshots colunares do histórico de vendas para os relatórios analíticos.
+
+O histórico de dias já encerrados é gravado em arquivos binários de largura
+fixa (um por coluna) e lido com np.memmap, sem converter linhas em objetos
+Python. Cada atualização apenas acrescenta os dias novos ao final dos
+arquivos; as vendas a partir do dia seguinte ao snapshot são lidas do SQLite
+e combinadas no momento da consulta.
+
+Alterações em dias já incluídos (edição ou exclusão de vendas antigas) são
+marcadas por triggers do banco na tabela snapshot_vendas_dias_alterados; a
+consulta confere essa tabela com uma leitura pelo índice e, havendo dia
+alterado, os relatórios voltam ao SQL até a próxima atualização reconstruir
+o snapshot.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from analise_vendas import centavos_para_reais, consultar_tuplas, agrupar, dia_para_int, int_para_dia
+from banco_dados import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+COLUNAS = {
+    'vendas': {'dia': np.int32, 'total': np.int64},
+    'itens': {'produto': np.int32, 'quantidade': np.float64, 'valor': np.int64},
+}
+
+SQL_VENDAS = '''
+    SELECT CAST(JULIANDAY(DATE(data)) - 2440587.5 AS INTEGER),
+           CAST(ROUND(total * 100) AS INTEGER)
+    FROM vendas WHERE data >= ? AND data < ?
+    ORDER BY data
+'''
+
+SQL_ITENS = '''
+    SELECT vi.produto_id, vi.quantidade,
+           CAST(ROUND(vi.quantidade * vi.preco_unitario * 100) AS INTEGER)
+    FROM venda_itens vi JOIN vendas v ON v.id = vi.venda_id
+    WHERE v.data >= ? AND v.data < ?
+'''
+
+# Snapshot registrado no banco e primeiro dia dele alterado depois da gravação
+SQL_CONFERENCIA = '''
+    SELECT ate, atualizado_em, (SELECT MIN(dia) FROM snapshot_vendas_dias_alterados)
+    FROM snapshot_vendas WHERE id = 1
+'''
+
+UNIDADES_PERIODO = {'month': 'M', 'year': 'Y'}
+
+
+def _dia_seguinte(data_iso):
+    return (date.fromisoformat(data_iso) + timedelta(days=1)).isoformat()
+
+
+def _registrar(conn, ate, atualizado_em):
+    """Registra no banco até onde vai o snapshot; a partir do commit os triggers
+    marcam os dias até `ate` que forem alterados."""
+    conn.execute("INSERT OR REPLACE INTO snapshot_vendas (id, ate, atualizado_em) VALUES (1, ?, ?)",
+                 (ate, atualizado_em))
+    conn.execute("DELETE FROM snapshot_vendas_dias_alterados")
+
+
+def _divergencia(conn, meta):
+    """Motivo pelo qual o snapshot de `meta` não corresponde mais ao banco, ou None."""
+    registro = conn.execute(SQL_CONFERENCIA).fetchone()
+    if registro is None or tuple(registro[:2]) != (meta['ate'], meta['atualizado_em']):
+        return "snapshot não registrado no banco"
+    if registro[2] is not None:
+        return f"vendas de {registro[2]} alteradas após o snapshot"
+    return None
+
+
+def _carregar_intervalo(conn, inicio, fim):
+    """Lê do SQLite as vendas/itens com inicio <= data < fim em arrays por coluna."""
+    vendas = np.fromiter(consultar_tuplas(conn, SQL_VENDAS, (inicio, fim)),
+                         dtype=np.dtype([(c, t) for c, t in COLUNAS['vendas'].items()]))
+    itens = np.fromiter(consultar_tuplas(conn, SQL_ITENS, (inicio, fim)),
+                        dtype=np.dtype([(c, t) for c, t in COLUNAS['itens'].items()]))
+    return (
+        {c: vendas[c] for c in COLUNAS['vendas']},
+        {c: itens[c] for c in COLUNAS['itens']},
+    )
+
+
+class SnapshotVendas:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+        # Snapshot (atualizado_em) cuja divergência já foi registrada no log
+        self._avisado = None
+
+    # -----------------------
+    # Arquivos
+    # -----------------------
+    def _caminho(self, tabela, coluna):
+        return os.path.join(self.pasta, f"{tabela}_{coluna}.bin")
+
+    @property
+    def _caminho_meta(self):
+        return os.path.join(self.pasta, 'meta.json')
+
+    def meta(self):
+        try:
+            with open(self._caminho_meta, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _gravar_meta(self, meta):
+        temporario = self._caminho_meta + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temporario, self._caminho_meta)
+
+    def _acrescentar(self, tabela, linhas_atuais, arrays):
+        for coluna, tipo in COLUNAS[tabela].items():
+            with open(self._caminho(tabela, coluna), 'ab') as f:
+                # Descarta bytes de uma gravação interrompida antes da meta
+                f.truncate(linhas_atuais * np.dtype(tipo).itemsize)
+                f.write(np.ascontiguousarray(arrays[coluna], dtype=tipo).tobytes())
+
+    def _mapear(self, tabela, linhas):
+        """Abre as colunas em modo somente leitura, sem copiar para a memória."""
+        colunas = {}
+        for coluna, tipo in COLUNAS[tabela].items():
+            if linhas:
+                colunas[coluna] = np.memmap(self._caminho(tabela, coluna), dtype=tipo,
+                                            mode='r', shape=(linhas,))
+            else:
+                colunas[coluna] = np.empty(0, dtype=tipo)
+        return colunas
+
+    # -----------------------
+    # Atualização
+    # -----------------------
+    def atualizar(self, ate=None):
+        """Acrescenta ao snapshot os dias encerrados até `ate` (padrão: ontem)."""
+        ate = ate or (datetime.now().date() - timedelta(days=1)).isoformat()
+        with self._lock:
+            meta = self.meta()
+            if meta is None or not self._arquivos_integros(meta):
+                return self._reconstruir(ate)
+
+            with get_db_connection() as conn:
+                # Conferência, leitura e registro sem escrita concorrente no meio
+                conn.execute('BEGIN IMMEDIATE')
+                divergencia = _divergencia(conn, meta)
+                if divergencia is None and meta['ate'] < ate:
+                    vendas, itens = _carregar_intervalo(conn, _dia_seguinte(meta['ate']),
+                                                        _dia_seguinte(ate))
+                    atualizado_em = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    _registrar(conn, ate, atualizado_em)
+                    conn.commit()
+            if divergencia is not None:
+                logger.warning(f"Snapshot de vendas divergente do banco ({divergencia}); reconstruindo")
+                return self._reconstruir(ate)
+            if meta['ate'] >= ate:
+                return meta
+
+            self._acrescentar('vendas', meta['vendas'], vendas)
+            self._acrescentar('itens', meta['itens'], itens)
+            meta.update({
+                'ate': ate,
+                'vendas': meta['vendas'] + len(vendas['dia']),
+                'itens': meta['itens'] + len(itens['produto']),
+                'soma_total': meta['soma_total'] + int(vendas['total'].sum()),
+                'atualizado_em': atualizado_em,
+            })
+            self._gravar_meta(meta)
+        logger.info(f"Snapshot de vendas atualizado até {ate}: "
+                    f"{len(vendas['dia'])} vendas e {len(itens['produto'])} itens novos")
+        return meta
+
+    def reconstruir(self, ate=None):
+        ate = ate or (datetime.now().date() - timedelta(days=1)).isoformat()
+        with self._lock:
+            return self._reconstruir(ate)
+
+    def _reconstruir(self, ate):
+        os.makedirs(self.pasta, exist_ok=True)
+        atualizado_em = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with get_db_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            vendas, itens = _carregar_intervalo(conn, '', _dia_seguinte(ate))
+            _registrar(conn, ate, atualizado_em)
+            conn.commit()
+        # Grava as colunas novas ao lado e troca de uma vez; leitores com
+        # memmap aberto continuam vendo os arquivos antigos. Até a meta nova
+        # ser gravada ela não corresponde ao registro no banco e os relatórios
+        # usam o SQL.
+        for tabela, arrays in (('vendas', vendas), ('itens', itens)):
+            for coluna, tipo in COLUNAS[tabela].items():
+                caminho = self._caminho(tabela, coluna)
+                with open(caminho + '.tmp', 'wb') as f:
+                    f.write(np.ascontiguousarray(arrays[coluna], dtype=tipo).tobytes())
+                os.replace(caminho + '.tmp', caminho)
+        meta = {
+            'ate': ate,
+            'vendas': len(vendas['dia']),
+            'itens': len(itens['produto']),
+            'soma_total': int(vendas['total'].sum()),
+            'atualizado_em': atualizado_em,
+        }
+        self._gravar_meta(meta)
+        logger.info(f"Snapshot de vendas reconstruído até {ate}: "
+                    f"{meta['vendas']} vendas e {meta['itens']} itens")
+        return meta
+
+    def _arquivos_integros(self, meta):
+        """Confere se as colunas existem e têm pelo menos as linhas da meta."""
+        for tabela, chave in (('vendas', 'vendas'), ('itens', 'itens')):
+            for coluna, tipo in COLUNAS[tabela].items():
+                caminho = self._caminho(tabela, coluna)
+                if not os.path.exists(caminho) or \
+                        os.path.getsize(caminho) < meta[chave] * np.dtype(tipo).itemsize:
+                    logger.warning(f"Coluna {caminho} do snapshot ausente ou truncada; reconstruindo")
+                    return False
+        return True
+
+    def atual(self):
+        """True se existe snapshot e os dias gravados nele não mudaram no banco.
+
+        Custa uma leitura pelo índice de snapshot_vendas_dias_alterados; com
+        divergência os relatórios devem usar o SQL.
+        """
+        meta = self.meta()
+        if meta is None:
+            return False
+        with get_db_connection() as conn:
+            divergencia = _divergencia(conn, meta)
+        if divergencia is not None and self._avisado != meta['atualizado_em']:
+            self._avisado = meta['atualizado_em']
+            logger.warning(f"Snapshot de vendas até {meta['ate']} desatualizado ({divergencia}); "
+                           "relatórios pelo SQL até a próxima atualização")
+        return divergencia is None
+
+    def relatorio(self, chave, valores):
+        """Dados do relatório `chave` pelo snapshot, ou None se ele não serve
+        esse relatório ou está desatualizado."""
+        if chave not in RELATORIOS_SNAPSHOT or not self.atual():
+            return None
+        return RELATORIOS_SNAPSHOT[chave](self, valores)
+
+    # -----------------------
+    # Leitura
+    # -----------------------
+    def colunas(self):
+        """Retorna (vendas, itens) do snapshot mais as vendas posteriores a ele."""
+        with self._lock:
+            meta = self.meta()
+            if meta is None:
+                historico = (self._mapear('vendas', 0), self._mapear('itens', 0))
+                inicio = ''
+            else:
+                historico = (self._mapear('vendas', meta['vendas']),
+                             self._mapear('itens', meta['itens']))
+                inicio = _dia_seguinte(meta['ate'])
+        with get_db_connection() as conn:
+            recentes = _carregar_intervalo(conn, inicio, '9999-12-31')
+        return historico, recentes
+
+    # -----------------------
+    # Relatórios
+    # -----------------------
+    def vendas_periodo(self, start_date, end_date):
+        (vendas, _), (recentes, _) = self.colunas()
+        inicio = dia_para_int(start_date) if start_date else np.iinfo(np.int32).min
+        fim = dia_para_int(end_date) if end_date else np.iinfo(np.int32).max
+        # O histórico é ordenado por data: basta fatiar o intervalo
+        i = int(np.searchsorted(vendas['dia'], inicio, side='left'))
+        j = int(np.searchsorted(vendas['dia'], fim, side='right'))
+        filtro = (recentes['dia'] >= inicio) & (recentes['dia'] <= fim)
+        dias = np.concatenate([vendas['dia'][i:j], recentes['dia'][filtro]])
+        totais = np.concatenate([vendas['total'][i:j], recentes['total'][filtro]])
+        unicos, contagens, (somas,) = agrupar(dias, [totais])
+        return [
+            {'data': d, 'total_vendas': int(n), 'valor_total': float(v), 'ticket_medio': float(v / n)}
+            for d, n, v in zip(int_para_dia(unicos).tolist(), contagens, centavos_para_reais(somas))
+        ]
+
+    def comparativo(self, periodo='month', limite=12):
+        (vendas, _), (recentes, _) = self.colunas()
+        unidade = UNIDADES_PERIODO[periodo]
+        inicio = self._inicio_ultimos_periodos(vendas['dia'], unidade, limite)
+        dias = np.concatenate([vendas['dia'][inicio:], recentes['dia']])
+        totais = np.concatenate([vendas['total'][inicio:], recentes['total']])
+        chaves = dias.astype('datetime64[D]').astype(f'datetime64[{unidade}]').astype(np.int64)
+        periodos, contagens, (somas,) = agrupar(chaves, [totais])
+        ordem = np.argsort(periodos)[::-1][:limite]
+        rotulos = periodos[ordem].astype(f'datetime64[{unidade}]').astype(str).tolist()
+        return [
+            {'periodo': p, 'total_vendas': int(n), 'valor_total': float(v)}
+            for p, n, v in zip(rotulos, contagens[ordem], centavos_para_reais(somas[ordem]))
+        ]
+
+    @staticmethod
+    def _inicio_ultimos_periodos(dias, unidade, limite):
+        """Posição em `dias` (ordenado) a partir da qual estão os `limite` últimos períodos."""
+        if not len(dias):
+            return 0
+        ultimo = np.datetime64(int(dias[-1]), 'D').astype(f'datetime64[{unidade}]')
+        recuo = limite
+        while True:
+            primeiro_dia = (ultimo - (recuo - 1)).astype('datetime64[D]').astype(np.int64)
+            inicio = int(np.searchsorted(dias, primeiro_dia))
+            periodos = np.unique(dias[inicio:].astype('datetime64[D]').astype(f'datetime64[{unidade}]'))
+            # Meses/anos sem vendas não aparecem no relatório; recua mais se preciso
+            if inicio == 0 or len(periodos) >= limite:
+                return inicio
+            recuo *= 2
+
+    def top_produtos(self, limit=10):
+        (_, itens), (_, recentes) = self.colunas()
+        with get_db_connection() as conn:
+            produtos = dict(consultar_tuplas(conn, "SELECT id, nome FROM produtos").fetchall())
+        ids = np.fromiter(produtos, dtype=np.int64, count=len(produtos))
+        tamanho = int(ids.max()) + 1 if len(ids) else 0
+        linhas = np.zeros(tamanho, dtype=np.int64)
+        quantidades = np.zeros(tamanho)
+        valores = np.zeros(tamanho)
+        for parte in (itens, recentes):
+            validos = (parte['produto'] >= 0) & (parte['produto'] < tamanho)
+            produto = parte['produto'][validos]
+            linhas += np.bincount(produto, minlength=tamanho)
+            quantidades += np.bincount(produto, weights=parte['quantidade'][validos], minlength=tamanho)
+            valores += np.bincount(produto, weights=parte['valor'][validos], minlength=tamanho)
+        ids = ids[linhas[ids] > 0]  # equivale ao JOIN com venda_itens
+        ids = ids[np.argsort(-valores[ids], kind='stable')][:limit]
+        return [
+            {'nome': produtos[int(p)], 'quantidade_vendida': float(quantidades[p]),
+             'valor_total': float(centavos_para_reais(valores[p]))}
+            for p in ids
+        ]
+
+
+# Relatórios do registro que podem ser servidos pelo snapshot
+RELATORIOS_SNAPSHOT = {
+    'vendas_periodo': lambda s, v: s.vendas_periodo(v['start_date'], v['end_date']),
+    'comparativo': lambda s, v: s.comparativo(v['periodo']),
+    'top_produtos': lambda s, v: s.top_produtos(v['limit']),
+}
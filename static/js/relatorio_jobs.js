@@ -0,0 +1,51 @@
+// Submete relatórios demorados para a fila em segundo plano e acompanha o progresso.
+// Uso: <a href="(rota síncrona)" data-job-tipo="pdf_completo" data-job-url="..." data-csrf="...">
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-job-tipo]').forEach(function(botao) {
+        const status = document.createElement('div');
+        status.className = 'job-status text-muted small mt-1';
+        botao.insertAdjacentElement('afterend', status);
+
+        botao.addEventListener('click', async function(evento) {
+            evento.preventDefault();
+            if (botao.classList.contains('disabled')) return;
+            botao.classList.add('disabled');
+            status.textContent = 'Enviando para a fila...';
+
+            const parametros = Object.assign({ tipo: botao.dataset.jobTipo },
+                JSON.parse(botao.dataset.jobParametros || '{}'));
+            try {
+                const resposta = await fetch(botao.dataset.jobUrl, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': botao.dataset.csrf },
+                    body: JSON.stringify(parametros)
+                });
+                const job = await resposta.json();
+                if (!resposta.ok) throw new Error(job.error || 'Falha ao enviar o job');
+                acompanhar(job.status_url);
+            } catch (erro) {
+                falhar(erro.message);
+            }
+        });
+
+        function falhar(mensagem) {
+            status.textContent = 'Erro: ' + mensagem;
+            botao.classList.remove('disabled');
+        }
+
+        async function acompanhar(url) {
+            const resposta = await fetch(url);
+            const job = await resposta.json();
+            if (job.status === 'concluido') {
+                status.textContent = 'Concluído.';
+                botao.classList.remove('disabled');
+                window.location.href = job.download_url;
+            } else if (job.status === 'erro') {
+                falhar(job.mensagem || 'Falha ao gerar o relatório');
+            } else {
+                status.textContent = `${job.mensagem || 'Na fila'} (${job.progresso}%)`;
+                setTimeout(function() { acompanhar(url); }, 1000);
+            }
+        }
+    });
+});
@@ -1,4 +1,7 @@
+import os
+
 import pytest
+from flask import Flask
 from app import app
 
 @pytest.fixture
@@ -12,4 +15,15 @@ def app():
 
 @pytest.fixture
 def client(app):
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+
+
+@pytest.fixture
+def app_fotos(tmp_path):
+    """App mínimo com as pastas de fotos (UPLOAD_FOLDER e versões reduzidas) em tmp_path."""
+    app = Flask(__name__, static_folder=str(tmp_path / 'static'))
+    app.config['TESTING'] = True
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'static' / 'uploads' / 'produtos')
+    app.config['UPLOAD_DERIVATIVES_FOLDER'] = str(tmp_path / 'static' / 'uploads' / 'derivados')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return app
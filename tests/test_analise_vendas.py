@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from banco_dados import (
+    init_db, get_db_connection, create_user, create_produto,
+    create_venda, create_venda_item
+)
+from registro_relatorios import get_relatorio
+import analise_vendas
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def vendas(test_db):
+    """Vendas em dois meses, duas categorias e quantidades fracionadas."""
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    picanha = create_produto('Picanha', '', 'BOI', 80, 100)
+    linguica = create_produto('Linguiça', '', 'PORCO', 25, 100)
+    lancamentos = [
+        ('V1', '2025-01-03 09:00:00', 'Ana', [(picanha, 1.5, 80.0)]),
+        ('V2', '2025-01-03 17:30:00', 'Ana', [(linguica, 2, 25.0), (picanha, 0.25, 80.0)]),
+        ('V3', '2025-01-10 12:00:00', None, [(linguica, 1, 25.0)]),
+        ('V4', '2025-02-01 08:00:00', 'Ana', [(picanha, 1, 80.0)]),
+        ('V5', '2025-02-14 19:00:00', 'Bruno', [(linguica, 0.5, 25.0)]),
+    ]
+    for venda_id, data, cliente, itens in lancamentos:
+        total = sum(q * p for _, q, p in itens)
+        create_venda(venda_id, None, cliente, total, 'dinheiro', user_id)
+        for produto_id, quantidade, preco in itens:
+            create_venda_item(venda_id, produto_id, quantidade, preco)
+        with get_db_connection() as conn:
+            conn.execute("UPDATE vendas SET data = ? WHERE id = ?", (data, venda_id))
+            conn.commit()
+    return analise_vendas.carregar_colunas()
+
+
+def via_sql(chave, **args):
+    relatorio = get_relatorio(chave)
+    with get_db_connection() as conn:
+        return [dict(row) for row in relatorio.executar(conn, relatorio.validar(args))]
+
+
+def assert_mesmas_linhas(numpy, sql):
+    assert len(numpy) == len(sql)
+    for a, b in zip(numpy, sql):
+        assert a.keys() == b.keys()
+        for campo, valor in b.items():
+            if isinstance(valor, float):
+                assert a[campo] == pytest.approx(valor)
+            else:
+                assert a[campo] == valor
+
+
+def test_carregar_colunas(vendas):
+    assert vendas.total_vendas == 5
+    assert vendas.total_itens == 6
+    assert vendas.venda_total.dtype == np.int64
+    assert vendas.venda_total.sum() == 12000 + 7000 + 2500 + 8000 + 1250
+    assert analise_vendas.int_para_dia(vendas.venda_dia[:1])[0] == '2025-01-03'
+
+
+def test_vendas_periodo_igual_ao_sql(vendas):
+    numpy = analise_vendas.vendas_periodo(vendas, '2025-01-01', '2025-01-31')
+    assert_mesmas_linhas(numpy, via_sql('vendas_periodo', start_date='2025-01-01',
+                                        end_date='2025-01-31'))
+    assert [d['data'] for d in numpy] == ['2025-01-03', '2025-01-10']
+
+
+@pytest.mark.parametrize('periodo', ['month', 'year'])
+def test_comparativo_igual_ao_sql(vendas, periodo):
+    assert_mesmas_linhas(analise_vendas.comparativo(vendas, periodo),
+                         via_sql('comparativo', periodo=periodo))
+
+
+def test_vendas_categorias_igual_ao_sql(vendas):
+    numpy = analise_vendas.vendas_categorias(vendas)
+    assert_mesmas_linhas(numpy, via_sql('vendas_categorias'))
+    assert numpy[0] == {'categoria': 'BOI', 'quantidade_vendida': 2.75, 'valor_total': 220.0}
+
+
+def test_clientes_fieis_igual_ao_sql(vendas):
+    numpy = analise_vendas.clientes_fieis(vendas, limit=5)
+    assert_mesmas_linhas(numpy, via_sql('clientes_fieis', limit=5))
+    assert [c['cliente_nome'] for c in numpy] == ['Ana', 'Bruno']
+
+
+def test_banco_vazio(test_db):
+    colunas = analise_vendas.carregar_colunas()
+    assert analise_vendas.vendas_periodo(colunas, '2025-01-01', '2025-12-31') == []
+    assert analise_vendas.comparativo(colunas) == []
+    assert analise_vendas.vendas_categorias(colunas) == []
+    assert analise_vendas.clientes_fieis(colunas) == []
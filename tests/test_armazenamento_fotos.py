@@ -0,0 +1,167 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from io import BytesIO
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from armazenamento_fotos import (
+    esvaziar_quarentena, extensao, guardar_foto, registrar_upload, remover_sem_uso
+)
+from banco_dados import (
+    atualizar_produto, coletar_fotos_orfas, create_produto, deduplicar_fotos_produtos, excluir_produto,
+    get_db_connection, get_produto_by_id, init_db, inserir_produto
+)
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+def upload(conteudo, nome='foto.jpg'):
+    return FileStorage(stream=BytesIO(conteudo), filename=nome)
+
+
+def form_produto(nome):
+    return {'nome': nome, 'preco': '10', 'quantidade': '1', 'categoria': 'BOI', 'tipo_venda': 'kg'}
+
+
+def referencias():
+    with get_db_connection() as conn:
+        return dict(conn.execute("SELECT arquivo, referencias FROM arquivos_upload").fetchall())
+
+
+def test_extensao():
+    assert extensao('OIP.JPEG') == 'jpg'
+    assert extensao('logo.png') == 'png'
+    assert extensao('sem_extensao') == extensao('x./../../a') == 'bin'
+
+
+def test_uploads_identicos_guardados_uma_vez(app_fotos, test_db):
+    with app_fotos.app_context():
+        pasta = app_fotos.config['UPLOAD_FOLDER']
+        a = inserir_produto(form_produto('A'), upload(b'mesma-imagem', 'OIP.jpeg'))
+        b = inserir_produto(form_produto('B'), upload(b'mesma-imagem', 'copia.jpg'))
+        foto = get_produto_by_id(a)['foto']
+        assert foto == f"{hashlib.sha256(b'mesma-imagem').hexdigest()}.jpg"
+        assert get_produto_by_id(b)['foto'] == foto
+        assert os.listdir(pasta) == [foto]
+        assert referencias() == {foto: 2}
+
+        # Reenviar a mesma imagem não a apaga
+        atualizar_produto(a, form_produto('A'), upload(b'mesma-imagem', 'OIP.jpeg'))
+        assert referencias() == {foto: 2}
+
+        excluir_produto(a)
+        assert os.listdir(pasta) == [foto] and referencias() == {foto: 1}
+
+        atualizar_produto(b, form_produto('B'), upload(b'outra-imagem', 'nova.png'))
+        nova = get_produto_by_id(b)['foto']
+        assert os.listdir(pasta) == [nova] and referencias() == {nova: 1}
+        excluir_produto(b)
+        assert os.listdir(pasta) == [] and referencias() == {}
+
+
+def test_migracao_deduplica_pasta(app_fotos, test_db):
+    with app_fotos.app_context():
+        pasta = app_fotos.config['UPLOAD_FOLDER']
+        for nome, conteudo in [('1749386990.1_OIP.jpeg', b'oip'), ('1749387118.3_OIP.jpeg', b'oip'),
+                               ('picanha.webp', b'picanha'), ('orfa.png', b'orfa')]:
+            with open(os.path.join(pasta, nome), 'wb') as f:
+                f.write(conteudo)
+        primeiro = create_produto('OIP 1', '', 'BOI', 10, 1)
+        segundo = create_produto('OIP 2', '', 'BOI', 10, 1)
+        picanha = create_produto('Picanha', '', 'BOI', 10, 1)
+        sumida = create_produto('Sumida', '', 'BOI', 10, 1)
+        with get_db_connection() as conn:
+            conn.executemany("UPDATE produtos SET foto = ? WHERE id = ?", [
+                ('1749386990.1_OIP.jpeg', primeiro), ('1749387118.3_OIP.jpeg', segundo),
+                ('uploads/produtos/picanha.webp', picanha), ('nao-existe.png', sumida)])
+            conn.commit()
+
+        resumo = deduplicar_fotos_produtos()
+        oip = f"{hashlib.sha256(b'oip').hexdigest()}.jpg"
+        assert get_produto_by_id(primeiro)['foto'] == get_produto_by_id(segundo)['foto'] == oip
+        assert get_produto_by_id(picanha)['foto'] == f"{hashlib.sha256(b'picanha').hexdigest()}.webp"
+        assert get_produto_by_id(sumida)['foto'] == 'nao-existe.png'
+        assert resumo['duplicados'] == 1 and resumo['bytes_liberados'] == 3
+        assert resumo['sem_arquivo'] == ['nao-existe.png']
+        # A órfã é renomeada, mas fica sem referências (fica para a coleta de órfãs)
+        assert len(os.listdir(pasta)) == 3
+        assert referencias() == {oip: 2, get_produto_by_id(picanha)['foto']: 1}
+
+        # Rodar de novo não muda nada
+        assert deduplicar_fotos_produtos()['renomeados'] == []
+
+
+def test_coleta_de_fotos_orfas(app_fotos, test_db, tmp_path):
+    with app_fotos.app_context():
+        pasta = app_fotos.config['UPLOAD_FOLDER']
+        derivados = app_fotos.config['UPLOAD_DERIVATIVES_FOLDER']
+        quarentena = str(tmp_path / 'quarentena')
+        usada = get_produto_by_id(inserir_produto(form_produto('A'), upload(b'usada')))['foto']
+        os.makedirs(derivados, exist_ok=True)
+        for nome, conteudo in [('orfa.png', b'orfa!'), ('.upload_abc', b'meio'), ('recente.jpg', b'nova'),
+                               ('.gitkeep', b'')]:
+            with open(os.path.join(pasta, nome), 'wb') as f:
+                f.write(conteudo)
+        with open(os.path.join(derivados, 'orfa.png.160w.webp'), 'wb') as f:
+            f.write(b'mini')
+        with get_db_connection() as conn:
+            # Contador vazado: linha em arquivos_upload sem produto
+            conn.execute("INSERT INTO arquivos_upload (arquivo, sha256, tamanho, referencias) "
+                         "VALUES ('orfa.png', 'x', 5, 1)")
+            conn.commit()
+        antigo = os.path.getmtime(os.path.join(pasta, usada)) - 7200
+        for nome in (usada, 'orfa.png', '.upload_abc'):
+            os.utime(os.path.join(pasta, nome), (antigo, antigo))
+        os.utime(os.path.join(derivados, 'orfa.png.160w.webp'), (antigo, antigo))
+
+        resumo = coletar_fotos_orfas(3600, quarentena)
+        assert resumo == {'orfaos': ['orfa.png'], 'temporarios': 1, 'em_carencia': 1,
+                          'derivados': 1, 'bytes_liberados': 5 + 4 + 4}
+        assert sorted(os.listdir(pasta)) == sorted(['.gitkeep', 'recente.jpg', usada])
+        assert referencias() == {usada: 1}
+        movida, = os.listdir(quarentena)
+        assert movida.endswith('_orfa.png')
+
+        # Sem carência a recente também sai; sem quarentena é apagada
+        assert coletar_fotos_orfas(0)['orfaos'] == ['recente.jpg']
+        assert esvaziar_quarentena(quarentena, 30) == (0, 0)
+        assert esvaziar_quarentena(quarentena, 0, agora=os.path.getmtime(pasta) + 60) == (1, 5)
+
+
+def test_exclusao_concorrente_nao_apaga_upload_identico(app_fotos, test_db):
+    with app_fotos.app_context():
+        pasta = app_fotos.config['UPLOAD_FOLDER']
+        a = inserir_produto(form_produto('A'), upload(b'mesma-imagem'))
+        foto = get_produto_by_id(a)['foto']
+        with get_db_connection() as conn:
+            # Exclusão de A já liberou a última referência (commit feito)
+            conn.execute("DELETE FROM arquivos_upload")
+            conn.commit()
+
+        novo = guardar_foto(upload(b'mesma-imagem'), pasta)
+        removido = []
+
+        def excluir():
+            with get_db_connection() as conn:
+                removido.append(remover_sem_uso(conn, pasta, foto))
+
+        with get_db_connection() as conn_upload:
+            assert registrar_upload(conn_upload, pasta, novo) is False
+            exclusao = threading.Thread(target=excluir)
+            exclusao.start()
+            exclusao.join(0.3)
+            # A conferência espera o commit do upload em vez de apagar o arquivo
+            assert exclusao.is_alive()
+            conn_upload.commit()
+            exclusao.join()
+        assert removido == [False]
+        assert os.listdir(pasta) == [foto] and referencias() == {foto: 1}
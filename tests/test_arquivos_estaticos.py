@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+import pytest
+from flask import Flask
+
+from arquivos_estaticos import CACHE_IMUTAVEL, CACHE_REVALIDAR, ImpressoesDigitais, resposta_estatica
+
+
+@pytest.fixture
+def static(tmp_path):
+    pasta = tmp_path / 'static'
+    (pasta / 'uploads').mkdir(parents=True)
+    (pasta / 'styles.css').write_text('body { color: red; }')
+    (tmp_path / 'segredo.txt').write_text('fora da pasta')
+    return pasta
+
+
+@pytest.fixture
+def app(static):
+    return Flask(__name__, static_folder=str(static))
+
+
+def test_impressao_digital_acompanha_o_conteudo(static):
+    impressoes = ImpressoesDigitais(str(static))
+    versao = impressoes.versao('styles.css')
+    assert versao == hashlib.sha256(b'body { color: red; }').hexdigest()[:12]
+
+    (static / 'styles.css').write_text('body { color: blue; }')
+    os.utime(static / 'styles.css', ns=(1, 1))
+    assert impressoes.versao('styles.css') != versao
+    assert impressoes.versao('nao_existe.css') is None
+    assert impressoes.versao('../segredo.txt') is None
+
+
+def test_cabecalhos_de_cache(app, static):
+    impressoes = ImpressoesDigitais(str(static))
+    digest = impressoes.obter('styles.css')
+
+    with app.test_request_context(f'/static/styles.css?v={digest[:12]}'):
+        resposta = resposta_estatica(impressoes, 'styles.css')
+        assert resposta.status_code == 200
+        assert resposta.headers['Cache-Control'] == CACHE_IMUTAVEL
+        assert resposta.get_etag() == (digest, False)
+        assert resposta.last_modified is not None
+
+    # Versão antiga ou ausente: revalida com o ETag
+    with app.test_request_context('/static/styles.css?v=antiga'):
+        assert resposta_estatica(impressoes, 'styles.css').headers['Cache-Control'] == CACHE_REVALIDAR
+    with app.test_request_context('/static/styles.css', headers={'If-None-Match': f'"{digest}"'}):
+        resposta = resposta_estatica(impressoes, 'styles.css')
+        assert resposta.status_code == 304
+        assert resposta.headers['Cache-Control'] == CACHE_REVALIDAR
+
+
+def test_envio_pelo_proxy(app, static):
+    impressoes = ImpressoesDigitais(str(static))
+    with app.test_request_context('/static/styles.css'):
+        resposta = resposta_estatica(impressoes, 'styles.css', modo_envio='x-accel',
+                                     prefixo_accel='/_static/')
+        assert resposta.headers['X-Accel-Redirect'] == '/_static/styles.css'
+        assert resposta.mimetype == 'text/css' and resposta.get_data() == b''
+        assert resposta.get_etag()[0] == impressoes.obter('styles.css')
+
+        resposta = resposta_estatica(impressoes, 'styles.css', modo_envio='x-sendfile')
+        assert resposta.headers['X-Sendfile'] == str(static / 'styles.css')
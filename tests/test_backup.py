@@ -0,0 +1,256 @@
+import json
+import os
+import sqlite3
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+import backup
+from backup import (BackupInvalido, GerenciadorBackups, MANIFESTO, data_do_nome,
+                    selecionar_gfs)
+from banco_dados import init_db, create_produto
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    pasta = tmp_path / 'uploads'
+    pasta.mkdir()
+    (pasta / 'picanha.jpg').write_bytes(b'foto-picanha')
+    (pasta / 'linguica.png').write_bytes(b'foto-linguica')
+    return pasta
+
+
+def gerenciador(tmp_path, uploads, **opcoes):
+    return GerenciadorBackups(str(tmp_path / 'backups'), str(uploads), **opcoes)
+
+
+def membros(backups, nome):
+    with zipfile.ZipFile(backups.caminho(nome)) as arquivo:
+        return sorted(arquivo.namelist())
+
+
+def test_incremental_guarda_so_fotos_alteradas(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads)
+    completo = backups.criar()
+    assert backups.manifesto(completo)['tipo'] == 'completo'
+    assert membros(backups, completo) == ['acougue.db', MANIFESTO,
+                                          'produtos/linguica.png', 'produtos/picanha.jpg']
+
+    (uploads / 'nova.jpg').write_bytes(b'foto-nova')
+    # Mesmo conteúdo de uma foto já guardada: só referência
+    (uploads / 'copia_picanha.jpg').write_bytes(b'foto-picanha')
+    incremental = backups.criar()
+    manifesto = backups.manifesto(incremental)
+    assert manifesto['tipo'] == 'incremental'
+    assert manifesto['anterior'] == completo and manifesto['base'] == completo
+    assert membros(backups, incremental) == ['acougue.db', MANIFESTO, 'produtos/nova.jpg']
+    assert manifesto['fotos']['copia_picanha.jpg']['arquivo'] == completo
+    assert manifesto['fotos']['picanha.jpg']['arquivo'] == completo
+    assert backups.referencias(incremental) == {completo, incremental}
+
+
+def test_restaurar_ponto_da_cadeia(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads)
+    backups.criar()
+    create_produto('Picanha', '', 'BOI', 80, 10)
+    (uploads / 'picanha.jpg').write_bytes(b'foto-picanha-nova')
+    os.remove(uploads / 'linguica.png')
+    ponto = backups.criar()
+
+    destino = tmp_path / 'restaurado'
+    backups.restaurar(ponto, str(destino))
+    assert sorted(os.listdir(destino / 'produtos')) == ['picanha.jpg']
+    assert (destino / 'produtos' / 'picanha.jpg').read_bytes() == b'foto-picanha-nova'
+    conn = sqlite3.connect(destino / 'acougue.db')
+    assert conn.execute("SELECT nome FROM produtos").fetchall() == [('Picanha',)]
+    conn.close()
+
+
+def test_consolidar_gera_zip_completo(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads)
+    backups.criar()
+    (uploads / 'nova.jpg').write_bytes(b'foto-nova')
+    incremental = backups.criar()
+
+    caminho = tmp_path / 'download.zip'
+    with open(caminho, 'wb') as saida:
+        backups.consolidar(incremental, saida)
+    with zipfile.ZipFile(caminho) as arquivo:
+        assert sorted(arquivo.namelist()) == ['acougue.db', 'produtos/linguica.png',
+                                              'produtos/nova.jpg', 'produtos/picanha.jpg']
+        assert arquivo.read('produtos/linguica.png') == b'foto-linguica'
+
+
+def test_completo_periodico(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads, max_incrementais=2)
+    tipos = [backups.manifesto(backups.criar())['tipo'] for _ in range(4)]
+    assert tipos == ['completo', 'incremental', 'incremental', 'completo']
+
+    backups = gerenciador(tmp_path / 'outro', uploads, intervalo_completo_dias=0)
+    assert {backups.manifesto(backups.criar())['tipo'] for _ in range(2)} == {'completo'}
+
+
+def test_limpeza_preserva_zips_referenciados(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads, manter_por_dia=1)
+    completo = backups.criar()
+    backups.criar()
+    ultimo = backups.criar()
+    # O completo guarda as fotos do último backup e não pode ser removido
+    assert backups.listar() == [completo, ultimo]
+
+
+def test_restaurar_com_zip_ausente(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads)
+    completo = backups.criar()
+    incremental = backups.criar()
+    os.remove(backups.caminho(completo))
+    with pytest.raises(BackupInvalido):
+        backups.restaurar(incremental, str(tmp_path / 'restaurado'))
+
+
+
+def popular(quantidade=200):
+    for i in range(quantidade):
+        create_produto(f'Produto {i}', 'x' * 500, 'BOI', 10, 1)
+
+
+def test_copia_paginada_informa_progresso(test_db, uploads, tmp_path, monkeypatch):
+    popular()
+    backups = gerenciador(tmp_path, uploads, paginas_por_passo=5, pausa_passo=0.001)
+    andamentos = []
+    monkeypatch.setattr(backup.time, 'sleep', lambda _: andamentos.append(backups.andamento()))
+
+    etapas = []
+    nome = backups.criar(progresso=lambda percentual, mensagem=None: etapas.append(percentual))
+    assert etapas == sorted(etapas) and len(etapas) >= 2
+    assert len(andamentos) > 1
+    assert [a['copiadas'] for a in andamentos] == sorted(a['copiadas'] for a in andamentos)
+    assert backups.andamento() == {}
+    assert backups.ultimo() == nome
+
+    destino = tmp_path / 'restaurado'
+    backups.restaurar(nome, str(destino))
+    with sqlite3.connect(destino / 'acougue.db') as conn:
+        assert conn.execute("SELECT COUNT(*) FROM produtos").fetchone()[0] == 200
+
+
+def test_copia_reiniciada_demais_termina_de_uma_vez(test_db, uploads, tmp_path, monkeypatch):
+    popular()
+    backups = gerenciador(tmp_path, uploads, paginas_por_passo=2, pausa_passo=0.001,
+                          max_reinicios=1)
+    escritor = sqlite3.connect(str(test_db))
+
+    # Uma escrita de outra conexão na pausa faz o SQLite recomeçar a cópia
+    def escrever(_):
+        escritor.execute("UPDATE produtos SET quantidade = quantidade + 1")
+        escritor.commit()
+    monkeypatch.setattr(backup.time, 'sleep', escrever)
+
+    src, dst = sqlite3.connect(str(test_db)), sqlite3.connect(':memory:')
+    backups._copiar_paginado(src, dst)
+    assert backups.andamento()['reinicios'] == 1
+    assert dst.execute("SELECT COUNT(*) FROM produtos").fetchone()[0] == 200
+    escritor.close()
+
+
+def test_compressao_por_tipo_de_membro_e_log(test_db, uploads, tmp_path):
+    popular()
+    (uploads / 'tabela.txt').write_text('preço ' * 1000)
+    backups = gerenciador(tmp_path, uploads, compressao_banco='lzma')
+    nome = backups.criar()
+    with zipfile.ZipFile(backups.caminho(nome)) as arquivo:
+        tipos = {info.filename: info.compress_type for info in arquivo.infolist()}
+    assert tipos['acougue.db'] == zipfile.ZIP_LZMA
+    assert tipos['produtos/picanha.jpg'] == tipos['produtos/linguica.png'] == zipfile.ZIP_STORED
+    assert tipos['produtos/tabela.txt'] == zipfile.ZIP_DEFLATED
+
+    with sqlite3.connect(str(test_db)) as conn:
+        detalhes = json.loads(conn.execute(
+            "SELECT details FROM logs WHERE action = 'backup'").fetchone()[0])
+    assert detalhes['backup'] == nome
+    assert detalhes['tamanho'] == os.path.getsize(backups.caminho(nome))
+    assert 0 < detalhes['razao'] < 1
+
+    # O zip consolidado mantém a compressão de cada membro
+    saida = tmp_path / 'download.zip'
+    with open(saida, 'wb') as f:
+        backups.consolidar(nome, f)
+    with zipfile.ZipFile(saida) as arquivo:
+        assert arquivo.getinfo('acougue.db').compress_type == zipfile.ZIP_LZMA
+        assert arquivo.getinfo('produtos/picanha.jpg').compress_type == zipfile.ZIP_STORED
+
+
+def test_compressao_desconhecida(tmp_path, uploads):
+    with pytest.raises(ValueError):
+        gerenciador(tmp_path, uploads, compressao_banco='zstd')
+
+
+def test_selecionar_gfs():
+    datas = {f'b{i}': datetime(2026, 1, 1, 3) + timedelta(days=i) for i in range(90)}
+    datas['b89_tarde'] = datas['b89'] + timedelta(hours=12)
+    mantidos = selecionar_gfs(datas, diarios=3, semanais=3, mensais=3)
+    # Diários: os três últimos dias (só o mais recente de cada); semanais e
+    # mensais: o último backup de cada período
+    assert {'b89_tarde', 'b88', 'b87'} <= mantidos and 'b89' not in mantidos
+    # Semanais: b89_tarde (ter 31/03), b87 (dom 29/03, já diário) e b80 (dom 22/03)
+    assert 'b80' in mantidos
+    assert {'b58', 'b30'} <= mantidos  # 28/02 e 31/01
+    assert len(mantidos) == 6
+
+
+def test_retencao_gfs_pelo_indice(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads, diarios=2, semanais=0, mensais=0,
+                          manter_por_dia=1, verificar_ao_criar=False)
+    # Backups completos de dias anteriores, renomeados com a data desejada
+    for dias in (10, 5, 4):
+        nome = backups.criar(completo=True)
+        antigo = f"acougue_system_backup_{datetime.now() - timedelta(days=dias):%Y%m%d_%H%M%S_%f}.zip"
+        os.rename(backups.caminho(nome), backups.caminho(antigo))
+    backups.reconstruir_indice()
+    atual = backups.criar(completo=True)
+
+    restantes = backups.listar()
+    assert restantes == sorted(backups.indice())
+    assert len(restantes) == 2 and restantes[-1] == atual
+    assert data_do_nome(restantes[0]).date() == (datetime.now() - timedelta(days=4)).date()
+
+
+def test_verificacao_registra_resultado(test_db, uploads, tmp_path):
+    backups = gerenciador(tmp_path, uploads)
+    completo = backups.criar()
+    assert backups.indice()[completo]['verificacao']['ok']
+
+    (uploads / 'nova.jpg').write_bytes(b'foto-nova')
+    incremental = backups.criar()
+    # Banco corrompido no zip e foto referenciada removida do completo
+    with zipfile.ZipFile(backups.caminho(completo)) as origem, \
+            zipfile.ZipFile(backups.caminho('refeito.zip'), 'w') as refeito:
+        for info in origem.infolist():
+            if info.filename == 'acougue.db':
+                refeito.writestr(info, b'nao e um banco' * 100)
+            elif info.filename != 'produtos/picanha.jpg':
+                refeito.writestr(info, origem.read(info))
+    os.replace(backups.caminho('refeito.zip'), backups.caminho(completo))
+
+    resultado = backups.verificar(completo)
+    assert not resultado['ok']
+    assert any('Banco' in erro for erro in resultado['erros'])
+    assert any('picanha.jpg' in erro for erro in resultado['erros'])
+    assert not backups.verificar(incremental)['ok']
+    assert backups.indice()[completo]['verificacao'] == resultado
+    # Reprovados não são entregues nem continuados por incrementais
+    assert backups.ultimo() is None
+    assert backups.manifesto(backups.criar())['tipo'] == 'completo'
+
+    with sqlite3.connect(str(test_db)) as conn:
+        niveis = [row[0] for row in conn.execute(
+            "SELECT level FROM logs WHERE action = 'backup_verificado' ORDER BY id")]
+    assert niveis == ['INFO', 'INFO', 'ERROR', 'ERROR', 'INFO']
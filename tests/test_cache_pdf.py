@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+import pytest
+from cache_pdf import CachePDF
+
+
+def renderizador(chamadas, demora=0):
+    def renderizar(caminho):
+        chamadas.append(caminho)
+        time.sleep(demora)
+        with open(caminho, 'wb') as f:
+            f.write(b'%PDF-teste')
+    return renderizar
+
+
+def test_renderiza_uma_vez_por_chave(tmp_path):
+    cache = CachePDF(str(tmp_path))
+    chamadas = []
+
+    chave, caminho = cache.obter(3, '2025-06-01', renderizador(chamadas))
+    assert chave == '2025-06-01_v3'
+    assert open(caminho, 'rb').read() == b'%PDF-teste'
+    assert cache.obter(3, '2025-06-01', renderizador(chamadas)) == (chave, caminho)
+    assert len(chamadas) == 1
+    assert cache.estatisticas() == {'hits': 1, 'renderizacoes': 1, 'aguardaram': 0}
+
+
+def test_requisicoes_simultaneas_aguardam_uma_renderizacao(tmp_path):
+    cache = CachePDF(str(tmp_path))
+    chamadas = []
+    resultados = []
+    threads = [
+        threading.Thread(target=lambda: resultados.append(
+            cache.obter(1, '2025-06-01', renderizador(chamadas, demora=0.1))))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(chamadas) == 1
+    assert len(set(resultados)) == 1
+    assert cache.estatisticas()['renderizacoes'] == 1
+
+
+def test_nova_versao_renderiza_e_remove_antigos(tmp_path):
+    cache = CachePDF(str(tmp_path), manter=2)
+    chamadas = []
+    caminhos = []
+    for versao in range(1, 4):
+        caminhos.append(cache.obter(versao, '2025-06-01', renderizador(chamadas))[1])
+        # mtime distinto para a ordenação dos arquivos antigos
+        os.utime(caminhos[-1], (versao, versao))
+
+    assert len(chamadas) == 3
+    assert not os.path.exists(caminhos[0])
+    assert os.path.exists(caminhos[1]) and os.path.exists(caminhos[2])
+
+
+def test_falha_na_renderizacao_nao_deixa_arquivo(tmp_path):
+    cache = CachePDF(str(tmp_path))
+
+    def falhar(caminho):
+        open(caminho, 'wb').write(b'%PDF-incompleto')
+        raise RuntimeError('falhou')
+
+    with pytest.raises(RuntimeError):
+        cache.obter(1, '2025-06-01', falhar)
+    assert os.listdir(tmp_path) == []
+
+
+def test_jobs_do_relatorio_padrao_usam_o_cache(tmp_path, monkeypatch):
+    import app as aplicacao
+    chamadas = []
+    monkeypatch.setattr(aplicacao, 'pdf_cache', CachePDF(str(tmp_path / 'cache')))
+    monkeypatch.setattr(aplicacao, 'get_data_version', lambda: 7)
+    monkeypatch.setattr(aplicacao, 'gerar_pdf_completo',
+                        lambda caminho, **kwargs: renderizador(chamadas)(caminho))
+
+    caminhos = [str(tmp_path / f'job{i}.pdf') for i in range(2)]
+    for caminho in caminhos:
+        aplicacao.job_pdf_completo({}, lambda *args: None, caminho)
+    assert len(chamadas) == 1
+    assert [open(c, 'rb').read() for c in caminhos] == [b'%PDF-teste'] * 2
+
+    # Período escolhido pelo usuário: renderiza na hora, fora do cache
+    aplicacao.job_pdf_completo({'start_date': '2025-01-01'}, lambda *args: None,
+                               str(tmp_path / 'job_periodo.pdf'))
+    assert len(chamadas) == 2
+    assert aplicacao.pdf_cache.estatisticas()['renderizacoes'] == 1
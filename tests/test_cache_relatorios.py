@@ -0,0 +1,74 @@
+import pytest
+from cache_relatorios import CacheRelatorios
+from banco_dados import (
+    init_db, create_user, create_produto, processar_venda,
+    get_data_version, marcar_venda_pago
+)
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+def test_cache_hit_e_miss_por_relatorio():
+    cache = CacheRelatorios()
+    chamadas = []
+    calcular = lambda: chamadas.append(1) or [{'total': 10}]
+
+    assert cache.obter_ou_calcular('top_produtos', (10,), 1, calcular) == [{'total': 10}]
+    assert cache.obter_ou_calcular('top_produtos', (10,), 1, calcular) == [{'total': 10}]
+    assert len(chamadas) == 1
+
+    stats = cache.estatisticas()['relatorios']['top_produtos']
+    assert stats == {'hits': 1, 'misses': 1}
+
+
+def test_cache_invalida_quando_versao_muda():
+    cache = CacheRelatorios()
+    cache.set('vendas_totais', (), 1, ['antigo'])
+    assert cache.get('vendas_totais', (), 2) is None
+    # A entrada desatualizada foi descartada
+    assert cache.get('vendas_totais', (), 1) is None
+
+
+def test_cache_expira_por_ttl(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr('cache_relatorios.time.monotonic', lambda: agora[0])
+    cache = CacheRelatorios(ttl=60)
+    cache.set('comparativo', {'periodo': 'month'}, 1, ['x'])
+    assert cache.get('comparativo', {'periodo': 'month'}, 1) == ['x']
+    agora[0] += 61
+    assert cache.get('comparativo', {'periodo': 'month'}, 1) is None
+
+
+def test_cache_lru_remove_mais_antigo():
+    cache = CacheRelatorios(max_entradas=2)
+    cache.set('a', (), 1, 'A')
+    cache.set('b', (), 1, 'B')
+    cache.get('a', (), 1)  # 'a' passa a ser o mais recente
+    cache.set('c', (), 1, 'C')
+    assert cache.get('b', (), 1) is None
+    assert cache.get('a', (), 1) == 'A'
+    assert cache.get('c', (), 1) == 'C'
+
+
+def test_data_version_incrementa_em_vendas_e_pagamentos(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    produto_id = create_produto('Picanha', '', 'BOI', 80.0, 10)
+    versao = get_data_version()
+
+    processar_venda('V1', {
+        'cliente_cpf': None,
+        'cliente_nome': 'Cliente',
+        'metodo_pagamento': 'pagamento_prazo',
+        'status_pagamento': 'pendente',
+        'itens': [{'id': produto_id, 'quantidade': 1, 'preco': 80.0}]
+    }, user_id)
+    assert get_data_version() == versao + 1
+
+    marcar_venda_pago('V1')
+    assert get_data_version() == versao + 2
@@ -0,0 +1,166 @@
+import pytest
+from banco_dados import (
+    init_db, get_db_connection, create_user, create_produto, processar_venda,
+    update_venda, delete_venda, create_venda_item, update_venda_item,
+    delete_venda_item, get_venda_items, reconstruir_cubo_vendas,
+    update_produto, atualizar_produto, delete_produto, excluir_produto, delete_user
+)
+from registro_relatorios import get_relatorio
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def loja(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    produtos = {
+        'picanha': create_produto('Picanha', '', 'BOI', 80, 100),
+        'linguica': create_produto('Linguiça', '', 'PORCO', 25, 100),
+    }
+
+    def vender(venda_id, data, metodo, itens):
+        processar_venda(venda_id, {
+            'cliente_cpf': None, 'cliente_nome': None, 'metodo_pagamento': metodo,
+            'status_pagamento': 'pago', 'data_venda': data,
+            'itens': [{'id': produtos[nome], 'quantidade': q, 'preco': p} for nome, q, p in itens],
+        }, user_id)
+    return vender, produtos
+
+
+def cubo():
+    with get_db_connection() as conn:
+        return {
+            tuple(row[:4]): (row[4], round(row[5], 6), round(row[6], 6))
+            for row in conn.execute("SELECT * FROM vendas_cubo")
+        }
+
+
+def executar(chave, **args):
+    relatorio = get_relatorio(chave)
+    with get_db_connection() as conn:
+        return relatorio.executar(conn, relatorio.validar(args))
+
+
+def test_processar_venda_atualiza_o_cubo(loja):
+    vender, _ = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1.5, 80.0), ('linguica', 2, 25.0)])
+    vender('V2', '2025-03-03 10:40:00', 'pix', [('linguica', 1, 25.0)])
+
+    celulas = cubo()
+    assert celulas[('hour', '2025-03-03 10:00:00', 'pix', '*')] == (2, 4.5, 195.0)
+    assert celulas[('day', '2025-03-03', 'pix', 'PORCO')] == (2, 3.0, 75.0)
+    assert celulas[('week', '2025-03-03', 'pix', 'BOI')] == (1, 1.5, 120.0)
+    assert celulas[('month', '2025-03-01', 'pix', '*')] == (2, 4.5, 195.0)
+
+
+def test_alteracoes_mantem_o_cubo_igual_a_reconstrucao(loja):
+    vender, produtos = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1, 80.0)])
+    vender('V2', '2025-03-04 18:00:00', 'dinheiro', [('linguica', 2, 25.0), ('picanha', 1, 80.0)])
+    vender('V3', '2025-03-10 09:00:00', 'dinheiro', [('linguica', 1, 25.0)])
+
+    update_venda('V1', data='2025-04-01 12:00:00', metodo_pagamento='dinheiro')
+    update_venda('V2', observacao='sem alteração no cubo')
+    create_venda_item('V3', produtos['picanha'], 0.5, 80.0)
+    item = get_venda_items('V2')[0]['id']
+    update_venda_item(item, quantidade=3)
+    delete_venda_item(get_venda_items('V2')[1]['id'])
+    delete_venda('V3')
+
+    incremental = cubo()
+    reconstruir_cubo_vendas()
+    assert incremental == cubo()
+    assert not any(chave[1].startswith('2025-03-10') for chave in incremental)
+
+
+def igual_a_reconstrucao():
+    incremental = cubo()
+    reconstruir_cubo_vendas()
+    assert incremental == cubo()
+    return incremental
+
+
+def form_produto(categoria):
+    return {'nome': 'Picanha', 'preco': '80', 'quantidade': '100', 'categoria': categoria,
+            'tipo_venda': 'kg'}
+
+
+@pytest.mark.parametrize('alterar', [
+    lambda produto_id: update_produto(produto_id, categoria='PREMIUM'),
+    lambda produto_id: atualizar_produto(produto_id, form_produto('PREMIUM'), None),
+], ids=['update_produto', 'atualizar_produto'])
+def test_categoria_do_produto_move_as_celulas(loja, alterar):
+    vender, produtos = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1, 80.0), ('linguica', 1, 25.0)])
+    vender('V2', '2025-03-04 11:00:00', 'pix', [('picanha', 2, 80.0)])
+
+    alterar(produtos['picanha'])
+    celulas = igual_a_reconstrucao()
+    assert not any(chave[3] == 'BOI' for chave in celulas)
+    assert celulas[('month', '2025-03-01', 'pix', 'PREMIUM')] == (2, 3.0, 240.0)
+
+
+@pytest.mark.parametrize('excluir', [delete_produto, excluir_produto])
+def test_excluir_produto_retira_os_itens(loja, excluir):
+    vender, produtos = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1, 80.0), ('linguica', 2, 25.0)])
+    vender('V2', '2025-03-04 11:00:00', 'pix', [('picanha', 2, 80.0)])
+
+    excluir(produtos['picanha'])
+    celulas = igual_a_reconstrucao()
+    assert not any(chave[3] == 'BOI' for chave in celulas)
+    # A venda continua (com o total gravado), só sem os itens do produto
+    assert celulas[('day', '2025-03-03', 'pix', '*')] == (1, 2.0, 130.0)
+
+
+def test_excluir_usuario_retira_as_vendas(loja):
+    vender, _ = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1, 80.0)])
+    outro = create_user('outro', 'outro@example.com', 'senha123')
+    processar_venda('V2', {
+        'cliente_cpf': None, 'cliente_nome': None, 'metodo_pagamento': 'pix',
+        'status_pagamento': 'pago', 'data_venda': '2025-03-03 10:30:00', 'itens': [],
+    }, outro)
+    with get_db_connection() as conn:
+        caixa = conn.execute("SELECT usuario_id FROM vendas WHERE id = 'V1'").fetchone()[0]
+
+    delete_user(caixa)
+    celulas = igual_a_reconstrucao()
+    assert celulas[('hour', '2025-03-03 10:00:00', 'pix', '*')] == (1, 0, 0)
+    assert ('day', '2025-03-03', 'pix', 'BOI') not in celulas
+
+
+def test_relatorios_do_cubo(loja):
+    vender, _ = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1, 80.0)])      # segunda
+    vender('V2', '2025-03-10 10:30:00', 'pix', [('linguica', 2, 25.0)])     # segunda
+    vender('V3', '2025-03-15 19:00:00', 'dinheiro', [('linguica', 1, 25.0)])  # sábado
+
+    mapa = executar('mapa_calor_vendas', start_date='2025-03-01', end_date='2025-03-31')
+    assert mapa == [
+        {'dia_semana': 'Seg', 'hora': 10, 'total_vendas': 2, 'valor_total': 130.0},
+        {'dia_semana': 'Sáb', 'hora': 19, 'total_vendas': 1, 'valor_total': 25.0},
+    ]
+
+    semanas = executar('tendencia_vendas', granularidade='week',
+                       start_date='2025-03-05', end_date='2025-03-31')
+    assert [(s['data'], s['total_vendas']) for s in semanas] == \
+        [('2025-03-03', 1), ('2025-03-10', 2)]
+    assert semanas[1]['ticket_medio'] == 37.5
+
+
+def test_init_db_monta_cubo_de_banco_existente(loja):
+    vender, _ = loja
+    vender('V1', '2025-03-03 10:15:00', 'pix', [('picanha', 1, 80.0)])
+    esperado = cubo()
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM vendas_cubo")
+        conn.commit()
+    init_db()
+    assert cubo() == esperado
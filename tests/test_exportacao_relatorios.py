@@ -0,0 +1,81 @@
+import csv
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pytest
+from banco_dados import (
+    init_db, get_db_connection, create_user, create_produto,
+    create_venda, create_venda_item
+)
+from registro_relatorios import get_relatorio
+import exportacao_relatorios
+from exportacao_relatorios import exportar
+
+NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def vendas(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    produto_id = create_produto('Coração & Fígado', '', 'BOI', 10, 100)
+    for dia in range(1, 8):
+        venda_id = create_venda(f'V{dia}', None, f'Cliente; "{dia}"', 10.5, 'dinheiro', user_id)
+        create_venda_item(venda_id, produto_id, 1.05, 10.0)
+        with get_db_connection() as conn:
+            conn.execute("UPDATE vendas SET data = ? WHERE id = ?",
+                         (f'2025-01-0{dia} 10:00:00', venda_id))
+            conn.commit()
+
+
+def exportar_relatorio(chave, formato, **args):
+    relatorio = get_relatorio(chave)
+    return list(exportar(relatorio, relatorio.validar(args), formato))
+
+
+def test_csv_exporta_todas_as_paginas(vendas, monkeypatch):
+    monkeypatch.setattr(exportacao_relatorios, 'TAMANHO_LOTE', 2)
+    partes = exportar_relatorio('vendas_totais', 'csv', per_page='2', page='3')
+    assert len(partes) > 3  # enviado em pedaços
+    texto = b''.join(partes).decode('utf-8-sig')
+    linhas = list(csv.reader(io.StringIO(texto), delimiter=';'))
+    assert linhas[0][:3] == ['id', 'data', 'cliente']
+    assert [linha[0] for linha in linhas[1:]] == [f'V{d}' for d in range(7, 0, -1)]
+    assert linhas[1][2] == 'Cliente; "7"'
+
+
+def test_xlsx_valido(vendas, monkeypatch):
+    monkeypatch.setattr(exportacao_relatorios, 'TAMANHO_LOTE', 2)
+    partes = exportar_relatorio('top_produtos', 'xlsx')
+    arquivo = zipfile.ZipFile(io.BytesIO(b''.join(partes)))
+    assert arquivo.testzip() is None
+    assert 'Top Produtos Vendidos' in arquivo.read('xl/workbook.xml').decode('utf-8')
+
+    planilha = ET.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+    linhas = planilha.findall('.//s:row', NS)
+    assert [c.find('.//s:t', NS).text for c in linhas[0]] == \
+        ['nome', 'quantidade_vendida', 'valor_total']
+    nome, quantidade, valor = linhas[1]
+    assert nome.find('.//s:t', NS).text == 'Coração & Fígado'
+    assert float(quantidade.find('s:v', NS).text) == pytest.approx(7.35)
+    assert float(valor.find('s:v', NS).text) == pytest.approx(73.5)
+
+
+def test_xlsx_relatorio_vazio(test_db):
+    partes = exportar_relatorio('vendas_periodo', 'xlsx')
+    arquivo = zipfile.ZipFile(io.BytesIO(b''.join(partes)))
+    planilha = ET.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+    assert len(planilha.findall('.//s:row', NS)) == 1  # só o cabeçalho
+
+
+def test_xlsx_celulas_numericas_invalidas():
+    linha = ''.join(exportacao_relatorios._celula(v) for v in (float('nan'), float('inf'), 2.5, True))
+    assert linha == '<c/><c/><c><v>2.5</v></c><c t="b"><v>1</v></c>'
@@ -0,0 +1,86 @@
+import os
+import time
+import pytest
+from banco_dados import init_db, get_db_connection
+from fila_relatorios import FilaRelatorios, TipoJobDesconhecido
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def fila(test_db, tmp_path):
+    return FilaRelatorios(str(tmp_path / "resultados"), workers=1, ttl_resultado=60)
+
+
+def aguardar(fila, job_id, timeout=5):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        job = fila.status(job_id)
+        if job['status'] in ('concluido', 'erro'):
+            return job
+        time.sleep(0.05)
+    pytest.fail("Job não terminou a tempo")
+
+
+def test_job_concluido_com_progresso_e_resultado(fila):
+    progresso_visto = []
+
+    def gerar(parametros, progresso, caminho):
+        progresso(50, 'Metade')
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT progresso, mensagem FROM report_jobs").fetchone()
+            progresso_visto.append(tuple(row))
+        with open(caminho, 'w') as f:
+            f.write(parametros['conteudo'])
+        return 'saida.txt', 'text/plain'
+
+    fila.registrar_tipo('texto', gerar)
+    job_id = fila.submeter('texto', {'conteudo': 'ok'}, usuario_id=1)
+    job = aguardar(fila, job_id)
+
+    assert job['status'] == 'concluido'
+    assert job['progresso'] == 100
+    assert job['nome_download'] == 'saida.txt'
+    assert progresso_visto == [(50, 'Metade')]
+    with open(fila.caminho_resultado(job)) as f:
+        assert f.read() == 'ok'
+
+
+def test_job_com_erro_registra_mensagem(fila):
+    def falhar(parametros, progresso, caminho):
+        raise RuntimeError('sem dados')
+
+    fila.registrar_tipo('falha', falhar)
+    job = aguardar(fila, fila.submeter('falha'))
+    assert job['status'] == 'erro'
+    assert job['mensagem'] == 'sem dados'
+    assert fila.caminho_resultado(job) is None
+
+
+def test_tipo_desconhecido(fila):
+    with pytest.raises(TipoJobDesconhecido):
+        fila.submeter('inexistente')
+
+
+def test_limpar_expirados_remove_arquivo_e_registro(fila):
+    def gerar(parametros, progresso, caminho):
+        open(caminho, 'w').close()
+        return 'vazio.txt', 'text/plain'
+
+    fila.registrar_tipo('vazio', gerar)
+    job = aguardar(fila, fila.submeter('vazio'))
+    caminho = fila.caminho_resultado(job)
+    assert os.path.exists(caminho)
+
+    with get_db_connection() as conn:
+        conn.execute("UPDATE report_jobs SET expira_em = '2000-01-01 00:00:00'")
+        conn.commit()
+    assert fila.limpar_expirados() == 1
+    assert not os.path.exists(caminho)
+    assert fila.status(job['id']) is None
@@ -0,0 +1,160 @@
+import os
+import tempfile
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from flask import Flask
+from werkzeug.datastructures import MultiDict
+from banco_dados import init_db, create_user, create_produto, processar_venda
+from gerador_pdf import (
+    SECOES_PDF, RenderizadorProcessos, TempoEsgotadoPDF, gerar_pdf_completo, gerar_relatorio_pdf, periodo_secao,
+    relatorio_padrao, validar_parametros
+)
+from registro_relatorios import ParametroInvalido
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def vendas(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    picanha = create_produto('Picanha', '', 'BOI', 80, 100)
+    hoje = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for venda_id, cliente, metodo in (('V1', 'Ana', 'dinheiro'), ('V2', 'Ana', 'fiado'), ('V3', 'Bruno', 'pix')):
+        processar_venda(venda_id, {
+            'cliente_cpf': None, 'cliente_nome': cliente, 'metodo_pagamento': metodo,
+            'status_pagamento': 'pago', 'data_venda': hoje,
+            'itens': [{'id': picanha, 'quantidade': 1, 'preco': 80}],
+        }, user_id)
+
+
+def test_pdf_completo_usa_db_path(vendas):
+    tempos = {}
+    pdf = gerar_pdf_completo(BytesIO(), tempos)
+
+    assert pdf.getvalue().startswith(b'%PDF')
+    assert list(tempos['secoes']) == [secao.chave for secao in SECOES_PDF]
+    secoes = tempos['secoes']
+    assert secoes['vendas_periodo']['linhas'] == 1
+    assert secoes['vendas_categoria']['linhas'] == 1
+    assert secoes['clientes_fieis']['linhas'] == 2
+    assert secoes['movimentacao_caixa']['linhas'] == 1
+    assert all(t['consulta'] >= 0 and t['montagem'] >= 0 for t in secoes.values())
+    assert tempos['total'] >= tempos['build']
+
+
+def test_pdf_completo_banco_vazio(test_db):
+    tempos = {}
+    pdf = gerar_pdf_completo(BytesIO(), tempos)
+    assert pdf.getvalue().startswith(b'%PDF')
+    assert all(t['linhas'] == 0 for t in tempos['secoes'].values())
+
+
+def test_relatorio_pdf_temporario_removido_apos_envio(vendas, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path / 'spool'))
+    os.makedirs(tempfile.tempdir)
+    with Flask(__name__).test_request_context(headers={'Range': 'bytes=0-3'}) as contexto:
+        resposta = gerar_relatorio_pdf()
+        assert resposta.status_code == 206
+        # Como um servidor WSGI: percorre o corpo e fecha o iterador
+        corpo = resposta(contexto.request.environ, lambda status, headers: None)
+        assert b''.join(corpo) == b'%PDF'
+        assert len(os.listdir(tempfile.tempdir)) == 1
+        corpo.close()
+    assert os.listdir(tempfile.tempdir) == []
+
+    # Resposta inteira: o arquivo vai para o wsgi.file_wrapper do servidor
+    # (sendfile) e é apagado quando o servidor o fecha
+    entregues = []
+
+    class FileWrapper:
+        def __init__(self, arquivo, tamanho_bloco=8192):
+            entregues.append(arquivo)
+            self.arquivo = arquivo
+
+        def __iter__(self):
+            return iter(lambda: self.arquivo.read(8192), b'')
+
+        def close(self):
+            self.arquivo.close()
+
+    with Flask(__name__).test_request_context(environ_overrides={'wsgi.file_wrapper': FileWrapper}) as contexto:
+        resposta = gerar_relatorio_pdf()
+        assert resposta.status_code == 200 and resposta.direct_passthrough
+        corpo = resposta(contexto.request.environ, lambda status, headers: None)
+        assert isinstance(corpo, FileWrapper) and len(entregues) == 1
+        dados = b''.join(corpo)
+        assert dados.startswith(b'%PDF') and resposta.content_length == len(dados)
+        corpo.close()
+    assert os.listdir(tempfile.tempdir) == []
+
+
+def test_validar_parametros_secoes_e_periodo():
+    valores = validar_parametros(MultiDict([('secoes', 'vendas_periodo,comparativo'),
+                                            ('secoes', 'estoque_nivel')]))
+    assert valores == {'start_date': None, 'end_date': None,
+                       'secoes': ('vendas_periodo', 'estoque_nivel', 'comparativo')}
+    assert relatorio_padrao(validar_parametros({})) is True
+    assert relatorio_padrao(validar_parametros({'end_date': '2025-01-31'})) is False
+
+    with pytest.raises(ParametroInvalido, match='desconhecidas: inexistente'):
+        validar_parametros({'secoes': 'inexistente'})
+    with pytest.raises(ParametroInvalido):
+        validar_parametros({'start_date': '2025-02-01', 'end_date': '2025-01-01'})
+
+
+def test_pdf_uma_secao_com_periodo(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    picanha = create_produto('Picanha', '', 'BOI', 80, 100)
+    for venda_id, data in (('V1', '2025-01-10 09:00:00'), ('V2', '2025-01-11 18:00:00'),
+                           ('V3', '2025-02-01 10:00:00')):
+        processar_venda(venda_id, {
+            'cliente_cpf': None, 'cliente_nome': 'Ana', 'metodo_pagamento': 'pix',
+            'status_pagamento': 'pago', 'data_venda': data,
+            'itens': [{'id': picanha, 'quantidade': 1, 'preco': 80}],
+        }, user_id)
+
+    tempos = {}
+    gerar_pdf_completo(BytesIO(), tempos, secoes=('vendas_periodo', 'vendas_categoria'),
+                       start_date='2025-01-01', end_date='2025-01-31')
+    assert list(tempos['secoes']) == ['vendas_periodo', 'vendas_categoria']
+    assert tempos['secoes']['vendas_periodo']['linhas'] == 2
+
+
+def test_periodo_secao():
+    secoes = {secao.chave: secao for secao in SECOES_PDF}
+    assert periodo_secao(secoes['estoque_nivel'], '2025-01-01', '2025-01-31') == ({}, '')
+    assert periodo_secao(secoes['vendas_periodo'], '2025-01-01', '2025-01-31') == (
+        {'inicio': '2025-01-01', 'fim': '2025-02-01'}, ' (01/01/2025 a 31/01/2025)')
+    assert periodo_secao(secoes['comparativo']) == ({'inicio': '', 'fim': '9999-12-31'}, '')
+    argumentos, sufixo = periodo_secao(secoes['movimentacao_caixa'])
+    assert sufixo == ' (Últimos 7 dias)'
+
+
+def test_renderizacao_em_processo(vendas, tmp_path):
+    renderizador = RenderizadorProcessos(max_processos=1, timeout=60)
+    try:
+        tempos = {}
+        caminho = gerar_pdf_completo(str(tmp_path / 'relatorio.pdf'), tempos,
+                                     secoes=('vendas_periodo', 'movimentacao_caixa'),
+                                     renderizador=renderizador)
+    finally:
+        renderizador.encerrar()
+    assert open(caminho, 'rb').read(4) == b'%PDF'
+    assert list(tempos['secoes']) == ['vendas_periodo', 'movimentacao_caixa']
+    assert tempos['secoes']['vendas_periodo']['linhas'] == 1
+    assert tempos['build'] > 0
+
+
+def test_renderizador_sem_vaga_esgota_tempo(tmp_path):
+    renderizador = RenderizadorProcessos(max_processos=1, timeout=0.1)
+    renderizador._vagas.acquire()
+    with pytest.raises(TempoEsgotadoPDF):
+        renderizador.renderizar(str(tmp_path / 'relatorio.pdf'), [])
@@ -0,0 +1,95 @@
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from banco_dados import atualizar_produto, excluir_produto, get_produto_by_id, init_db, inserir_produto
+from imagens_produtos import foto_produto, gerar_derivados, gerar_derivados_pasta
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+def imagem(formato='JPEG', modo='RGB', tamanho=(1200, 800)):
+    dados = BytesIO()
+    Image.new(modo, tamanho, (200, 30, 30, 128) if modo == 'RGBA' else (200, 30, 30)).save(dados, formato)
+    dados.seek(0)
+    return dados
+
+
+def form_produto(nome='Picanha'):
+    return {'nome': nome, 'preco': '89.90', 'quantidade': '5', 'categoria': 'BOI',
+            'tipo_venda': 'kg'}
+
+
+def test_gerar_derivados(tmp_path):
+    original = tmp_path / 'picanha.jpg'
+    original.write_bytes(imagem().read())
+    pasta = tmp_path / 'derivados'
+
+    assert gerar_derivados(str(original), str(pasta)) == 4
+    assert sorted(os.listdir(pasta)) == ['picanha.jpg.160w.jpg', 'picanha.jpg.160w.webp',
+                                         'picanha.jpg.480w.jpg', 'picanha.jpg.480w.webp']
+    with Image.open(pasta / 'picanha.jpg.480w.webp') as media:
+        assert media.size == (480, 320)
+    # Versões mais novas que a original não são refeitas
+    assert gerar_derivados(str(original), str(pasta)) == 0
+    assert gerar_derivados(str(original), str(pasta), forcar=True) == 4
+
+
+def test_png_transparente_e_backfill(tmp_path):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    (uploads / 'logo.png').write_bytes(imagem('PNG', 'RGBA').read())
+    (uploads / 'quebrada.png').write_bytes(b'nao e imagem')
+    pasta = tmp_path / 'derivados'
+
+    fotos, gerados, falhas = gerar_derivados_pasta(str(uploads), str(pasta))
+    assert (fotos, gerados, falhas) == (1, 4, ['quebrada.png'])
+    with Image.open(pasta / 'logo.png.160w.png') as pequena:
+        assert pequena.mode == 'RGBA' and pequena.size == (160, 107)
+
+
+def test_inserir_atualizar_excluir_produto_com_foto(app_fotos, test_db):
+    with app_fotos.app_context():
+        derivados = app_fotos.config['UPLOAD_DERIVATIVES_FOLDER']
+        produto_id = inserir_produto(form_produto(), FileStorage(imagem(), filename='picanha.jpg'))
+        foto = get_produto_by_id(produto_id)['foto']
+        assert foto.endswith('.jpg')
+        assert os.path.exists(os.path.join(app_fotos.config['UPLOAD_FOLDER'], foto))
+        assert os.path.exists(os.path.join(derivados, f'{foto}.160w.webp'))
+
+        atualizar_produto(produto_id, form_produto(), FileStorage(imagem('PNG'), filename='nova.png'))
+        nova = get_produto_by_id(produto_id)['foto']
+        assert sorted(os.listdir(derivados)) == sorted(
+            f'{nova}.{largura}w.{formato}' for largura in (160, 480) for formato in ('jpg', 'webp'))
+
+        excluir_produto(produto_id)
+        assert os.listdir(derivados) == []
+        assert os.listdir(app_fotos.config['UPLOAD_FOLDER']) == []
+
+
+def test_foto_produto_srcset(app_fotos, tmp_path):
+    with app_fotos.test_request_context():
+        Image.open(imagem()).save(os.path.join(app_fotos.config['UPLOAD_FOLDER'], 'alcatra.jpg'))
+        # Sem versões geradas: só a original
+        html = str(foto_produto('uploads/produtos/alcatra.jpg', 'Alcatra', sizes='50px', style='max-width: 50px;'))
+        assert html == ('<img src="/static/uploads/produtos/alcatra.jpg" alt="Alcatra" '
+                        'style="max-width: 50px;" loading="lazy">')
+
+        gerar_derivados(os.path.join(app_fotos.config['UPLOAD_FOLDER'], 'alcatra.jpg'),
+                        app_fotos.config['UPLOAD_DERIVATIVES_FOLDER'])
+        html = str(foto_produto('alcatra.jpg', 'Alcatra <&>', sizes='50px', **{'class': 'img-thumbnail'}))
+        assert html.startswith('<picture><source type="image/webp" '
+                               'srcset="/static/uploads/derivados/alcatra.jpg.160w.webp 160w, '
+                               '/static/uploads/derivados/alcatra.jpg.480w.webp 480w" sizes="50px">')
+        assert 'srcset="/static/uploads/derivados/alcatra.jpg.160w.jpg 160w, ' in html
+        assert 'alt="Alcatra &lt;&amp;&gt;" class="img-thumbnail"' in html
+        assert foto_produto(None) == ''
@@ -0,0 +1,119 @@
+import re
+
+import pytest
+import recibos_pdf
+from banco_dados import init_db, create_user, create_produto, processar_venda
+from gerador_pdf import RenderizadorProcessos
+from recibos_pdf import carregar_vendas, gerar_recibos, renderizar_extrato, renderizar_recibos
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def vendas(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    picanha = create_produto('Picanha', '', 'BOI', 80, 100)
+    linguica = create_produto('Linguiça', '', 'PORCO', 25, 100)
+    for venda_id, data, cliente, metodo, status in (
+            ('V1', '2025-03-10 09:00:00', 'Ana <Silva>', 'pagamento_prazo', 'pendente'),
+            ('V2', '2025-03-10 18:30:00', None, 'PIX', 'pago'),
+            ('V3', '2025-03-11 10:00:00', 'Ana <Silva>', 'pagamento_prazo', 'pendente')):
+        processar_venda(venda_id, {
+            'cliente_cpf': None, 'cliente_nome': cliente, 'metodo_pagamento': metodo,
+            'status_pagamento': status, 'data_venda': data, 'data_vencimento': '2025-04-10',
+            'itens': [{'id': picanha, 'quantidade': 2, 'preco': 80},
+                      {'id': linguica, 'quantidade': 1, 'preco': 25}],
+        }, user_id)
+
+
+def paginas(caminho):
+    return len(re.findall(rb'/Type /Page\b(?!s)', open(caminho, 'rb').read()))
+
+
+def test_carregar_vendas_por_ids_dia_e_cliente(vendas):
+    por_ids = carregar_vendas(venda_ids=['V3', 'V1', 'inexistente'])
+    assert [v['id'] for v in por_ids] == ['V1', 'V3']
+    assert por_ids[0]['itens'] == [
+        {'produto': 'Picanha', 'quantidade': 2, 'preco_unitario': 80},
+        {'produto': 'Linguiça', 'quantidade': 1, 'preco_unitario': 25},
+    ]
+    assert [v['id'] for v in carregar_vendas(dia='2025-03-10')] == ['V1', 'V2']
+    assert [v['id'] for v in carregar_vendas(cliente='Ana <Silva>')] == ['V1', 'V3']
+    with pytest.raises(ValueError):
+        carregar_vendas()
+
+
+def test_um_recibo_por_pagina(vendas, tmp_path):
+    caminho = str(tmp_path / 'recibos.pdf')
+    assert renderizar_recibos(caminho, carregar_vendas(dia='2025-03-10')) == 2
+    assert open(caminho, 'rb').read(4) == b'%PDF'
+    assert paginas(caminho) == 2
+
+
+def test_lote_pequeno_renderiza_no_proprio_processo(vendas, tmp_path):
+    caminho = str(tmp_path / 'recibos.pdf')
+
+    class SemProcessos:
+        def submeter(self, *args, **kwargs):
+            raise AssertionError("lote único não deve ir para o pool")
+
+    assert gerar_recibos(caminho, carregar_vendas(venda_ids=['V1', 'V2', 'V3']),
+                         renderizador=SemProcessos()) == 3
+    assert paginas(caminho) == 3
+
+
+def test_lotes_renderizados_em_processos_e_unidos(vendas, tmp_path):
+    PyPDF2 = pytest.importorskip('PyPDF2')
+    caminho = str(tmp_path / 'recibos.pdf')
+    renderizador = RenderizadorProcessos(max_processos=2, timeout=60)
+    try:
+        # 3 vendas em lotes de 1: três PDFs parciais em dois processos
+        assert gerar_recibos(caminho, carregar_vendas(venda_ids=['V1', 'V2', 'V3']),
+                             renderizador=renderizador, tamanho_lote=1) == 3
+    finally:
+        renderizador.encerrar()
+    leitor = PyPDF2.PdfReader(caminho)
+    assert len(leitor.pages) == 3
+    textos = [pagina.extract_text() for pagina in leitor.pages]
+    assert [[v for v in ('V1', 'V2', 'V3') if v in texto] for texto in textos] == [['V1'], ['V2'], ['V3']]
+    assert not list(tmp_path.glob('recibos_*.pdf'))
+
+
+def test_sem_pypdf2_avisa_e_renderiza_no_processo(vendas, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(recibos_pdf, 'PdfMerger', None)
+    caminho = str(tmp_path / 'recibos.pdf')
+
+    class SemProcessos:
+        def submeter(self, *args, **kwargs):
+            raise AssertionError("sem PyPDF2 os lotes não vão para o pool")
+
+    with caplog.at_level('WARNING', logger='recibos_pdf'):
+        assert gerar_recibos(caminho, carregar_vendas(venda_ids=['V1', 'V2', 'V3']),
+                             renderizador=SemProcessos(), tamanho_lote=1) == 3
+    assert paginas(caminho) == 3
+    assert 'PyPDF2 não instalado' in caplog.text
+
+
+def test_extrato_do_cliente(vendas, tmp_path):
+    caminho = str(tmp_path / 'extrato.pdf')
+    assert renderizar_extrato(caminho, 'Ana <Silva>', carregar_vendas(cliente='Ana <Silva>')) == 2
+    assert open(caminho, 'rb').read(4) == b'%PDF'
+
+
+@pytest.mark.parametrize('role, status', [('funcionario', 302), ('gerente', 200)])
+def test_recibos_do_dia_so_para_gerente(vendas, role, status):
+    from app import app
+    client = app.test_client()
+    with client.session_transaction() as sessao:
+        sessao.update({'user_id': 1, 'role': role})
+    resposta = client.get('/vendas/recibos?data=2025-03-10')
+    assert resposta.status_code == status
+    if status == 200:
+        assert resposta.mimetype == 'application/pdf'
+    resposta.close()
@@ -0,0 +1,131 @@
+import pytest
+from banco_dados import (
+    init_db, get_db_connection, create_user, create_produto,
+    create_venda, create_venda_item
+)
+from registro_relatorios import (
+    RELATORIOS, ParametroInvalido, get_relatorio, verificar_planos
+)
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def vendas_janeiro(test_db):
+    """Cinco vendas de R$ 10,00, uma por dia entre 01/01/2025 e 05/01/2025."""
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    produto_id = create_produto('Produto', '', 'Cat', 10, 100)
+    for dia in range(1, 6):
+        venda_id = create_venda(f'V{dia}', None, 'Cliente', 10.0, 'dinheiro', user_id)
+        create_venda_item(venda_id, produto_id, 1, 10.0)
+        with get_db_connection() as conn:
+            conn.execute("UPDATE vendas SET data = ? WHERE id = ?",
+                         (f'2025-01-0{dia} 10:00:00', venda_id))
+            conn.commit()
+    return produto_id
+
+
+def executar(chave, **args):
+    relatorio = get_relatorio(chave)
+    valores = relatorio.validar(args)
+    with get_db_connection() as conn:
+        dados = relatorio.executar(conn, valores)
+        total = relatorio.contar(conn, valores) if relatorio.paginado else len(dados)
+    return dados, total
+
+
+def test_vendas_totais_paginacao(vendas_janeiro):
+    dados, total = executar('vendas_totais', page='1', per_page='2')
+    assert total == 5
+    assert [v['id'] for v in dados] == ['V5', 'V4']
+    assert dados[0]['produtos'] == 'Produto'
+
+    dados, _ = executar('vendas_totais', page='3', per_page='2')
+    assert [v['id'] for v in dados] == ['V1']
+
+
+def test_vendas_totais_intervalo_de_datas(vendas_janeiro):
+    dados, total = executar('vendas_totais', start_date='2025-01-02', end_date='2025-01-03')
+    assert total == 2
+    assert [v['id'] for v in dados] == ['V3', 'V2']
+
+
+def test_comparativo_formato_como_parametro(vendas_janeiro):
+    dados, _ = executar('comparativo', periodo='year')
+    assert dados == [{'periodo': '2025', 'total_vendas': 5, 'valor_total': 50.0}]
+
+
+@pytest.fixture
+def vendas_mensais(test_db):
+    """Uma venda por mês em 2024 (R$ 100) e em 2025 (R$ 100 + 10 por mês), sem março/2025."""
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    vendas = [(f'2024-{mes:02d}-15', 100.0) for mes in range(1, 13)]
+    vendas += [(f'2025-{mes:02d}-15', 100.0 + 10 * mes) for mes in range(1, 7) if mes != 3]
+    for i, (data, total) in enumerate(vendas):
+        venda_id = create_venda(f'M{i}', None, None, total, 'dinheiro', user_id)
+        with get_db_connection() as conn:
+            conn.execute("UPDATE vendas SET data = ? WHERE id = ?", (f'{data} 10:00:00', venda_id))
+            conn.commit()
+
+
+def test_comparativo_periodos_mensal(vendas_mensais):
+    dados, _ = executar('comparativo_periodos', granularidade='month',
+                        start_date='2025-01-10', end_date='2025-06-30', janela='2')
+    assert [d['periodo'] for d in dados] == ['2025-01', '2025-02', '2025-04', '2025-05', '2025-06']
+
+    janeiro, fevereiro, abril = dados[:3]
+    # O período anterior e a média móvel usam dezembro/2024, fora do intervalo exibido
+    assert janeiro['valor_anterior'] == 100.0
+    assert janeiro['variacao_periodo_pct'] == 10.0
+    assert janeiro['valor_media_movel'] == 105.0
+    assert janeiro['valor_ano_anterior'] == 100.0
+    assert fevereiro['variacao_anual_pct'] == 20.0
+    # Sem vendas em março: o anterior é o último período com vendas,
+    # mas o ano anterior continua sendo abril/2024
+    assert abril['valor_anterior'] == 120.0
+    assert abril['valor_ano_anterior'] == 100.0
+    assert [d['valor_acumulado'] for d in dados] == [110.0, 230.0, 370.0, 520.0, 680.0]
+
+
+def test_comparativo_periodos_granularidades(vendas_mensais):
+    dados, _ = executar('comparativo_periodos', granularidade='year', start_date='2024-06-01')
+    assert [(d['periodo'], d['total_vendas']) for d in dados] == [('2024', 12), ('2025', 5)]
+    assert dados[1]['variacao_anual_pct'] == -43.33
+
+    dados, _ = executar('comparativo_periodos', granularidade='week',
+                        start_date='2025-01-15', end_date='2025-02-28')
+    # Semanas começam na segunda-feira: 15/01/2025 é quarta
+    assert [d['periodo'] for d in dados] == ['2025-01-13', '2025-02-10']
+
+    dados, _ = executar('comparativo_periodos', granularidade='day',
+                        start_date='2025-01-15', end_date='2025-01-15')
+    assert dados[0]['periodo'] == '2025-01-15'
+    assert dados[0]['valor_anterior'] == 100.0  # 15/12/2024
+
+
+def test_validacao_de_parametros():
+    top = get_relatorio('top_produtos')
+    assert top.validar({}) == {'limit': 10}
+    with pytest.raises(ParametroInvalido):
+        top.validar({'limit': 'abc'})
+    with pytest.raises(ParametroInvalido):
+        top.validar({'limit': '0'})
+    with pytest.raises(ParametroInvalido):
+        get_relatorio('comparativo').validar({'periodo': "month'); DROP TABLE vendas; --"})
+    with pytest.raises(ParametroInvalido):
+        get_relatorio('vendas_periodo').validar({'start_date': '31/01/2025'})
+    with pytest.raises(ParametroInvalido):
+        get_relatorio('comparativo_periodos').validar({'granularidade': 'hour'})
+
+
+def test_verificar_planos_prepara_todas_as_consultas(test_db):
+    varreduras = verificar_planos()
+    assert set(varreduras) <= set(RELATORIOS)
+    # vendas_totais usa o índice em vendas(data)
+    assert 'vendas_totais' not in varreduras
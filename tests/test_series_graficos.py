@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from registro_relatorios import ParametroInvalido
+from series_graficos import GRAFICOS, lttb, minmax, serie_temporal, validar_parametros
+
+
+def test_lttb_mantem_extremidades_e_picos():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[437] = 50.0  # pico isolado
+    indices = lttb(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 437 in indices
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_minmax_mantem_minimo_e_maximo_de_cada_faixa():
+    y = np.sin(np.linspace(0, 20, 5000))
+    indices = minmax(np.arange(5000), y, 200)
+    assert len(indices) <= 200
+    assert y[indices].max() == y.max()
+    assert y[indices].min() == y.min()
+
+
+@pytest.mark.parametrize('redutor', [lttb, minmax])
+def test_series_curtas_nao_sao_reduzidas(redutor):
+    assert redutor(np.arange(10), np.arange(10), 800).tolist() == list(range(10))
+
+
+def test_serie_temporal_reduz_para_a_largura():
+    inicio = date(2020, 1, 1)
+    datas = [(inicio + timedelta(days=i)).isoformat() for i in range(3 * 365)]
+    pontos = serie_temporal(datas, list(range(len(datas))), 300)
+    assert len(pontos) == 300
+    assert pontos[0] == ['2020-01-01', 0]
+    assert pontos[-1] == [datas[-1], len(datas) - 1]
+
+
+def test_grafico_vendas_periodo():
+    dados = [{'data': '2025-01-0%d' % d, 'total_vendas': d, 'valor_total': 10.0 * d,
+              'ticket_medio': 10.0} for d in range(1, 6)]
+    grafico = GRAFICOS['vendas_periodo'](dados, 800, 'lttb')
+    assert grafico['pontos_originais'] == 5
+    assert [s['nome'] for s in grafico['series']] == ['Total de Vendas', 'Valor Total']
+    assert grafico['series'][1]['pontos'][-1] == ['2025-01-05', 50.0]
+
+
+def test_validar_parametros():
+    assert validar_parametros({}) == {'largura': 800, 'metodo': 'lttb'}
+    with pytest.raises(ParametroInvalido):
+        validar_parametros({'largura': '10'})
+    with pytest.raises(ParametroInvalido):
+        validar_parametros({'metodo': 'media'})
@@ -0,0 +1,194 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+from banco_dados import (
+    init_db, get_db_connection, create_user, create_produto,
+    create_venda, create_venda_item, delete_venda, update_venda_item, get_venda_items
+)
+from registro_relatorios import get_relatorio
+from snapshot_vendas import RELATORIOS_SNAPSHOT, SnapshotVendas
+
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv('DB_PATH', str(db_path))
+    init_db()
+    return db_path
+
+
+@pytest.fixture
+def registrar_venda(test_db):
+    user_id = create_user('caixa', 'caixa@example.com', 'senha123')
+    produtos = {
+        'Picanha': create_produto('Picanha', '', 'BOI', 80, 100),
+        'Linguiça': create_produto('Linguiça', '', 'PORCO', 25, 100),
+    }
+
+    def registrar(venda_id, data, itens):
+        create_venda(venda_id, None, 'Cliente', sum(q * p for _, q, p in itens), 'dinheiro', user_id)
+        for nome, quantidade, preco in itens:
+            create_venda_item(venda_id, produtos[nome], quantidade, preco)
+        with get_db_connection() as conn:
+            conn.execute("UPDATE vendas SET data = ? WHERE id = ?", (data, venda_id))
+            conn.commit()
+    return registrar
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return SnapshotVendas(str(tmp_path / 'snapshots'))
+
+
+def via_sql(chave, **args):
+    relatorio = get_relatorio(chave)
+    valores = relatorio.validar(args)
+    with get_db_connection() as conn:
+        return valores, [dict(row) for row in relatorio.executar(conn, valores)]
+
+
+def assert_igual_ao_sql(snapshot, chave, **args):
+    valores, esperado = via_sql(chave, **args)
+    obtido = RELATORIOS_SNAPSHOT[chave](snapshot, valores)
+    assert len(obtido) == len(esperado)
+    for a, b in zip(obtido, esperado):
+        assert a == pytest.approx(b)
+
+
+def test_atualizacao_incremental(registrar_venda, snapshot):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    registrar_venda('V2', '2025-02-05 10:00:00', [('Linguiça', 2, 25.0)])
+    meta = snapshot.atualizar('2025-01-31')
+    assert (meta['vendas'], meta['itens']) == (1, 1)
+
+    registrar_venda('V3', '2025-02-06 10:00:00', [('Picanha', 0.5, 80.0), ('Linguiça', 1, 25.0)])
+    meta = snapshot.atualizar('2025-02-28')
+    assert (meta['ate'], meta['vendas'], meta['itens']) == ('2025-02-28', 3, 4)
+
+    (vendas, itens), _ = snapshot.colunas()
+    assert isinstance(vendas['dia'], np.memmap)
+    assert vendas['total'].tolist() == [8000, 5000, 6500]
+    assert sorted(itens['valor'].tolist()) == [2500, 4000, 5000, 8000]
+
+
+def test_relatorios_combinam_snapshot_e_vendas_recentes(registrar_venda, snapshot):
+    registrar_venda('V1', '2024-12-20 10:00:00', [('Picanha', 1.5, 80.0)])
+    registrar_venda('V2', '2025-01-10 10:00:00', [('Linguiça', 2, 25.0)])
+    snapshot.atualizar('2025-01-31')
+    # Vendas posteriores ao snapshot vêm do SQLite
+    registrar_venda('V3', '2025-02-01 10:00:00', [('Linguiça', 1, 25.0)])
+    registrar_venda('V4', datetime.now().strftime('%Y-%m-%d %H:%M:%S'), [('Picanha', 1, 80.0)])
+
+    assert_igual_ao_sql(snapshot, 'vendas_periodo', start_date='2024-12-01', end_date='2025-02-28')
+    assert_igual_ao_sql(snapshot, 'comparativo', periodo='month')
+    assert_igual_ao_sql(snapshot, 'comparativo', periodo='year')
+    assert_igual_ao_sql(snapshot, 'top_produtos', limit='5')
+
+
+def test_comparativo_limita_aos_ultimos_periodos(registrar_venda, snapshot):
+    # Meses com lacunas: o recuo precisa ir além de 12 meses de calendário
+    for i, mes in enumerate(['2022-01', '2022-06', '2023-03', '2023-09', '2024-02', '2024-07',
+                             '2024-08', '2024-11', '2025-01', '2025-03', '2025-04', '2025-05',
+                             '2025-06', '2025-07']):
+        registrar_venda(f'V{i}', f'{mes}-15 10:00:00', [('Picanha', 1, 80.0)])
+    snapshot.atualizar('2025-12-31')
+    assert_igual_ao_sql(snapshot, 'comparativo', periodo='month')
+
+
+def test_alteracao_em_dia_fechado_reconstroi(registrar_venda, snapshot):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    registrar_venda('V2', '2025-01-11 10:00:00', [('Linguiça', 2, 25.0)])
+    snapshot.atualizar('2025-01-31')
+
+    delete_venda('V1')
+    meta = snapshot.atualizar('2025-01-31')
+    assert (meta['vendas'], meta['itens'], meta['soma_total']) == (1, 1, 5000)
+
+
+JANEIRO_FEVEREIRO = {'start_date': '2025-01-01', 'end_date': '2025-02-28'}
+
+
+def consultar(snapshot, chave, **args):
+    """Mesmo caminho de app.consultar_relatorio: snapshot se atual, senão SQL."""
+    relatorio = get_relatorio(chave)
+    valores = relatorio.validar(args)
+    dados = snapshot.relatorio(chave, valores)
+    return dados if dados is not None else via_sql(chave, **args)[1]
+
+
+def test_venda_excluida_em_dia_do_snapshot_sai_do_relatorio(registrar_venda, snapshot):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    registrar_venda('V2', '2025-01-11 10:00:00', [('Linguiça', 2, 25.0)])
+    snapshot.atualizar('2025-01-31')
+    # Venda nova depois do snapshot não invalida os dias gravados
+    registrar_venda('V3', '2025-02-01 10:00:00', [('Linguiça', 1, 25.0)])
+    assert snapshot.atual()
+    assert [d['data'] for d in consultar(snapshot, 'vendas_periodo', **JANEIRO_FEVEREIRO)] == \
+        ['2025-01-10', '2025-01-11', '2025-02-01']
+
+    delete_venda('V1')
+    assert not snapshot.atual()
+    assert snapshot.relatorio('vendas_periodo', get_relatorio('vendas_periodo').validar(JANEIRO_FEVEREIRO)) is None
+    assert [d['data'] for d in consultar(snapshot, 'vendas_periodo', **JANEIRO_FEVEREIRO)] == ['2025-01-11', '2025-02-01']
+    assert [p['nome'] for p in consultar(snapshot, 'top_produtos')] == ['Linguiça']
+
+    # A atualização reconstrói e o snapshot volta a ser usado
+    snapshot.atualizar('2025-01-31')
+    assert snapshot.atual()
+    assert [p['nome'] for p in consultar(snapshot, 'top_produtos')] == ['Linguiça']
+
+
+def test_item_alterado_em_dia_do_snapshot(registrar_venda, snapshot):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    snapshot.atualizar('2025-01-31')
+    update_venda_item(get_venda_items('V1')[0]['id'], quantidade=2)
+    assert not snapshot.atual()
+    assert consultar(snapshot, 'top_produtos')[0]['quantidade_vendida'] == 2
+
+
+def test_gravacao_interrompida_e_descartada(registrar_venda, snapshot):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    snapshot.atualizar('2025-01-31')
+    # Bytes de uma gravação que não chegou a atualizar a meta
+    with open(os.path.join(snapshot.pasta, 'vendas_total.bin'), 'ab') as f:
+        f.write(b'\xff' * 8)
+
+    registrar_venda('V2', '2025-02-10 10:00:00', [('Linguiça', 2, 25.0)])
+    snapshot.atualizar('2025-02-28')
+    (vendas, _), _ = snapshot.colunas()
+    assert vendas['total'].tolist() == [8000, 5000]
+
+
+def dias_alterados():
+    with get_db_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT dia FROM snapshot_vendas_dias_alterados")]
+
+
+def test_triggers_marcam_so_dias_do_snapshot(registrar_venda, snapshot):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    snapshot.atualizar('2025-01-31')
+    # Vendas do dia a dia não tocam a tabela nem invalidam o snapshot
+    registrar_venda('V2', '2025-02-03 10:00:00', [('Linguiça', 1, 25.0)])
+    assert dias_alterados() == [] and snapshot.atual()
+
+    # Venda lançada com data retroativa em um dia já gravado
+    registrar_venda('V3', '2025-01-20 10:00:00', [('Linguiça', 1, 25.0)])
+    assert dias_alterados() == ['2025-01-20'] and not snapshot.atual()
+    assert [d['data'] for d in consultar(snapshot, 'vendas_periodo', **JANEIRO_FEVEREIRO)] == \
+        ['2025-01-10', '2025-01-20', '2025-02-03']
+
+    meta = snapshot.atualizar('2025-02-28')
+    assert (meta['vendas'], dias_alterados()) == (3, [])
+    assert snapshot.atual()
+
+
+def test_snapshot_nao_registrado_no_banco(registrar_venda, snapshot, tmp_path):
+    registrar_venda('V1', '2025-01-10 10:00:00', [('Picanha', 1, 80.0)])
+    snapshot.atualizar('2025-01-31')
+    # Outro snapshot gravado no mesmo banco substitui o registro deste
+    SnapshotVendas(str(tmp_path / 'outro')).atualizar('2025-01-15')
+    assert not snapshot.atual()
+    assert snapshot.atualizar('2025-01-31')['vendas'] == 1
+    assert snapshot.atual()
@@ -0,0 +1,54 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from validacao_imagens import FotoInvalida, validar_foto
+
+EXTENSOES = {'jpg', 'jpeg', 'png'}
+LIMITES = {'max_bytes': 2 * 1024 * 1024, 'max_lado': 4000, 'max_pixels': 4_000_000}
+
+
+def upload(conteudo, nome):
+    return FileStorage(stream=BytesIO(conteudo), filename=nome)
+
+
+def imagem(formato='JPEG', tamanho=(640, 480)):
+    dados = BytesIO()
+    Image.new('RGB', tamanho, (200, 30, 30)).save(dados, formato)
+    return dados.getvalue()
+
+
+def test_foto_valida_volta_ao_inicio():
+    foto = upload(imagem(), 'picanha.JPEG')
+    assert validar_foto(foto, EXTENSOES, **LIMITES) == ('JPEG', 640, 480)
+    assert foto.stream.tell() == 0
+    assert validar_foto(upload(imagem('PNG'), 'logo.png'), EXTENSOES, **LIMITES)[0] == 'PNG'
+
+
+@pytest.mark.parametrize('conteudo, nome, mensagem', [
+    (imagem(), 'picanha.gif', 'Apenas arquivos JPEG, JPG e PNG'),
+    (b'<?php echo 1; ?>', 'shell.jpg', 'não é uma imagem JPG'),
+    (imagem('PNG'), 'disfarcada.jpg', 'não é uma imagem JPG'),
+    (imagem()[:20], 'cortada.jpg', 'não é uma imagem JPG'),
+    (b'\0' * (2 * 1024 * 1024 + 1), 'grande.png', 'Arquivo muito grande'),
+    (imagem('PNG', (4001, 10)), 'comprida.png', 'Imagem muito grande (4001x10)'),
+    (imagem('PNG', (2500, 2500)), 'megapixels.png', '4 megapixels'),
+])
+def test_foto_recusada(conteudo, nome, mensagem):
+    with pytest.raises(FotoInvalida, match=mensagem.replace('(', r'\(').replace(')', r'\)')):
+        validar_foto(upload(conteudo, nome), EXTENSOES, **LIMITES)
+
+
+def test_cabecalho_sem_decodificar_pixels():
+    # Só os primeiros bytes de PNGs enormes: recusados pelo cabeçalho (IHDR)
+    dados = BytesIO()
+    Image.new('1', (5000, 3000)).save(dados, 'PNG')
+    with pytest.raises(FotoInvalida, match='5000x3000'):
+        validar_foto(upload(dados.getvalue()[:64], 'enorme.png'), EXTENSOES, **LIMITES)
+
+    dados = BytesIO()
+    Image.new('1', (30000, 30000)).save(dados, 'PNG')
+    with pytest.raises(FotoInvalida, match='Imagem muito grande! Máximo: 4000px'):
+        validar_foto(upload(dados.getvalue()[:64], 'bomba.png'), EXTENSOES, **LIMITES)
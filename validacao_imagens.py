@@ -0,0 +1,79 @@
+"""Validação das fotos enviadas nos formulários antes de gravá-las.
+
+Confere extensão, tamanho, assinatura (magic bytes) e o cabeçalho lido pelo
+Pillow — formato, largura e altura — sem decodificar os pixels. Um arquivo
+que não é imagem, cujo conteúdo não bate com a extensão ou cujas dimensões
+passam dos limites é recusado antes de chegar à pasta de uploads (e antes
+de as versões reduzidas tentarem decodificá-lo).
+"""
+import os
+import warnings
+
+from PIL import Image, UnidentifiedImageError
+
+# Formato do Pillow -> (assinaturas no início do arquivo, extensões aceitas)
+FORMATOS = {
+    'JPEG': ((b'\xff\xd8\xff',), {'jpg', 'jpeg'}),
+    'PNG': ((b'\x89PNG\r\n\x1a\n',), {'png'}),
+    'WEBP': ((b'RIFF',), {'webp'}),
+    'GIF': ((b'GIF87a', b'GIF89a'), {'gif'}),
+}
+TAMANHO_ASSINATURA = 16
+
+
+class FotoInvalida(ValueError):
+    """Upload recusado; a mensagem pode ser mostrada no formulário."""
+
+
+def _formato_pela_assinatura(inicio):
+    for formato, (assinaturas, _) in FORMATOS.items():
+        if inicio.startswith(assinaturas):
+            if formato == 'WEBP' and inicio[8:12] != b'WEBP':
+                continue
+            return formato
+    return None
+
+
+def validar_foto(foto, extensoes, max_bytes, max_lado, max_pixels):
+    """Confere o upload (FileStorage) e retorna (formato, largura, altura).
+
+    Lê só a assinatura e o cabeçalho da imagem; o stream volta ao início para
+    ser gravado em seguida. Levanta FotoInvalida com a mensagem para o usuário.
+    """
+    ext = foto.filename.rsplit('.', 1)[1].lower() if '.' in foto.filename else ''
+    if ext not in extensoes:
+        nomes = sorted(e.upper() for e in extensoes)
+        raise FotoInvalida(f"Apenas arquivos {', '.join(nomes[:-1])} e {nomes[-1]} são permitidos!"
+                           if len(nomes) > 1 else f"Apenas arquivos {nomes[0]} são permitidos!")
+
+    stream = foto.stream
+    stream.seek(0, os.SEEK_END)
+    tamanho = stream.tell()
+    stream.seek(0)
+    if tamanho > max_bytes:
+        raise FotoInvalida(f"Arquivo muito grande! Tamanho máximo: {max_bytes // (1024 * 1024)}MB")
+
+    formato = _formato_pela_assinatura(stream.read(TAMANHO_ASSINATURA))
+    stream.seek(0)
+    if formato is None or ext not in FORMATOS[formato][1]:
+        raise FotoInvalida(f"O arquivo não é uma imagem {ext.upper()} válida!")
+
+    muito_grande = f"Máximo: {max_lado}px por lado e {max_pixels / 1_000_000:g} megapixels"
+    try:
+        with warnings.catch_warnings():
+            # Acima de Image.MAX_IMAGE_PIXELS o Pillow só avisa; aqui vira recusa
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(stream, formats=[formato]) as imagem:
+                largura, altura = imagem.size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise FotoInvalida(f"Imagem muito grande! {muito_grande}")
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise FotoInvalida(f"O arquivo não é uma imagem {ext.upper()} válida!")
+    finally:
+        stream.seek(0)
+
+    if largura <= 0 or altura <= 0:
+        raise FotoInvalida(f"O arquivo não é uma imagem {ext.upper()} válida!")
+    if max(largura, altura) > max_lado or largura * altura > max_pixels:
+        raise FotoInvalida(f"Imagem muito grande ({largura}x{altura})! {muito_grande}")
+    return formato, largura, altura